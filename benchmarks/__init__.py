@@ -0,0 +1 @@
+"""Нагрузочный тест бота: python -m benchmarks.run --help"""
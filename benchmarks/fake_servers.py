@@ -0,0 +1,391 @@
+"""Локальные заменители Bot API и OpenAI для нагрузочного теста.
+
+Оба сервера построены на services.http_server и работают в том же
+цикле событий, что и бот. Задержка, разброс и доля ошибок задаются
+через Latency.
+"""
+import asyncio
+import base64
+import itertools
+import json
+import random
+import time
+from collections import deque
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+from services.http_server import HttpServer, Response
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Benchmark Bot", "username": "benchmark_bot"}
+FAKE_PHOTO_ID = "benchmark-photo"
+
+WORDS = (
+    "осьминог", "вулкан", "квазар", "бамбук", "янтарь", "ледник", "колибри", "фотон", "базальт",
+    "секвойя", "пульсар", "медуза", "гейзер", "нейтрино", "кварц", "баобаб", "комета", "лишайник",
+    "аммонит", "муссон", "планктон", "графит", "тайфун", "коралл", "дельфин", "метеорит",
+)
+
+
+class Latency:
+    """Задержка ответа: base +- jitter секунд; error_rate - доля ответов с ошибкой."""
+
+    def __init__(self, base: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        self.base = base
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    async def wait(self):
+        delay = max(0.0, self.base + random.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+
+    def fails(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+def random_sentence(words: int = 12) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+# Bot API
+
+def _parse_multipart(body: bytes, content_type: str) -> dict:
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+    fields = {}
+    for part in body.split(b"--" + boundary):
+        head, _, value = part.partition(b"\r\n\r\n")
+        if b'name="' not in head:
+            continue
+        name = head.split(b'name="', 1)[1].split(b'"', 1)[0].decode()
+        if b"filename=" in head:
+            fields[name] = FAKE_PHOTO_ID
+        else:
+            fields[name] = value.rstrip(b"\r\n").decode("utf-8")
+    return fields
+
+
+class FakeBotApi:
+    """Bot API с getUpdates, отправкой и правкой сообщений.
+
+    Хранит сообщения по чатам, чтобы симулированные пользователи могли
+    нажимать кнопки под ними, и журнал вызовов для ожидания ответа бота.
+    """
+
+    METHODS = (
+        "getMe", "getUpdates", "deleteWebhook", "setWebhook", "sendMessage", "sendPhoto", "editMessageText",
+        "editMessageCaption", "editMessageMedia", "editMessageReplyMarkup", "deleteMessage", "sendChatAction",
+        "answerCallbackQuery",
+    )
+
+    def __init__(self, token: str, latency: Latency = None):
+        self.token = token
+        self.latency = latency or Latency()
+        self.server = HttpServer()
+        for method in self.METHODS:
+            self.server.route("POST", f"/bot{token}/{method}", self._handler(method))
+
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._updates = deque()
+        self._updates_ready = asyncio.Event()
+        # chat_id -> {message_id: message}
+        self.messages = {}
+        # chat_id -> последнее отправленное или изменённое ботом сообщение
+        self.last_messages = {}
+        # chat_id -> список (метод, параметры) в порядке поступления
+        self.calls = {}
+        self._call_events = {}
+        # id callback-запроса -> chat_id, чтобы отнести answerCallbackQuery к чату
+        self._callback_chats = {}
+        self.total_calls = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        await self.server.start(host, port)
+
+    async def stop(self):
+        await self.server.stop()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.port}/bot"
+
+    # Сторона пользователя
+
+    def user_message(self, user: dict, text: str) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        self._push({"message": message})
+        return message
+
+    def press_button(self, user: dict, message: dict, data: str):
+        query_id = str(next(self._update_ids))
+        self._callback_chats[query_id] = user["id"]
+        self._push({"callback_query": {
+            "id": query_id,
+            "from": user,
+            "chat_instance": str(user["id"]),
+            "message": dict(message),
+            "data": data,
+        }})
+
+    def call_count(self, chat_id: int) -> int:
+        return len(self.calls.get(chat_id, ()))
+
+    async def wait_call(self, chat_id: int, start: int, predicate, timeout: float):
+        """Дождаться вызова Bot API для чата (начиная с индекса start), подходящего под predicate"""
+        deadline = time.monotonic() + timeout
+        index = start
+        while True:
+            calls = self.calls.setdefault(chat_id, [])
+            while index < len(calls):
+                method, params = calls[index]
+                index += 1
+                if predicate(method, params):
+                    return method, params
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            event = self._call_events.setdefault(chat_id, asyncio.Event())
+            await asyncio.wait_for(event.wait(), remaining)
+            self._call_events[chat_id] = asyncio.Event()
+
+    def _push(self, payload: dict):
+        payload["update_id"] = next(self._update_ids)
+        self._updates.append(payload)
+        self._updates_ready.set()
+
+    # Сторона бота
+
+    def _handler(self, method: str):
+        async def handle(request):
+            content_type = request.headers.get("content-type", "")
+            if content_type.startswith("multipart/form-data"):
+                params = _parse_multipart(request.body, content_type)
+            elif content_type.startswith("application/json"):
+                params = request.json() or {}
+            else:
+                params = {key: values[0] for key, values in parse_qs(request.body.decode("utf-8")).items()}
+
+            if method == "getUpdates":
+                return self._ok(await self._get_updates(params))
+
+            await self.latency.wait()
+            if self.latency.fails():
+                return Response.json({"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                      "parameters": {"retry_after": 1}}, status=HTTPStatus.TOO_MANY_REQUESTS)
+            self.total_calls += 1
+            return self._ok(self._call(method, params))
+
+        return handle
+
+    @staticmethod
+    def _ok(result):
+        return Response.json({"ok": True, "result": result})
+
+    async def _get_updates(self, params: dict):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout:
+            self._updates_ready.clear()
+            try:
+                await asyncio.wait_for(self._updates_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self._updates, 100))
+
+    def _call(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method in ("deleteWebhook", "setWebhook"):
+            return True
+
+        for key in ("reply_markup", "media"):
+            if isinstance(params.get(key), str):
+                params[key] = json.loads(params[key])
+
+        if method == "answerCallbackQuery":
+            chat_id = self._callback_chats.pop(params.get("callback_query_id"), None)
+        else:
+            chat_id = int(params["chat_id"]) if "chat_id" in params else None
+        if chat_id is not None:
+            self.calls.setdefault(chat_id, []).append((method, params))
+            event = self._call_events.get(chat_id)
+            if event:
+                event.set()
+
+        if method in ("sendMessage", "sendPhoto"):
+            message = {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+            }
+            if method == "sendPhoto":
+                message["photo"] = [{"file_id": FAKE_PHOTO_ID, "file_unique_id": FAKE_PHOTO_ID,
+                                     "width": 512, "height": 512}]
+                message["caption"] = params.get("caption", "")
+            else:
+                message["text"] = params.get("text", "")
+            return self._store(chat_id, message, params)
+
+        if method.startswith("editMessage"):
+            message = self.messages.get(chat_id, {}).get(int(params["message_id"]))
+            if message is None:
+                return True
+            if method == "editMessageText":
+                message.pop("photo", None)
+                message.pop("caption", None)
+                message["text"] = params.get("text", "")
+            elif method == "editMessageCaption":
+                message["caption"] = params.get("caption", "")
+            elif method == "editMessageMedia":
+                media = params.get("media", {})
+                message.pop("text", None)
+                message["photo"] = [{"file_id": FAKE_PHOTO_ID, "file_unique_id": FAKE_PHOTO_ID,
+                                     "width": 512, "height": 512}]
+                message["caption"] = media.get("caption", "")
+            return self._store(chat_id, message, params)
+
+        if method == "deleteMessage":
+            self.messages.get(chat_id, {}).pop(int(params["message_id"]), None)
+        return True
+
+    def _store(self, chat_id: int, message: dict, params: dict) -> dict:
+        if "reply_markup" in params:
+            message["reply_markup"] = params["reply_markup"]
+        else:
+            message.pop("reply_markup", None)
+        self.messages.setdefault(chat_id, {})[message["message_id"]] = message
+        self.last_messages[chat_id] = message
+        return message
+
+
+# OpenAI
+
+class FakeOpenAI:
+    """Эндпоинты chat completions (обычные, потоковые и JSON-ответы) и эмбеддингов."""
+
+    def __init__(self, latency: Latency = None):
+        self.latency = latency or Latency()
+        self.server = HttpServer()
+        self.server.route("POST", "/v1/chat/completions", self._completions)
+        self.server.route("POST", "/v1/embeddings", self._embeddings)
+        self._embedders = {}
+        self.requests = 0
+        self.errors = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        await self.server.start(host, port)
+
+    async def stop(self):
+        await self.server.stop()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.port}/v1"
+
+    async def _completions(self, request):
+        self.requests += 1
+        body = request.json()
+        await self.latency.wait()
+        if self.latency.fails():
+            self.errors += 1
+            return Response.json({"error": {"message": "benchmark error", "type": "server_error"}},
+                                 status=HTTPStatus.INTERNAL_SERVER_ERROR)
+
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        texts = [self._content(json_mode) for _ in range(body.get("n", 1))]
+        prompt_tokens = sum(len(message.get("content") or "") for message in body["messages"]) // 3
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": sum(len(text) // 3 for text in texts),
+            "total_tokens": prompt_tokens + sum(len(text) // 3 for text in texts),
+        }
+
+        if body.get("stream"):
+            return Response(HTTPStatus.OK, self._sse(body["model"], texts[0], usage), "text/event-stream")
+        return Response.json({
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [
+                {"index": index, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                for index, text in enumerate(texts)
+            ],
+            "usage": usage,
+        })
+
+    async def _embeddings(self, request):
+        """Эмбеддинги HashingEmbedder: по-разному записанные одинаковые вопросы получают близкие векторы"""
+        # numpy нужен только прогонам с семантическим кэшем
+        from services.semantic_cache import HashingEmbedder
+
+        self.requests += 1
+        body = request.json()
+        await self.latency.wait()
+        if self.latency.fails():
+            self.errors += 1
+            return Response.json({"error": {"message": "benchmark error", "type": "server_error"}},
+                                 status=HTTPStatus.INTERNAL_SERVER_ERROR)
+
+        texts = [body["input"]] if isinstance(body["input"], str) else body["input"]
+        dim = body.get("dimensions") or 1536
+        embedder = self._embedders.get(dim)
+        if embedder is None:
+            embedder = self._embedders[dim] = HashingEmbedder(dim)
+        vectors = embedder.embed_sync(texts)
+
+        def encode(vector):
+            if body.get("encoding_format") == "base64":
+                return base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            return vector.tolist()
+
+        tokens = sum(len(text) for text in texts) // 3
+        return Response.json({
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": index, "embedding": encode(vector)}
+                for index, vector in enumerate(vectors)
+            ],
+            "model": body["model"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    @staticmethod
+    def _content(json_mode: bool) -> str:
+        if not json_mode:
+            return " ".join(random_sentence() for _ in range(3))
+        return json.dumps({
+            "question": random_sentence(8)[:-1] + "?",
+            "options": {letter: random_sentence(3) for letter in "ABCD"},
+            "correct": random.choice("ABCD"),
+            "explanations": {letter: random_sentence(6) for letter in "ABCD"},
+        }, ensure_ascii=False)
+
+    @staticmethod
+    def _sse(model: str, text: str, usage: dict) -> bytes:
+        def event(choices, extra=None):
+            chunk = {"id": "chatcmpl-benchmark", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": choices}
+            chunk.update(extra or {})
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        words = text.split(" ")
+        events = [
+            event([{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}])
+            for word in words
+        ]
+        events.append(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        events.append(event([], {"usage": usage}))
+        events.append("data: [DONE]\n\n")
+        return "".join(events).encode("utf-8")
@@ -0,0 +1,132 @@
+"""Сценарии симулированных пользователей.
+
+Каждый шаг - обновление от пользователя (команда, текст или нажатие
+кнопки) и ожидание вызова Bot API, которым бот завершает ответ на него.
+Время шага - от отправки обновления до этого вызова, то есть задержка,
+которую видит пользователь.
+"""
+import asyncio
+import random
+import time
+
+from data.personalities import PERSONALITIES
+from data.quiz_topics import QUIZ_TOPICS
+
+QUESTIONS = (
+    "Почему небо голубое?",
+    "Как работает двигатель внутреннего сгорания?",
+    "Расскажи про чёрные дыры простыми словами",
+    "Что почитать о истории Рима?",
+    "Как выучить Python за месяц?",
+)
+
+
+class FlowError(Exception):
+    """Бот не ответил на шаг сценария вовремя."""
+
+
+def has_button(prefix: str):
+    def predicate(method, params):
+        markup = params.get("reply_markup") or {}
+        return any(
+            str(button.get("callback_data", "")).startswith(prefix)
+            for row in markup.get("inline_keyboard", ())
+            for button in row
+        )
+    return predicate
+
+
+def text_contains(fragment: str):
+    def predicate(method, params):
+        text = params.get("text") or params.get("caption") or (params.get("media") or {}).get("caption") or ""
+        return fragment in text
+    return predicate
+
+
+def method_is(name: str):
+    def predicate(method, params):
+        return method == name
+    return predicate
+
+
+class SimulatedUser:
+    """Пользователь в личном чате с ботом."""
+
+    def __init__(self, api, user_id: int, step_timeout: float, think_time: float = 0.0):
+        self.api = api
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "language_code": "ru"}
+        self.chat_id = user_id
+        self.step_timeout = step_timeout
+        self.think_time = think_time
+        self.steps = []
+
+    async def send(self, text: str, expect, name: str = None):
+        await self._step(name or text, lambda: self.api.user_message(self.user, text), expect)
+
+    async def press(self, data: str, expect):
+        message = self.api.last_messages.get(self.chat_id)
+        if message is None:
+            raise FlowError(f"нет сообщения с кнопкой {data}")
+        await self._step(data, lambda: self.api.press_button(self.user, message, data), expect)
+
+    async def _step(self, name: str, action, expect):
+        if self.think_time:
+            await asyncio.sleep(random.uniform(0, 2 * self.think_time))
+        start = self.api.call_count(self.chat_id)
+        started = time.monotonic()
+        action()
+        try:
+            await self.api.wait_call(self.chat_id, start, expect, self.step_timeout)
+        except asyncio.TimeoutError:
+            raise FlowError(f"нет ответа на шаг {name} за {self.step_timeout} с") from None
+        self.steps.append(time.monotonic() - started)
+
+
+async def start_flow(user: SimulatedUser):
+    await user.send("/start", has_button("random_fact"))
+
+
+async def random_fact_flow(user: SimulatedUser):
+    await user.send("/start", has_button("random_fact"))
+    await user.press("random_fact", has_button("random_more"))
+    for _ in range(2):
+        await user.press("random_more", has_button("random_more"))
+    await user.press("random_finish", has_button("random_fact"))
+
+
+async def gpt_flow(user: SimulatedUser):
+    await user.send("/start", has_button("gpt_interface"))
+    await user.press("gpt_interface", method_is("answerCallbackQuery"))
+    for _ in range(3):
+        await user.send(random.choice(QUESTIONS), has_button("gpt_continue"), name="gpt_message")
+    await user.press("gpt_finish", method_is("answerCallbackQuery"))
+
+
+async def personality_flow(user: SimulatedUser):
+    await user.send("/start", has_button("talk_interface"))
+    await user.press("talk_interface", has_button("personality_"))
+    await user.press(f"personality_{random.choice(list(PERSONALITIES))}", text_contains("Напишите что-нибудь"))
+    for _ in range(3):
+        await user.send(random.choice(QUESTIONS), has_button("continue_chat"), name="personality_message")
+    await user.press("finish_talk", method_is("answerCallbackQuery"))
+
+
+async def quiz_flow(user: SimulatedUser, questions: int = 3):
+    topic = random.choice(list(QUIZ_TOPICS))
+    await user.send("/start", has_button("quiz_interface"))
+    await user.press("quiz_interface", has_button("quiz_topic_"))
+    await user.press(f"quiz_topic_{topic}", text_contains("Напишите ваш ответ"))
+    for index in range(questions):
+        await user.send(random.choice("ABCD"), has_button("quiz_continue_"), name="quiz_answer")
+        if index < questions - 1:
+            await user.press(f"quiz_continue_{topic}", text_contains("Напишите ваш ответ"))
+    await user.press("quiz_finish", text_contains("Квиз завершен"))
+
+
+FLOWS = {
+    "start": start_flow,
+    "random_fact": random_fact_flow,
+    "gpt": gpt_flow,
+    "personality": personality_flow,
+    "quiz": quiz_flow,
+}
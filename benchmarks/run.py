@@ -0,0 +1,257 @@
+"""Нагрузочный тест бота.
+
+Поднимает заменители Bot API и OpenAI, собирает настоящий Application из
+main.py, направленный на них, и прогоняет N симулированных пользователей
+через сценарии из benchmarks/flows.py. Печатает пропускную способность,
+p50/p95/p99 задержки шагов по сценариям и пиковую память; результат можно
+сохранить как базовый и сравнивать с ним последующие прогоны.
+
+Запуск из корня репозитория:
+    python -m benchmarks.run --users 50 --iterations 3 --openai-latency 0.8 --openai-jitter 0.3
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_servers import FakeBotApi, FakeOpenAI, Latency
+from benchmarks.flows import FLOWS, FlowError, SimulatedUser
+
+logger = logging.getLogger("benchmark")
+
+BOT_TOKEN = "123456:benchmark"
+FIRST_USER_ID = 100_000
+# Прирост задержки меньше этого не считается регрессией, секунды
+ABSOLUTE_SLACK = 0.005
+
+
+def percentile(samples, q: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss - килобайты в Linux и байты в macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def configure_environment(api: FakeBotApi, openai: FakeOpenAI, storage_dir: str, semantic_cache: bool = False):
+    """Настройки бота для прогона; должны быть выставлены до импорта config"""
+    os.environ.update({
+        "TG_BOT_TOKEN": BOT_TOKEN,
+        "CHATGPT_TOKEN": "benchmark",
+        "TELEGRAM_API_URL": api.url,
+        "OPENAI_BASE_URL": openai.url,
+        "BOT_MODE": "polling",
+        "STORAGE_DIR": storage_dir,
+        "MEDIA_CACHE_PATH": os.path.join(storage_dir, "media_cache.json"),
+        "RESPONSE_CACHE_DB": os.path.join(storage_dir, "response_cache.sqlite3"),
+        "PERSISTENCE_DB": os.path.join(storage_dir, "bot_state.sqlite3"),
+        "QUESTION_BANK_DB": os.path.join(storage_dir, "question_bank.sqlite3"),
+        "METRICS_PORT": "0",
+        # У тестового Bot API нет лимитов Telegram; прогон меряет собственную пропускную способность бота
+        "TELEGRAM_GLOBAL_PER_SECOND": "100000",
+        "TELEGRAM_CHAT_PER_SECOND": "100000",
+        "FACT_BROADCAST_TIME": "",
+        "SUBSCRIPTIONS_DB": os.path.join(storage_dir, "subscriptions.sqlite3"),
+        # Эмбеддинги для семантического кэша отдаёт заменитель OpenAI
+        "SEMANTIC_CACHE": "true" if semantic_cache else "false",
+        "SEMANTIC_CACHE_PATH": os.path.join(storage_dir, "semantic_cache"),
+    })
+
+
+async def run_user(api: FakeBotApi, index: int, flow_names, iterations: int, step_timeout: float,
+                   think_time: float, results: dict):
+    user = SimulatedUser(api, FIRST_USER_ID + index, step_timeout, think_time)
+    for _ in range(iterations):
+        for name in random.sample(flow_names, len(flow_names)):
+            result = results[name]
+            user.steps = []
+            started = time.monotonic()
+            try:
+                await FLOWS[name](user)
+            except FlowError as e:
+                result["failures"] += 1
+                logger.warning(f"Пользователь {user.user['id']}, сценарий {name}: {e}")
+            else:
+                result["durations"].append(time.monotonic() - started)
+            result["steps"].extend(user.steps)
+
+
+async def run_benchmark(args) -> dict:
+    api = FakeBotApi(BOT_TOKEN, Latency(args.telegram_latency, args.telegram_jitter, args.telegram_error_rate))
+    openai = FakeOpenAI(Latency(args.openai_latency, args.openai_jitter, args.openai_error_rate))
+    await api.start()
+    await openai.start()
+
+    storage = tempfile.TemporaryDirectory(prefix="bot-benchmark-")
+    configure_environment(api, openai, storage.name, args.semantic_cache)
+
+    import main
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+    for name in ("httpx", "httpx2"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    application = main.build_application()
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+
+    flow_names = args.flows
+    results = {name: {"steps": [], "durations": [], "failures": 0} for name in flow_names}
+    started = time.monotonic()
+    try:
+        await asyncio.gather(*(
+            run_user(api, index, flow_names, args.iterations, args.step_timeout, args.think_time, results)
+            for index in range(args.users)
+        ))
+    finally:
+        elapsed = time.monotonic() - started
+        await application.updater.stop()
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
+        await api.stop()
+        await openai.stop()
+        storage.cleanup()
+
+    flows = {}
+    for name, result in results.items():
+        steps = result["steps"]
+        flows[name] = {
+            "runs": len(result["durations"]) + result["failures"],
+            "failures": result["failures"],
+            "steps": len(steps),
+            "p50": percentile(steps, 0.50),
+            "p95": percentile(steps, 0.95),
+            "p99": percentile(steps, 0.99),
+            "flow_p50": percentile(result["durations"], 0.50),
+        }
+    total_steps = sum(flow["steps"] for flow in flows.values())
+    total_runs = sum(len(result["durations"]) for result in results.values())
+    return {
+        "config": {
+            "users": args.users,
+            "iterations": args.iterations,
+            "flows": flow_names,
+            "openai_latency": [args.openai_latency, args.openai_jitter, args.openai_error_rate],
+            "telegram_latency": [args.telegram_latency, args.telegram_jitter, args.telegram_error_rate],
+            "semantic_cache": args.semantic_cache,
+        },
+        "elapsed": elapsed,
+        "updates_per_sec": total_steps / elapsed if elapsed else 0.0,
+        "flows_per_sec": total_runs / elapsed if elapsed else 0.0,
+        "bot_api_calls": api.total_calls,
+        "openai_requests": openai.requests,
+        "peak_rss_mb": peak_rss_mb(),
+        "flows": flows,
+    }
+
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+
+def print_report(report: dict):
+    print(f"\nПользователей: {report['config']['users']}, итераций: {report['config']['iterations']}, "
+          f"время: {report['elapsed']:.1f} с")
+    print(f"{'сценарий':<14}{'прогонов':>9}{'ошибок':>8}{'шагов':>7}"
+          f"{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}{'сценарий p50 мс':>17}")
+    for name, flow in report["flows"].items():
+        print(f"{name:<14}{flow['runs']:>9}{flow['failures']:>8}{flow['steps']:>7}"
+              f"{_ms(flow['p50']):>9}{_ms(flow['p95']):>9}{_ms(flow['p99']):>9}{_ms(flow['flow_p50']):>17}")
+    print(f"Обновлений в секунду: {report['updates_per_sec']:.1f}, сценариев в секунду: {report['flows_per_sec']:.2f}")
+    print(f"Вызовов Bot API: {report['bot_api_calls']}, запросов к OpenAI: {report['openai_requests']}")
+    print(f"Пиковая память процесса: {report['peak_rss_mb']:.1f} МБ")
+
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float):
+    """Список регрессий относительно базового прогона"""
+    regressions = []
+    for name, flow in report["flows"].items():
+        base = baseline["flows"].get(name)
+        if not base:
+            continue
+        for key in ("p50", "p95", "p99"):
+            if flow[key] is None or base[key] is None:
+                continue
+            if flow[key] > base[key] * (1 + tolerance) + ABSOLUTE_SLACK:
+                regressions.append(f"{name} {key}: {_ms(base[key])} -> {_ms(flow[key])} мс")
+        if flow["failures"] > base["failures"]:
+            regressions.append(f"{name} ошибок: {base['failures']} -> {flow['failures']}")
+
+    if report["updates_per_sec"] < baseline["updates_per_sec"] * (1 - tolerance):
+        regressions.append(
+            f"обновлений в секунду: {baseline['updates_per_sec']:.1f} -> {report['updates_per_sec']:.1f}"
+        )
+    if report["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"пиковая память: {baseline['peak_rss_mb']:.1f} -> {report['peak_rss_mb']:.1f} МБ")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота с заменителями Bot API и OpenAI")
+    parser.add_argument("--users", type=int, default=20, help="число симулированных пользователей")
+    parser.add_argument("--iterations", type=int, default=2, help="сколько раз каждый пользователь проходит сценарии")
+    parser.add_argument("--flows", nargs="+", choices=list(FLOWS), default=list(FLOWS), help="сценарии")
+    parser.add_argument("--think-time", type=float, default=0.0, help="средняя пауза пользователя между шагами, с")
+    parser.add_argument("--step-timeout", type=float, default=60.0, help="сколько ждать ответа бота на шаг, с")
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--openai-jitter", type=float, default=0.2)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-latency", type=float, default=0.03)
+    parser.add_argument("--telegram-jitter", type=float, default=0.01)
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0)
+    parser.add_argument("--semantic-cache", action="store_true",
+                        help="включить семантический кэш /gpt (эмбеддинги от заменителя OpenAI, нужен numpy)")
+    parser.add_argument("--seed", type=int, default=None, help="seed генератора случайных чисел")
+    parser.add_argument("--save-baseline", metavar="PATH", help="сохранить результат как базовый")
+    parser.add_argument("--baseline", metavar="PATH", help="сравнить с базовым результатом")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение относительно базового")
+    parser.add_argument("--verbose", action="store_true", help="показывать логи бота")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.WARNING)
+
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Базовый результат сохранён в {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print("\nРегрессии относительно базового прогона:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nРегрессий относительно базового прогона нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
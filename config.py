@@ -1,10 +1,129 @@
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
 
 TG_BOT_TOKEN = os.getenv("TG_BOT_TOKEN")
 CHATGPT_TOKEN = os.getenv("CHATGPT_TOKEN")
+# Адрес API OpenAI; можно указать локальный тестовый сервер
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 if not all([TG_BOT_TOKEN, CHATGPT_TOKEN]):
     raise ValueError("Введите токены в .env")
+
+# Адрес Bot API; можно указать локальный тестовый сервер (например, http://127.0.0.1:8081/bot)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL") or None
+
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+# Сколько обновлений разных чатов обрабатывать одновременно; внутри чата порядок сохраняется
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+# Лимиты исходящих запросов к Bot API: всего в секунду, в личном чате в секунду (с запасом на серию подряд),
+# в группе в минуту; сколько раз повторять запрос после RetryAfter
+TELEGRAM_GLOBAL_PER_SECOND = float(os.getenv("TELEGRAM_GLOBAL_PER_SECOND", "30"))
+TELEGRAM_CHAT_PER_SECOND = float(os.getenv("TELEGRAM_CHAT_PER_SECOND", "1"))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_GROUP_PER_MINUTE = float(os.getenv("TELEGRAM_GROUP_PER_MINUTE", "20"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+
+if BOT_MODE not in ("polling", "webhook"):
+    raise ValueError("BOT_MODE должен быть polling или webhook")
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("Для режима webhook укажите WEBHOOK_URL в .env")
+# Без секрета любой, кто знает адрес вебхука, может присылать боту поддельные обновления
+if BOT_MODE == "webhook" and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", WEBHOOK_SECRET):
+    raise ValueError("Для режима webhook укажите WEBHOOK_SECRET в .env: 1-256 символов A-Z, a-z, 0-9, _ и -")
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", os.path.join(STORAGE_DIR, "media_cache.json"))
+
+FACT_POOL_SIZE = int(os.getenv("FACT_POOL_SIZE", "30"))
+FACT_POOL_LOW_WATER = int(os.getenv("FACT_POOL_LOW_WATER", "10"))
+FACT_POOL_CONCURRENCY = int(os.getenv("FACT_POOL_CONCURRENCY", "3"))
+FACT_POOL_MAX_SERVES = int(os.getenv("FACT_POOL_MAX_SERVES", "50"))
+# Сколько фактов запрашивать одним вызовом (параметр n)
+FACT_POOL_BATCH = int(os.getenv("FACT_POOL_BATCH", "3"))
+
+# Минимальный интервал между правками сообщения при потоковом ответе, секунды
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+# Через сколько секунд ожидания показывать заглушку "думает... ⏳" вместо одного индикатора набора
+PROGRESS_PLACEHOLDER_DELAY = float(os.getenv("PROGRESS_PLACEHOLDER_DELAY", "1.5"))
+
+# Лимиты запросов к OpenAI
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "60000"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+# Дублировать запрос, если ответ задерживается дольше p95
+LLM_HEDGE_REQUESTS = os.getenv("LLM_HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+
+# Модели OpenAI: основная и запасные, на которые уходит трафик, если основная не укладывается в цель по p95
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+LLM_FALLBACK_MODELS = [model.strip() for model in os.getenv("LLM_FALLBACK_MODELS", "gpt-4o-mini").split(",")
+                       if model.strip()]
+# Свои списки моделей для отдельных функций: "fact=gpt-4o-mini;chatgpt=gpt-3.5-turbo,gpt-4o-mini"
+LLM_MODEL_ROUTES = os.getenv("LLM_MODEL_ROUTES", "")
+# Целевой p95 по функциям, секунды (для потоковых ответов - до первого фрагмента)
+LLM_LATENCY_SLO = os.getenv("LLM_LATENCY_SLO", "fact=6;chatgpt=4;personality=4;quiz=10;summary=30")
+
+# Бюджеты токенов OpenAI на пользователя (0 отключает лимит): за сутки и за скользящее окно
+TOKEN_BUDGET_DAILY = int(os.getenv("TOKEN_BUDGET_DAILY", "60000"))
+TOKEN_BUDGET_WINDOW = float(os.getenv("TOKEN_BUDGET_WINDOW", "3600"))
+TOKEN_BUDGET_WINDOW_LIMIT = int(os.getenv("TOKEN_BUDGET_WINDOW_LIMIT", "20000"))
+# Дневные бюджеты пользователя по функциям: "chatgpt=40000;personality=40000"
+TOKEN_BUDGET_FEATURES = os.getenv("TOKEN_BUDGET_FEATURES", "")
+TOKEN_BUDGET_PATH = os.getenv("TOKEN_BUDGET_PATH", os.path.join(STORAGE_DIR, "token_budgets.json"))
+TOKEN_BUDGET_SAVE_INTERVAL = float(os.getenv("TOKEN_BUDGET_SAVE_INTERVAL", "60"))
+
+# Кэш ответов ChatGPT; пустой RESPONSE_CACHE_DB отключает дисковый уровень
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", os.path.join(STORAGE_DIR, "response_cache.sqlite3"))
+
+# Семантический кэш /gpt: ответ на похожий по смыслу вопрос без истории диалога (нужен numpy).
+# Вопросы сравниваются по эмбеддингам модели SEMANTIC_CACHE_EMBEDDING_MODEL размерности SEMANTIC_CACHE_DIM
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_EMBEDDING_MODEL = os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "5000"))
+SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "256"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", os.path.join(STORAGE_DIR, "semantic_cache"))
+
+if SEMANTIC_CACHE and not SEMANTIC_CACHE_EMBEDDING_MODEL:
+    raise ValueError("Для SEMANTIC_CACHE укажите модель эмбеддингов в SEMANTIC_CACHE_EMBEDDING_MODEL")
+
+# Хранение user_data и состояний диалогов; пустой PERSISTENCE_DB отключает сохранение
+PERSISTENCE_DB = os.getenv("PERSISTENCE_DB", os.path.join(STORAGE_DIR, "bot_state.sqlite3"))
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "5"))
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "2"))
+PERSISTENCE_FLUSH_SIZE = int(os.getenv("PERSISTENCE_FLUSH_SIZE", "200"))
+
+QUESTION_BANK_DB = os.getenv("QUESTION_BANK_DB", os.path.join(STORAGE_DIR, "question_bank.sqlite3"))
+
+# Рассылка факта дня: подписчики, время рассылки по местному времени ("" отключает),
+# число вариантов факта, размер пачки (шаг сохранения прогресса) и одновременных отправок
+SUBSCRIPTIONS_DB = os.getenv("SUBSCRIPTIONS_DB", os.path.join(STORAGE_DIR, "subscriptions.sqlite3"))
+FACT_BROADCAST_TIME = os.getenv("FACT_BROADCAST_TIME", "10:00")
+FACT_BROADCAST_VARIANTS = int(os.getenv("FACT_BROADCAST_VARIANTS", "3"))
+FACT_BROADCAST_BATCH = int(os.getenv("FACT_BROADCAST_BATCH", "200"))
+FACT_BROADCAST_CONCURRENCY = int(os.getenv("FACT_BROADCAST_CONCURRENCY", "50"))
+
+# Сколько секунд держать заранее подготовленный следующий вопрос квиза
+QUIZ_PREFETCH_TTL = float(os.getenv("QUIZ_PREFETCH_TTL", "600"))
+
+# Память диалогов: сколько токенов истории передавать модели и сколько из них под краткое содержание
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+
+# Эндпоинт /metrics; METRICS_PORT=0 отключает его
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9090"))
@@ -1,75 +1,58 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
+# Формат ответа модели, общий для всех тем
+QUIZ_FORMAT_PROMPT = """Ответ верни строго в виде JSON-объекта без пояснений:
+{
+  "question": "текст вопроса",
+  "options": {"A": "вариант 1", "B": "вариант 2", "C": "вариант 3", "D": "вариант 4"},
+  "correct": "буква правильного ответа",
+  "explanations": {
+    "A": "1-2 предложения, почему вариант A верный или неверный",
+    "B": "...",
+    "C": "...",
+    "D": "..."
+  }
+}
+Ровно один вариант должен быть правильным. Пиши на русском языке."""
+
+# Уровни сложности вопросов
+QUIZ_DIFFICULTIES = {
+    "easy": "лёгкий",
+    "medium": "средней сложности",
+    "hard": "сложный",
+}
+DEFAULT_DIFFICULTY = "medium"
+
 QUIZ_TOPICS = {
     "programming": {
         "name": "💻 Программирование",
         "emoji": "💻",
         "prompt": """Ты создаешь вопросы для квиза по программированию. 
-Создай один интересный вопрос средней сложности с 4 вариантами ответа (A, B, C, D). 
-Укажи правильный ответ в конце. 
-Формат:
-Вопрос: [твой вопрос]
-A) [вариант 1]
-B) [вариант 2] 
-C) [вариант 3]
-D) [вариант 4]
-Правильный ответ: [буква]"""
+Создай один интересный вопрос с 4 вариантами ответа (A, B, C, D)."""
     },
     "history": {
         "name": "🏛️ История",
         "emoji": "🏛️",
         "prompt": """Ты создаешь вопросы для квиза по истории.
-Создай один интересный исторический вопрос средней сложности с 4 вариантами ответа (A, B, C, D).
-Укажи правильный ответ в конце.
-Формат:
-Вопрос: [твой вопрос]
-A) [вариант 1]
-B) [вариант 2]
-C) [вариант 3] 
-D) [вариант 4]
-Правильный ответ: [буква]"""
+Создай один интересный исторический вопрос с 4 вариантами ответа (A, B, C, D)."""
     },
     "science": {
         "name": "🔬 Наука",
         "emoji": "🔬",
         "prompt": """Ты создаешь вопросы для квиза по науке (физика, химия, биология).
-Создай один интересный научный вопрос средней сложности с 4 вариантами ответа (A, B, C, D).
-Укажи правильный ответ в конце.
-Формат:
-Вопрос: [твой вопрос]
-A) [вариант 1]
-B) [вариант 2]
-C) [вариант 3]
-D) [вариант 4] 
-Правильный ответ: [буква]"""
+Создай один интересный научный вопрос с 4 вариантами ответа (A, B, C, D)."""
     },
     "geography": {
         "name": "🌍 География",
         "emoji": "🌍",
         "prompt": """Ты создаешь вопросы для квиза по географии.
-Создай один интересный географический вопрос средней сложности с 4 вариантами ответа (A, B, C, D).
-Укажи правильный ответ в конце.
-Формат:
-Вопрос: [твой вопрос]
-A) [вариант 1]
-B) [вариант 2]
-C) [вариант 3]
-D) [вариант 4]
-Правильный ответ: [буква]"""
+Создай один интересный географический вопрос с 4 вариантами ответа (A, B, C, D)."""
     },
     "movies": {
         "name": "🎬 Кино",
         "emoji": "🎬",
         "prompt": """Ты создаешь вопросы для квиза о кино и фильмах.
-Создай один интересный вопрос о фильмах средней сложности с 4 вариантами ответа (A, B, C, D).
-Укажи правильный ответ в конце.
-Формат:
-Вопрос: [твой вопрос]
-A) [вариант 1]
-B) [вариант 2]
-C) [вариант 3]
-D) [вариант 4]
-Правильный ответ: [буква]"""
+Создай один интересный вопрос о фильмах с 4 вариантами ответа (A, B, C, D)."""
     }
 }
 
@@ -0,0 +1,77 @@
+"""Пакетная генерация вопросов квиза в банк.
+
+Пример:
+    python generate_questions.py --topic all --count 50 --concurrency 4
+"""
+import argparse
+import asyncio
+import logging
+
+from data.quiz_topics import QUIZ_TOPICS, QUIZ_DIFFICULTIES, DEFAULT_DIFFICULTY
+from services.llm_gateway import Priority
+from services.question_bank import question_bank
+from services.quiz_questions import generate_quiz_question
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Сколько раз подряд можно получить дубликат, прежде чем прекратить генерацию по теме
+MAX_DUPLICATES_IN_ROW = 20
+
+
+async def fill_topic(topic_key: str, count: int, difficulty: str, semaphore: asyncio.Semaphore, batch_size: int):
+    """Добавить в банк count новых вопросов по теме"""
+    topic_data = QUIZ_TOPICS[topic_key]
+    added = 0
+    duplicates = 0
+    skipped = 0
+    failures = 0
+
+    async def generate_one():
+        async with semaphore:
+            return await generate_quiz_question(topic_data, difficulty, priority=Priority.BACKGROUND)
+
+    while added < count and duplicates < MAX_DUPLICATES_IN_ROW and failures < count:
+        batch = min(batch_size, count - added)
+        results = await asyncio.gather(*(generate_one() for _ in range(batch)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                failures += 1
+                logger.error(f"{topic_key}: ошибка генерации: {result}")
+            elif question_bank.add(topic_key, result, difficulty) is None:
+                duplicates += 1
+                skipped += 1
+            else:
+                added += 1
+                duplicates = 0
+
+    logger.info(
+        f"{topic_key}: добавлено {added}, отброшено дубликатов {skipped}, "
+        f"всего в теме {question_bank.count(topic_key)}"
+    )
+    return added
+
+
+async def run(topics, count: int, difficulty: str, concurrency: int):
+    question_bank.load()
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(fill_topic(topic, count, difficulty, semaphore, concurrency) for topic in topics))
+    logger.info(f"Готово: добавлено {sum(results)} вопросов, в банке {question_bank.count()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация вопросов квиза в банк")
+    parser.add_argument("--topic", default="all", choices=["all", *QUIZ_TOPICS], help="тема или all")
+    parser.add_argument("--count", type=int, default=20, help="сколько новых вопросов добавить в каждую тему")
+    parser.add_argument("--difficulty", default=DEFAULT_DIFFICULTY, choices=list(QUIZ_DIFFICULTIES))
+    parser.add_argument("--concurrency", type=int, default=4, help="одновременных запросов к ChatGPT")
+    args = parser.parse_args()
+
+    topics = list(QUIZ_TOPICS) if args.topic == "all" else [args.topic]
+    asyncio.run(run(topics, args.count, args.difficulty, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,18 @@
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from services.openai_client import get_chatgpt_response
-import os
+from services.openai_client import stream_chatgpt_response
+from services.stream_renderer import StreamRenderer
+from services.token_budget import BudgetExceeded
+from services.screens import show_screen
+from services.conversation_memory import conversation_memory
+from services.chat_tasks import chat_tasks
 
 logger = logging.getLogger(__name__)
 
 
 WAITING_FOR_MESSAGE = 1
+MEMORY_SCOPE = "gpt"
 
 CAPTION = '''"🤖 <b>ChatGPT Интерфейс</b>\n\n
             "Напишите любой вопрос или сообщение, и я передам его ChatGPT!\n\n"
@@ -25,31 +30,10 @@ async def gpt_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def gpt_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        image_path = "data/images/chatgpt.png"
-        if os.path.exists(image_path):
-            with open(image_path, 'rb') as photo:
-                if update.callback_query:
-                    await update.callback_query.message.reply_photo(
-                        photo=photo,
-                        caption=CAPTION,
-                        parse_mode='HTML'
-                    )
-
-                else:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=CAPTION,
-                        parse_mode='HTML'
-                    )
-
-        else:
-            message_text = CAPTION
-
-            if update.callback_query:
-                await update.callback_query.edit_message_text(message_text, parse_mode='HTML')
-            else:
-                await update.message.reply_text(message_text, parse_mode='HTML')
+        # Новый диалог начинается без истории
+        conversation_memory.reset(context.user_data, MEMORY_SCOPE)
 
+        await show_screen(update, CAPTION, image_path="data/images/chatgpt.png")
         if update.callback_query:
             await update.callback_query.answer()
 
@@ -57,28 +41,21 @@ async def gpt_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     except Exception as e:
         logger.error(f"Ошибка при запуске ChatGPT интерфейса: {e}")
-        error_text = "😔 Произошла ошибка при запуске ChatGPT интерфейса. Попробуйте позже."
-
-        if update.callback_query:
-            await update.callback_query.edit_message_text(error_text)
-        else:
-            await update.message.reply_text(error_text)
+        await show_screen(update, "😔 Произошла ошибка при запуске ChatGPT интерфейса. Попробуйте позже.")
         return -1
 
 
 async def handle_gpt_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка сообщения пользователя для ChatGPT"""
-    try:
-        user_message = update.message.text
+    # Ответ генерируется в фоне; новое сообщение отменяет недописанный ответ на предыдущее
+    await chat_tasks.start(update.effective_chat.id, answer_gpt_message(update, context))
+    return WAITING_FOR_MESSAGE
 
-        # Показываем индикатор "печатает"
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
 
-        # Отправляем сообщение о том, что обрабатываем запрос
-        processing_msg = await update.message.reply_text("🤔 Обрабатываю ваш запрос... ⏳")
-
-        # Получаем ответ от ChatGPT
-        gpt_response = await get_chatgpt_response(user_message)
+async def answer_gpt_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Потоковый ответ ChatGPT на сообщение пользователя"""
+    try:
+        user_message = update.message.text
 
         # Создаем кнопки
         keyboard = [
@@ -87,19 +64,32 @@ async def handle_gpt_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        # Удаляем сообщение об обработке и отправляем ответ
-        await processing_msg.delete()
-        await update.message.reply_text(
-            f"🤖 <b>ChatGPT отвечает:</b>\n\n{gpt_response}",
-            parse_mode='HTML',
-            reply_markup=reply_markup
+        # Выводим ответ ChatGPT по мере генерации в одно сообщение
+        renderer = StreamRenderer(
+            update.message,
+            header="🤖 <b>ChatGPT отвечает:</b>\n\n",
+            reply_markup=reply_markup,
+            # Индикатор "печатает" и заглушка держатся до первых слов ответа
+            placeholder="🤖 ChatGPT думает... ⏳"
         )
-
-        return WAITING_FOR_MESSAGE  # Остаемся в том же состоянии для следующих вопросов
-
+        history = conversation_memory.context_messages(context.user_data, MEMORY_SCOPE)
+        answer = await renderer.render(stream_chatgpt_response(user_message, history))
+        if answer.strip() and not renderer.interrupted:
+            conversation_memory.add_turn(
+                context.user_data, MEMORY_SCOPE, update.effective_user.id, user_message, answer.strip()
+            )
+
+    except BudgetExceeded as e:
+        await update.message.reply_text(e.user_message, reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Ошибка при обработке сообщения для ChatGPT: {e}")
         await update.message.reply_text(
             "😔 Произошла ошибка при обработке вашего сообщения. Попробуйте еще раз или вернитесь в главное меню."
         )
-        return WAITING_FOR_MESSAGE
+
+
+async def gpt_finish(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка "Вернуться в меню": недописанный ответ больше не нужен"""
+    await chat_tasks.cancel(update.effective_chat.id)
+    await update.callback_query.answer()
+    return -1
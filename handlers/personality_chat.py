@@ -1,9 +1,13 @@
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from services.openai_client import get_personality_response
+from services.openai_client import stream_personality_response
+from services.stream_renderer import StreamRenderer
+from services.token_budget import BudgetExceeded
 from data.personalities import get_personality_keyboard, get_personality_data
-import os
+from services.screens import show_screen
+from services.conversation_memory import conversation_memory
+from services.chat_tasks import chat_tasks
 from handlers.basic import start
 
 logger = logging.getLogger(__name__)
@@ -32,53 +36,16 @@ async def talk_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         keyboard = get_personality_keyboard()
 
-        # Если есть callback query, значит это переход из другого меню
+        # Переход из другого меню правит то же сообщение, команда /talk отвечает новым
+        await show_screen(update, message_text, keyboard, image_path)
         if update.callback_query:
-            if os.path.exists(image_path):
-                # Удаляем старое сообщение и отправляем новое с фото
-                await update.callback_query.message.delete()
-                with open(image_path, 'rb') as photo:
-                    await context.bot.send_photo(
-                        chat_id=update.callback_query.message.chat_id,
-                        photo=photo,
-                        caption=message_text,
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
-            else:
-                await update.callback_query.edit_message_text(
-                    message_text,
-                    parse_mode='HTML',
-                    reply_markup=keyboard
-                )
             await update.callback_query.answer()
-        else:
-            # Обычное сообщение (команда /talk)
-            if os.path.exists(image_path):
-                with open(image_path, 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=message_text,
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
-            else:
-                await update.message.reply_text(
-                    message_text,
-                    parse_mode='HTML',
-                    reply_markup=keyboard
-                )
 
         return SELECTING_PERSONALITY
 
     except Exception as e:
         logger.error(f"Ошибка при запуске диалога с личностями: {e}")
-        error_text = "😔 Произошла ошибка при запуске диалога. Попробуйте позже."
-
-        if update.callback_query:
-            await update.callback_query.edit_message_text(error_text)
-        else:
-            await update.message.reply_text(error_text)
+        await show_screen(update, "😔 Произошла ошибка при запуске диалога. Попробуйте позже.")
 
         return -1
 
@@ -100,9 +67,10 @@ async def personality_selected(update: Update, context: ContextTypes.DEFAULT_TYP
                 await query.edit_message_text("❌ Ошибка: личность не найдена.")
             return -1
 
-        # Сохраняем выбранную личность в контексте
+        # Сохраняем выбранную личность в контексте; диалог начинается заново
         context.user_data['current_personality'] = personality_key
         context.user_data['personality_data'] = personality
+        conversation_memory.reset(context.user_data, f"personality:{personality_key}")
 
         message_text = (
             f"{personality['emoji']} <b>Диалог с {personality['name']}</b>\n\n"
@@ -147,7 +115,6 @@ async def personality_selected(update: Update, context: ContextTypes.DEFAULT_TYP
 async def handle_personality_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка сообщения для личности"""
     try:
-        user_message = update.message.text
         personality_key = context.user_data.get('current_personality')
         personality_data = context.user_data.get('personality_data')
 
@@ -157,16 +124,26 @@ async def handle_personality_message(update: Update, context: ContextTypes.DEFAU
             )
             return -1
 
-        # Показываем индикатор "печатает"
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
+        # Ответ генерируется в фоне; новое сообщение отменяет недописанный ответ на предыдущее
+        await chat_tasks.start(
+            update.effective_chat.id,
+            answer_personality_message(update, context, personality_key, personality_data)
+        )
+        return CHATTING_WITH_PERSONALITY
 
-        # Отправляем сообщение о том, что обрабатываем запрос
-        processing_msg = await update.message.reply_text(
-            f"{personality_data['emoji']} {personality_data['name']} размышляет... ⏳"
+    except Exception as e:
+        logger.error(f"Ошибка при обработке сообщения для личности: {e}")
+        await update.message.reply_text(
+            "😔 Произошла ошибка при обработке сообщения. Попробуйте еще раз."
         )
+        return CHATTING_WITH_PERSONALITY
 
-        # Получаем ответ от ChatGPT в роли выбранной личности
-        personality_response = await get_personality_response(user_message, personality_data['prompt'])
+
+async def answer_personality_message(update: Update, context: ContextTypes.DEFAULT_TYPE, personality_key,
+                                     personality_data):
+    """Потоковый ответ личности на сообщение пользователя"""
+    try:
+        user_message = update.message.text
 
         # Создаем кнопки
         keyboard = [
@@ -176,22 +153,29 @@ async def handle_personality_message(update: Update, context: ContextTypes.DEFAU
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        # Удаляем сообщение об обработке и отправляем ответ
-        await processing_msg.delete()
-        await update.message.reply_text(
-            f"{personality_data['emoji']} <b>{personality_data['name']} отвечает:</b>\n\n{personality_response}",
-            parse_mode='HTML',
-            reply_markup=reply_markup
+        # Выводим ответ личности по мере генерации в одно сообщение
+        renderer = StreamRenderer(
+            update.message,
+            header=f"{personality_data['emoji']} <b>{personality_data['name']} отвечает:</b>\n\n",
+            reply_markup=reply_markup,
+            # Индикатор "печатает" и заглушка держатся до первых слов ответа
+            placeholder=f"{personality_data['emoji']} {personality_data['name']} размышляет... ⏳"
         )
+        scope = f"personality:{personality_key}"
+        history = conversation_memory.context_messages(context.user_data, scope)
+        answer = await renderer.render(stream_personality_response(user_message, personality_data['prompt'], history))
+        if answer.strip() and not renderer.interrupted:
+            conversation_memory.add_turn(
+                context.user_data, scope, update.effective_user.id, user_message, answer.strip()
+            )
 
-        return CHATTING_WITH_PERSONALITY
-
+    except BudgetExceeded as e:
+        await update.message.reply_text(e.user_message, reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Ошибка при обработке сообщения для личности: {e}")
         await update.message.reply_text(
             "😔 Произошла ошибка при обработке сообщения. Попробуйте еще раз."
         )
-        return CHATTING_WITH_PERSONALITY
 
 
 async def handle_personality_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -210,10 +194,14 @@ async def handle_personality_callback(update: Update, context: ContextTypes.DEFA
             return CHATTING_WITH_PERSONALITY
 
     elif query.data == "change_personality":
+        await chat_tasks.cancel(update.effective_chat.id)
         return await talk_start(update, context)
 
     elif query.data == "finish_talk":
-        # Очищаем данные о личности
+        # Недописанный ответ больше не нужен
+        await chat_tasks.cancel(update.effective_chat.id)
+        # Очищаем данные о личности и историю диалога
+        conversation_memory.reset(context.user_data, f"personality:{context.user_data.get('current_personality')}")
         context.user_data.pop('current_personality', None)
         context.user_data.pop('personality_data', None)
 
@@ -1,10 +1,14 @@
 import logging
-import os
-import re
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from services.openai_client import get_personality_response
+from services.quiz_questions import QuizQuestion, generate_quiz_question, parse_answer
 from data.quiz_topics import get_quiz_topics_keyboard, get_quiz_topic_data, get_quiz_continue_keyboard
+from services.question_bank import question_bank
+from services.progress import ProgressMessage
+from services.quiz_prefetch import quiz_prefetcher
+from services.screens import show_screen
+from services.seen_sets import load_seen, save_seen
+from services.token_budget import BudgetExceeded
 
 logger = logging.getLogger(__name__)
 
@@ -38,61 +42,61 @@ async def quiz_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data['quiz_score'] = 0
             context.user_data['quiz_total'] = 0
 
+        await show_screen(update, message_text, keyboard, image_path)
         if update.callback_query:
-            if os.path.exists(image_path):
-                await update.callback_query.message.delete()
-                with open(image_path, 'rb') as photo:
-                    await context.bot.send_photo(
-                        chat_id=update.callback_query.message.chat_id,
-                        photo=photo,
-                        caption=message_text,
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
-            else:
-                await update.callback_query.edit_message_text(
-                    message_text,
-                    parse_mode='HTML',
-                    reply_markup=keyboard
-                )
             await update.callback_query.answer()
 
-        else:
-            if os.path.exists(image_path):
-                with open(image_path, 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=message_text,
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
-            else:
-                await update.message.reply_text(
-                    message_text,
-                    parse_mode='HTML',
-                    reply_markup=keyboard
-                )
-
         return SELECTING_TOPIC
 
     except Exception as e:
         logger.error(f"Ошибка при запуске квиза: {e}")
-        error_text = "😔 Произошла ошибка при запуске квиза. Попробуйте позже."
-
-        if update.callback_query:
-            await update.callback_query.edit_message_text(error_text)
-        else:
-            await update.message.reply_text(error_text)
+        await show_screen(update, "😔 Произошла ошибка при запуске квиза. Попробуйте позже.")
 
         return -1
 
 
+def remember_question(context: ContextTypes.DEFAULT_TYPE, topic_key, question_id):
+    scope = f"quiz:{topic_key}"
+    seen = load_seen(context.user_data, scope)
+    seen.add(question_id)
+    save_seen(context.user_data, scope, seen)
+
+
+def pick_banked_question(topic_key, context: ContextTypes.DEFAULT_TYPE):
+    """Вопрос из банка, который пользователь ещё не видел, или None"""
+    seen = load_seen(context.user_data, f"quiz:{topic_key}")
+    picked = question_bank.pick(topic_key, exclude=seen)
+    if not picked:
+        return None
+    question_id, question = picked
+    remember_question(context, topic_key, question_id)
+    return question
+
+
+async def generate_new_question(topic_key, topic_data, context: ContextTypes.DEFAULT_TYPE):
+    """Сгенерировать вопрос через ChatGPT и пополнить им банк"""
+    question = await generate_quiz_question(topic_data)
+    question_id = await question_bank.add_async(topic_key, question)
+    if question_id is None:
+        # Такой вопрос уже есть в банке - отмечаем показанным его, чтобы банк не выдал его снова
+        question_id = question_bank.find(question)
+    if question_id is not None:
+        remember_question(context, topic_key, question_id)
+    return question
+
+
 async def topic_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
+    quiz_prefetcher.release(update.effective_user.id)
+    return await show_question(update, context, query.data.replace("quiz_topic_", ""))
+
+
+async def show_question(update: Update, context: ContextTypes.DEFAULT_TYPE, topic_key):
+    """Показать вопрос по теме: заранее подготовленный, из банка или сгенерированный"""
+    query = update.callback_query
 
     try:
-        topic_key = query.data.replace("quiz_topic_", "")
         topic_data = get_quiz_topic_data(topic_key)
 
         if not topic_data:
@@ -105,101 +109,93 @@ async def topic_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data['current_quiz_topic'] = topic_key
         context.user_data['quiz_topic_data'] = topic_data
         processing_text = f"{topic_data['emoji']} Генерирую вопрос по теме {topic_data['name']}... ⏳"
-        if query.message.photo:
-            await query.edit_message_caption(processing_text, parse_mode='HTML')
-        else:
-            await query.edit_message_text(processing_text, parse_mode='HTML')
-
-        question = await get_personality_response("Создай вопрос для квиза", topic_data['prompt'])
-        context.user_data['current_question'] = question
-
-        correct_answer = extract_correct_answer(question)
-        context.user_data['correct_answer'] = correct_answer
-
-        message_text = (
-            f"{topic_data['emoji']} <b>Квиз: {topic_data['name']}</b>\n\n"
-            f"{question}\n\n"
-            f"📊 <b>Счет:</b> {context.user_data['quiz_score']}/{context.user_data['quiz_total']}\n\n"
-            "✍️ Напишите ваш ответ (A, B, C или D):"
-        )
 
-        if query.message.photo:
-            await query.edit_message_caption(
-                caption=message_text,
-                parse_mode='HTML'
-            )
-        else:
-            await query.edit_message_text(
-                text=message_text,
-                parse_mode='HTML'
+        # Вопрос из банка или готовой подготовки выводится одной правкой;
+        # заглушка появляется, только если ожидание генерации затянулось
+        async with ProgressMessage(edit=query.message, placeholder=processing_text) as progress:
+            question = None
+            prefetch = quiz_prefetcher.pop(update.effective_user.id, topic_key)
+            if prefetch is not None:
+                picked = await prefetch.result()
+                if picked:
+                    question_id, question = picked
+                    if question_id is not None:
+                        remember_question(context, topic_key, question_id)
+
+            if question is None:
+                question = pick_banked_question(topic_key, context)
+            if question is None:
+                # Банк по теме исчерпан - генерируем вопрос вживую
+                question = await generate_new_question(topic_key, topic_data, context)
+
+            context.user_data['current_question'] = question.to_dict()
+            context.user_data['correct_answer'] = question.correct
+
+            message_text = (
+                f"{topic_data['emoji']} <b>Квиз: {topic_data['name']}</b>\n\n"
+                f"{question.format_text()}\n\n"
+                f"📊 <b>Счет:</b> {context.user_data['quiz_score']}/{context.user_data['quiz_total']}\n\n"
+                "✍️ Напишите ваш ответ (A, B, C или D):"
             )
+            await progress.finish(message_text)
 
         return ANSWERING_QUESTION
 
     except Exception as e:
-        logger.error(f"Ошибка при выборе темы квиза: {e}")
+        if isinstance(e, BudgetExceeded):
+            error_text = e.user_message
+        else:
+            logger.error(f"Ошибка при выборе темы квиза: {e}")
+            error_text = "😔 Произошла ошибка при генерации вопроса. Попробуйте еще раз."
         try:
             if query.message.photo:
-                await query.edit_message_caption("😔 Произошла ошибка при генерации вопроса. Попробуйте еще раз.")
+                await query.edit_message_caption(error_text)
             else:
-                await query.edit_message_text("😔 Произошла ошибка при генерации вопроса. Попробуйте еще раз.")
+                await query.edit_message_text(error_text)
         except Exception:
             await context.bot.send_message(
                 chat_id=query.message.chat_id,
-                text="😔 Произошла ошибка при генерации вопроса. Попробуйте еще раз."
+                text=error_text
             )
         return -1
 
 
 async def handle_quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        user_answer = update.message.text.strip().upper()
-        correct_answer = context.user_data.get('correct_answer', '').upper()
         topic_data = context.user_data.get('quiz_topic_data')
-        current_question = context.user_data.get('current_question', '')
-
+        question_data = context.user_data.get('current_question')
 
-        if not topic_data or not correct_answer:
+        if not topic_data or not isinstance(question_data, dict):
             await update.message.reply_text(
                 "❌ Произошла ошибка: данные квиза не найдены. Используйте /quiz для начала."
             )
             return -1
 
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-        is_correct = user_answer == correct_answer
+        question = QuizQuestion.from_dict(question_data)
+        user_answer = parse_answer(update.message.text)
+        if user_answer is None:
+            await update.message.reply_text("✍️ Напишите букву ответа: A, B, C или D.")
+            return ANSWERING_QUESTION
+
+        is_correct = user_answer == question.correct
 
         # Обновляем счетчик
         context.user_data['quiz_total'] += 1
         if is_correct:
             context.user_data['quiz_score'] += 1
 
-        # Отправляем сообщение о том, что проверяем ответ
-        processing_msg = await update.message.reply_text(
-            f"{topic_data['emoji']} Проверяю ответ... ⏳"
-        )
-
-        # Получаем детальный анализ ответа от ChatGPT
-        analysis_prompt = f"""Пользователь ответил '{user_answer}' на вопрос:
-        {current_question}
-    
-        Правильный ответ: {correct_answer}
-    
-        Дай краткое объяснение (2-3 предложения), почему ответ правильный или неправильный, и интересный факт по теме."""
-
-        detailed_response = await get_personality_response(analysis_prompt,
-                                                           "Ты эксперт по квизам, объясняешь ответы понятно и интересно.")
-
-        # Формируем результат
+        # Пояснение уже пришло вместе с вопросом - отвечаем сразу
         if is_correct:
-            result_text = f"✅ <b>Правильно!</b>\n\n{detailed_response}"
+            result_text = f"✅ <b>Правильно!</b>\n\n{question.explain(user_answer)}"
         else:
-            result_text = f"❌ <b>Неправильно!</b>\n\nПравильный ответ: <b>{correct_answer}</b>\n\n{detailed_response}"
+            result_text = (
+                f"❌ <b>Неправильно!</b>\n\nПравильный ответ: <b>{question.correct}</b>\n\n"
+                f"{question.explain(user_answer)}"
+            )
 
         # Кнопки для продолжения
         keyboard = get_quiz_continue_keyboard(context.user_data['current_quiz_topic'])
 
-        # Удаляем сообщение об обработке и отправляем результат
-        await processing_msg.delete()
         await update.message.reply_text(
             f"{topic_data['emoji']} <b>Результат квиза</b>\n\n"
             f"{result_text}\n\n"
@@ -208,6 +204,15 @@ async def handle_quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE)
             reply_markup=keyboard
         )
 
+        # Пока пользователь читает результат, готовим следующий вопрос
+        topic_key = context.user_data['current_quiz_topic']
+        quiz_prefetcher.start(
+            update.effective_user.id,
+            topic_key,
+            topic_data,
+            load_seen(context.user_data, f"quiz:{topic_key}")
+        )
+
         return ANSWERING_QUESTION
 
     except Exception as e:
@@ -225,20 +230,17 @@ async def handle_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 
     try:
         if query.data.startswith("quiz_continue_"):
-            # Продолжаем с той же темой
+            # Продолжаем с той же темой: вопрос обычно уже подготовлен заранее
             topic_key = query.data.replace("quiz_continue_", "")
-            context.user_data['current_quiz_topic'] = topic_key
-            context.user_data['quiz_topic_data'] = get_quiz_topic_data(topic_key)
-
-            # Перенаправляем на выбор темы (это сгенерирует новый вопрос)
-            fake_query_data = f"quiz_topic_{topic_key}"
-            query.data = fake_query_data
-            return await topic_selected(update, context)
+            return await show_question(update, context, topic_key)
 
         elif query.data == "quiz_change_topic":
+            quiz_prefetcher.release(update.effective_user.id)
             return await quiz_start(update, context)
 
         elif query.data == "quiz_finish":
+            quiz_prefetcher.release(update.effective_user.id)
+
             # Показываем финальный результат
             score = context.user_data.get('quiz_score', 0)
             total = context.user_data.get('quiz_total', 0)
@@ -302,22 +304,3 @@ async def handle_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 
     return ANSWERING_QUESTION
 
-
-def extract_correct_answer(question_text):
-    """Извлекает правильный ответ из текста вопроса"""
-    try:
-        lines = question_text.split('\n')
-        for line in lines:
-            if 'правильный ответ' in line.lower():
-                match = re.search(r'[ABCD]', line.upper())
-                if match:
-                    return match.group()
-
-        match = re.search(r'ответ:\s*([ABCD])', question_text.upper())
-        if match:
-            return match.group(1)
-
-        return 'A'  # Fallback
-    except Exception as e:
-        logger.error(f"Ошибка при извлечении правильного ответа: {e}")
-        return 'A'
@@ -2,54 +2,81 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from services.openai_client import get_random_fact
+from services.fact_pool import fact_pool
+from services.progress import ProgressMessage
+from services.seen_sets import load_seen, save_seen
+from services.subscriptions import subscription_store
 
 logger = logging.getLogger(__name__)
 
+SEEN_SCOPE = "facts"
+
+
+async def show_fact(progress: ProgressMessage, context: ContextTypes.DEFAULT_TYPE):
+    """Вывести факт одним сообщением; заглушка появляется, только если пул пуст и генерация затянулась"""
+    seen = load_seen(context.user_data, SEEN_SCOPE)
+    async with progress:
+        fact = fact_pool.take(seen)
+        if fact is None:
+            fact = await fact_pool.get(seen)
+        save_seen(context.user_data, SEEN_SCOPE, seen)
 
-async def random_fact(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка команды /random_fact"""
-    try:
-        loading_msg = await update.message.reply_text("🎲 Генерирую интересный факт... ⏳")
-        fact = await get_random_fact()
         keyboard = [
-                    [InlineKeyboardButton("🎲 Хочу ещё факт", callback_data="random_more")],
-                    [InlineKeyboardButton("🏠 Закончить", callback_data="random_finish")]
-                ]
+            [InlineKeyboardButton("🎲 Хочу ещё факт", callback_data="random_more")],
+            [InlineKeyboardButton("🔔 Присылать факт дня", callback_data="random_subscribe")],
+            [InlineKeyboardButton("🏠 Закончить", callback_data="random_finish")]
+        ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await loading_msg.edit_text(
-            f"🧠 <b>Интересный факт:</b>\n\n{fact}",
-            parse_mode='HTML',
-            reply_markup=reply_markup
-        )
+        await progress.finish(f"🧠 <b>Интересный факт:</b>\n\n{fact}", reply_markup=reply_markup)
+
+
+async def random_fact(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /random_fact"""
+    try:
+        progress = ProgressMessage(reply_to=update.message, placeholder="🎲 Генерирую интересный факт... ⏳")
+        await show_fact(progress, context)
 
     except Exception as e:
         logger.error(f"Ошибка при получении факта от OpenAI: {e}")
         await update.message.reply_text("🤔 К сожалению, не удалось получить факт в данный момент. Попробуйте позже!")
 
 
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /subscribe: ежедневная рассылка факта дня"""
+    await subscription_store.subscribe(update.effective_chat.id)
+    await update.message.reply_text(
+        "🔔 Готово! Каждый день я буду присылать вам интересный факт.\n"
+        "Отписаться можно командой /unsubscribe."
+    )
+
+
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /unsubscribe"""
+    await subscription_store.unsubscribe(update.effective_chat.id)
+    await update.message.reply_text("🔕 Вы отписались от факта дня. Вернуться можно командой /subscribe.")
+
+
 async def random_fact_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка нажатий кнопок для рандомных фактов"""
     query = update.callback_query
+
+    # Подписка отвечает всплывающим уведомлением, не трогая сообщение с фактом
+    if query.data == "random_subscribe":
+        await subscription_store.subscribe(update.effective_chat.id)
+        await query.answer("🔔 Факт дня будет приходить каждый день. Отписаться: /unsubscribe", show_alert=True)
+        return
+    if query.data == "random_unsubscribe":
+        await subscription_store.unsubscribe(update.effective_chat.id)
+        await query.answer("🔕 Вы отписались от факта дня. Вернуться: /subscribe", show_alert=True)
+        return
+
     await query.answer()
 
     if query.data == "random_more":
         try:
-            await query.edit_message_text("🎲 Генерирую новый факт... ⏳")
-
-            fact = await get_random_fact()
-            keyboard = [
-                [InlineKeyboardButton("🎲 Хочу ещё факт", callback_data="random_more")],
-                [InlineKeyboardButton("🏠 Закончить", callback_data="random_finish")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await query.edit_message_text(
-                f"🧠 <b>Интересный факт:</b>\n\n{fact}",
-                parse_mode='HTML',
-                reply_markup=reply_markup
-            )
+            progress = ProgressMessage(edit=query.message, placeholder="🎲 Генерирую новый факт... ⏳")
+            await show_fact(progress, context)
         except Exception as e:
             logger.error(f"Ошибка при получении нового факта: {e}")
             await query.edit_message_text(
@@ -75,20 +102,8 @@ async def random_fact_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 
     elif query.data == "random_fact":
         try:
-            await query.edit_message_text("🎲 Генерирую интересный факт... ⏳")
-
-            fact = await get_random_fact()
-            keyboard = [
-                [InlineKeyboardButton("🎲 Хочу ещё факт", callback_data="random_more")],
-                [InlineKeyboardButton("🏠 Закончить", callback_data="random_finish")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await query.edit_message_text(
-                f"🧠 <b>Интересный факт:</b>\n\n{fact}",
-                parse_mode='HTML',
-                reply_markup=reply_markup
-            )
+            progress = ProgressMessage(edit=query.message, placeholder="🎲 Генерирую интересный факт... ⏳")
+            await show_fact(progress, context)
         except Exception as e:
             logger.error(f"Ошибка при получении факта из меню: {e}")
             await query.edit_message_text(
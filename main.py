@@ -1,7 +1,24 @@
+import asyncio
 import logging
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ConversationHandler, MessageHandler, filters
-from config import TG_BOT_TOKEN
+from telegram import Update
+from telegram.ext import (Application, CommandHandler, CallbackQueryHandler, ConversationHandler, MessageHandler,
+                          TypeHandler, filters)
+from config import (TG_BOT_TOKEN, TELEGRAM_API_URL, BOT_MODE, UPDATE_QUEUE_SIZE, CONCURRENT_UPDATES, PERSISTENCE_DB,
+                    PERSISTENCE_UPDATE_INTERVAL, PERSISTENCE_FLUSH_INTERVAL, PERSISTENCE_FLUSH_SIZE,
+                    METRICS_LISTEN, METRICS_PORT, TELEGRAM_GLOBAL_PER_SECOND, TELEGRAM_CHAT_PER_SECOND,
+                    TELEGRAM_CHAT_BURST, TELEGRAM_GROUP_PER_MINUTE, TELEGRAM_MAX_RETRIES)
 from handlers import basic, random_fact, chatgpt_interface, personality_chat, quiz
+from services import metrics
+from services.chat_tasks import chat_tasks
+from services.fact_broadcast import fact_broadcaster
+from services.fact_pool import fact_pool
+from services.openai_client import semantic_cache
+from services.persistence import SqlitePersistence
+from services.question_bank import question_bank
+from services.token_budget import token_budgets, bind_user
+from services.telegram_limiter import TelegramRateLimiter
+from services.update_processor import ChatOrderedUpdateProcessor
+from services.webhook import run_webhook
 from warnings import filterwarnings
 from telegram.warnings import PTBUserWarning
 
@@ -13,81 +30,165 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-
-def main():
-    try:
-        application = Application.builder().token(TG_BOT_TOKEN).build()
-
-        application.add_handler(CommandHandler("start", basic.start))
-        application.add_handler(CommandHandler("random", random_fact.random_fact))
-        application.add_handler(CommandHandler("gpt", chatgpt_interface.gpt_command))
-        application.add_handler(CommandHandler("personality", personality_chat.talk_command))
-        application.add_handler(CommandHandler("quiz", quiz.quiz_command))
-
-        gpt_conversation = ConversationHandler(
-            entry_points=[CallbackQueryHandler(chatgpt_interface.gpt_start, pattern="^gpt_interface$")],
-            states={
-                chatgpt_interface.WAITING_FOR_MESSAGE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, chatgpt_interface.handle_gpt_message)
-                ],
-            },
-            fallbacks=[
-                CommandHandler("start", basic.start),
-                CallbackQueryHandler(basic.menu_callback, pattern="^(gpt_finish|main_menu)$")
+metrics_server = metrics.build_metrics_server()
+
+
+async def post_init(application: Application):
+    """Запуск фоновых задач после инициализации бота"""
+    await asyncio.to_thread(question_bank.load)
+    fact_pool.start()
+    token_budgets.start()
+    fact_broadcaster.start(application.bot)
+    if METRICS_PORT:
+        await metrics_server.start(METRICS_LISTEN, METRICS_PORT)
+
+
+async def post_shutdown(application: Application):
+    """Остановка фоновых задач"""
+    await chat_tasks.cancel_all()
+    await fact_broadcaster.stop()
+    if semantic_cache is not None:
+        await asyncio.to_thread(semantic_cache.save)
+    await fact_pool.stop()
+    await token_budgets.stop()
+    await metrics_server.stop()
+
+
+def build_application() -> Application:
+    """Собрать Application со всеми обработчиками (используется и бенчмарком)"""
+    builder = (
+        Application.builder()
+        .token(TG_BOT_TOKEN)
+        .request(metrics.InstrumentedRequest(connection_pool_size=256))
+        .get_updates_request(metrics.InstrumentedRequest(connection_pool_size=1))
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        .concurrent_updates(ChatOrderedUpdateProcessor(CONCURRENT_UPDATES))
+        .rate_limiter(TelegramRateLimiter(
+            global_per_second=TELEGRAM_GLOBAL_PER_SECOND,
+            chat_per_second=TELEGRAM_CHAT_PER_SECOND,
+            chat_burst=TELEGRAM_CHAT_BURST,
+            group_per_minute=TELEGRAM_GROUP_PER_MINUTE,
+            max_retries=TELEGRAM_MAX_RETRIES
+        ))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if PERSISTENCE_DB:
+        builder = builder.persistence(SqlitePersistence(
+            PERSISTENCE_DB,
+            update_interval=PERSISTENCE_UPDATE_INTERVAL,
+            flush_interval=PERSISTENCE_FLUSH_INTERVAL,
+            flush_size=PERSISTENCE_FLUSH_SIZE
+        ))
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(TELEGRAM_API_URL).base_file_url(TELEGRAM_API_URL.replace("/bot", "/file/bot"))
+    application = builder.build()
+
+    # Запросы к OpenAI из обработчиков учитываются в бюджете автора обновления
+    application.add_handler(TypeHandler(Update, bind_user), group=-1)
+    application.add_handler(CommandHandler("start", basic.start))
+    application.add_handler(CommandHandler("random", random_fact.random_fact))
+    application.add_handler(CommandHandler("subscribe", random_fact.subscribe))
+    application.add_handler(CommandHandler("unsubscribe", random_fact.unsubscribe))
+    application.add_handler(CommandHandler("gpt", chatgpt_interface.gpt_command))
+    application.add_handler(CommandHandler("personality", personality_chat.talk_command))
+    application.add_handler(CommandHandler("quiz", quiz.quiz_command))
+
+    gpt_conversation = ConversationHandler(
+        entry_points=[CallbackQueryHandler(chatgpt_interface.gpt_start, pattern="^gpt_interface$")],
+        states={
+            chatgpt_interface.WAITING_FOR_MESSAGE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, chatgpt_interface.handle_gpt_message)
             ],
-            per_message=True,
-        )
-
-        personality_conversation = ConversationHandler(
-            entry_points=[
-                CallbackQueryHandler(personality_chat.talk_start, pattern="^talk_interface$"),
-                CommandHandler("talk", personality_chat.talk_command)
+        },
+        fallbacks=[
+            CommandHandler("start", basic.start),
+            CallbackQueryHandler(chatgpt_interface.gpt_finish, pattern="^gpt_finish$"),
+            CallbackQueryHandler(basic.menu_callback, pattern="^main_menu$")
+        ],
+        name="gpt",
+        persistent=bool(PERSISTENCE_DB),
+    )
+
+    personality_conversation = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(personality_chat.talk_start, pattern="^talk_interface$"),
+            CommandHandler("talk", personality_chat.talk_command)
+        ],
+        states={
+            personality_chat.SELECTING_PERSONALITY: [
+                CallbackQueryHandler(personality_chat.personality_selected, pattern="^personality_")
             ],
-            states={
-                personality_chat.SELECTING_PERSONALITY: [
-                    CallbackQueryHandler(personality_chat.personality_selected, pattern="^personality_")
-                ],
-                personality_chat.CHATTING_WITH_PERSONALITY: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, personality_chat.handle_personality_message),
-                    CallbackQueryHandler(personality_chat.handle_personality_callback,
-                                         pattern="^(continue_chat|change_personality|finish_talk)$")
-                ],
-            },
-            fallbacks=[
-                CommandHandler("start", basic.start),
-                CallbackQueryHandler(basic.menu_callback, pattern="^main_menu$")
+            personality_chat.CHATTING_WITH_PERSONALITY: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, personality_chat.handle_personality_message),
+                CallbackQueryHandler(personality_chat.handle_personality_callback,
+                                     pattern="^(continue_chat|change_personality|finish_talk)$")
             ],
-        )
-
-        quiz_conversation = ConversationHandler(
-            entry_points=[
-                CallbackQueryHandler(quiz.quiz_start, pattern="^quiz_interface$"),
-                CommandHandler("quiz", quiz.quiz_command)
+        },
+        fallbacks=[
+            CommandHandler("start", basic.start),
+            CallbackQueryHandler(basic.menu_callback, pattern="^main_menu$")
+        ],
+        name="personality",
+        persistent=bool(PERSISTENCE_DB),
+    )
+
+    quiz_conversation = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(quiz.quiz_start, pattern="^quiz_interface$"),
+            CommandHandler("quiz", quiz.quiz_command)
+        ],
+        states={
+            quiz.SELECTING_TOPIC: [
+                CallbackQueryHandler(quiz.topic_selected, pattern="^quiz_topic_")
             ],
-            states={
-                quiz.SELECTING_TOPIC: [
-                    CallbackQueryHandler(quiz.topic_selected, pattern="^quiz_topic_")
-                ],
-                quiz.ANSWERING_QUESTION: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, quiz.handle_quiz_answer),
-                    CallbackQueryHandler(quiz.handle_quiz_callback,
-                                         pattern="^(quiz_continue_|quiz_change_topic|quiz_finish)$")
-                ],
-            },
-            fallbacks=[
-                CommandHandler("start", basic.start),
-                CallbackQueryHandler(basic.menu_callback, pattern="^main_menu$")
+            quiz.ANSWERING_QUESTION: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, quiz.handle_quiz_answer),
+                CallbackQueryHandler(quiz.handle_quiz_callback,
+                                     pattern="^(quiz_continue_.+|quiz_change_topic|quiz_finish)$")
             ],
-        )
+        },
+        fallbacks=[
+            CommandHandler("start", basic.start),
+            CallbackQueryHandler(basic.menu_callback, pattern="^main_menu$")
+        ],
+        name="quiz",
+        persistent=bool(PERSISTENCE_DB),
+    )
+
+    application.add_handler(quiz_conversation)
+    application.add_handler(personality_conversation)
+    application.add_handler(gpt_conversation)
+    application.add_handler(CallbackQueryHandler(random_fact.random_fact_callback, pattern="^random_"))
+    application.add_handler(CallbackQueryHandler(basic.menu_callback))
+
+    metrics.instrument_application(application)
+    metrics.collect_gauge("bot_update_queue_size", "Обновления, ожидающие обработки",
+                          application.update_queue.qsize)
+    processor = application.update_processor
+    metrics.collect_gauge("bot_updates_in_progress", "Обновления, обрабатываемые прямо сейчас",
+                          lambda: processor.current_concurrent_updates)
+    metrics.collect_gauge("bot_updates_waiting_in_chat", "Обновления, ждущие окончания предыдущего в том же чате",
+                          processor.pending)
+    limiter = application.bot.rate_limiter
+    metrics.collect_gauge("telegram_queue_depth", "Запросы к Bot API, ждущие лимитов",
+                          lambda: limiter.queue_depth)
+    metrics.collect_counter("telegram_retries_total", "Повторы запросов к Bot API после RetryAfter",
+                            lambda: limiter.retries)
+    metrics.collect_counter("telegram_chat_actions_dropped_total", "Устаревшие индикаторы набора, не отправленные",
+                            lambda: limiter.dropped_actions)
+    return application
+
 
-        application.add_handler(quiz_conversation)
-        application.add_handler(personality_conversation)
-        application.add_handler(gpt_conversation)
-        application.add_handler(CallbackQueryHandler(random_fact.random_fact_callback, pattern="^random_"))
-        application.add_handler(CallbackQueryHandler(basic.menu_callback))
+def main():
+    try:
+        application = build_application()
 
-        logger.info("Бот запущен успешно!")
-        application.run_polling()
+        logger.info(f"Бот запущен успешно! Режим: {BOT_MODE}")
+        if BOT_MODE == "webhook":
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling()
 
     except Exception as e:
         logger.error('Ошибка при запуске', e)
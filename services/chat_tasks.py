@@ -0,0 +1,65 @@
+"""Текущая генерация ответа в каждом чате.
+
+Ответ ChatGPT или личности генерируется фоновой задачей, привязанной к
+чату. Новое сообщение пользователя или кнопка завершения диалога
+отменяют незаконченную генерацию: поток от OpenAI закрывается сразу, и
+недочитанные токены не оплачиваются. Следующая генерация стартует только
+после того, как отменённая убрала за собой, поэтому ответы в чате всегда
+идут в порядке сообщений.
+"""
+import asyncio
+import logging
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ChatTasks:
+    """Реестр chat_id -> выполняющаяся задача генерации."""
+
+    def __init__(self):
+        self._tasks = {}
+        self.started = 0
+        self.cancelled = 0
+
+    async def start(self, chat_id: int, coro) -> asyncio.Task:
+        """Отменить текущую генерацию в чате и запустить coro вместо неё"""
+        await self.cancel(chat_id)
+        task = asyncio.create_task(coro)
+        self._tasks[chat_id] = task
+        task.add_done_callback(lambda done: self._forget(chat_id, done))
+        self.started += 1
+        return task
+
+    async def cancel(self, chat_id: int) -> bool:
+        """Отменить генерацию в чате и дождаться её завершения; True, если было что отменять"""
+        task = self._tasks.pop(chat_id, None)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        # wait, а не await: отмена чужой задачи не должна выглядеть как отмена текущей
+        await asyncio.wait({task})
+        self.cancelled += 1
+        logger.info(f"Генерация ответа в чате {chat_id} отменена")
+        return True
+
+    async def cancel_all(self):
+        for chat_id in list(self._tasks):
+            await self.cancel(chat_id)
+
+    def active(self) -> int:
+        return len(self._tasks)
+
+    def _forget(self, chat_id: int, task: asyncio.Task):
+        if self._tasks.get(chat_id) is task:
+            del self._tasks[chat_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка генерации ответа в чате {chat_id}: {task.exception()}")
+
+
+chat_tasks = ChatTasks()
+
+metrics.collect_gauge("chat_generations_active", "Генерации ответов, выполняющиеся в чатах", chat_tasks.active)
+metrics.collect_counter("chat_generations_cancelled_total", "Генерации, отменённые новым сообщением или кнопкой",
+                        lambda: chat_tasks.cancelled)
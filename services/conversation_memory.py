@@ -0,0 +1,167 @@
+"""Память диалогов с ChatGPT и личностями в пределах бюджета токенов.
+
+Последние реплики передаются модели дословно, а более старые в фоне
+сворачиваются в краткое содержание. Вместе с ним история никогда не
+превышает token_budget, поэтому размер промпта не растёт с длиной
+диалога. Число токенов каждой реплики считается один раз и хранится
+рядом с текстом. История лежит в context.user_data и сохраняется вместе
+с остальными данными пользователя.
+
+Если свернуть не удалось (бюджет токенов, недоступный OpenAI), реплики,
+не помещающиеся в промпт, отбрасываются, а новая попытка делается не
+раньше чем через SUMMARY_RETRY_DELAY секунд.
+"""
+import asyncio
+import logging
+import time
+from functools import lru_cache
+
+from config import MEMORY_TOKEN_BUDGET, MEMORY_SUMMARY_TOKENS
+from services.llm_gateway import Priority
+from services.openai_client import complete, FEATURE_SUMMARY
+
+logger = logging.getLogger(__name__)
+
+# Служебные токены на каждое сообщение в формате chat completions
+MESSAGE_OVERHEAD = 4
+# Пауза перед новой попыткой свернуть историю после ошибки, секунды
+SUMMARY_RETRY_DELAY = 300
+
+SUMMARY_PROMPT = (
+    "Ты ведёшь краткое содержание диалога пользователя с ассистентом. "
+    "Дополни текущее содержание новыми репликами: сохрани факты о пользователе, "
+    "его вопросы, договорённости и важные детали ответов. Пиши сжато, на русском языке, "
+    "не более {limit} слов."
+)
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Оценка числа токенов сообщения (та же, что у LLMGateway, плюс служебные токены)"""
+    return len(text) // 3 + MESSAGE_OVERHEAD
+
+
+class ConversationMemory:
+    """Истории диалогов в user_data с фоновым сворачиванием старых реплик."""
+
+    def __init__(self, token_budget: int, summary_tokens: int):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        # Дословные реплики занимают бюджет за вычетом места под краткое содержание
+        self.recent_budget = token_budget - summary_tokens
+        # (user_id, scope) -> задача сворачивания
+        self._summarizing = {}
+
+    @staticmethod
+    def history(user_data: dict, scope: str) -> dict:
+        return user_data.setdefault('memory', {}).setdefault(scope, {"summary": "", "turns": []})
+
+    @staticmethod
+    def reset(user_data: dict, scope: str):
+        user_data.get('memory', {}).pop(scope, None)
+
+    def context_messages(self, user_data: dict, scope: str):
+        """Краткое содержание и последние реплики, укладывающиеся в бюджет"""
+        history = self.history(user_data, scope)
+        messages = []
+        used = 0
+        if history["summary"]:
+            messages.append({
+                "role": "system",
+                "content": f"Краткое содержание предыдущего диалога:\n{history['summary']}"
+            })
+            used = count_tokens(history["summary"])
+
+        # Пока сворачивание не закончилось, самые старые реплики просто не попадают в промпт
+        recent = []
+        for turn in reversed(history["turns"]):
+            if used + turn["tokens"] > self.token_budget:
+                break
+            used += turn["tokens"]
+            recent.append({"role": turn["role"], "content": turn["content"]})
+        messages.extend(reversed(recent))
+        return messages
+
+    def add_turn(self, user_data: dict, scope: str, user_id: int, user_message: str, answer: str):
+        """Запомнить реплику пользователя и ответ; при переполнении свернуть старые в фоне"""
+        history = self.history(user_data, scope)
+        for role, content in (("user", user_message), ("assistant", answer)):
+            history["turns"].append({"role": role, "content": content, "tokens": count_tokens(content)})
+
+        key = (user_id, scope)
+        if self._turn_tokens(history) <= self.recent_budget or key in self._summarizing:
+            return
+        if time.time() < history.get("retry_at", 0):
+            # Сворачивание недавно не удалось - до новой попытки история не растёт сверх промпта
+            self._drop_overflow(history)
+            return
+        task = asyncio.create_task(self._summarize(history))
+        self._summarizing[key] = task
+        task.add_done_callback(lambda _: self._summarizing.pop(key, None))
+
+    @staticmethod
+    def _turn_tokens(history: dict) -> int:
+        return sum(turn["tokens"] for turn in history["turns"])
+
+    async def _summarize(self, history: dict):
+        # Сворачиваем старые реплики, пока дословно не останется половина бюджета
+        turns = history["turns"]
+        keep = 0
+        kept_tokens = 0
+        for turn in reversed(turns):
+            if kept_tokens + turn["tokens"] > self.recent_budget // 2:
+                break
+            kept_tokens += turn["tokens"]
+            keep += 1
+        old = turns[:len(turns) - keep]
+        if not old:
+            return
+
+        dialog = "\n".join(
+            f"{'Пользователь' if turn['role'] == 'user' else 'Ассистент'}: {turn['content']}" for turn in old
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT.format(limit=self.summary_tokens // 2)},
+            {
+                "role": "user",
+                "content": f"Текущее содержание:\n{history['summary'] or '(пусто)'}\n\nНовые реплики:\n{dialog}"
+            }
+        ]
+        try:
+            summary = await complete(
+                messages,
+                max_tokens=self.summary_tokens,
+                temperature=0.3,
+                feature=FEATURE_SUMMARY,
+                priority=Priority.BACKGROUND,
+                coalesce=False
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось свернуть историю диалога: {e}")
+            history["retry_at"] = time.time() + SUMMARY_RETRY_DELAY
+            self._drop_overflow(history)
+            return
+
+        # Новые реплики добавляются только в конец, поэтому старые по-прежнему в начале списка
+        history["summary"] = summary
+        del history["turns"][:len(old)]
+        history.pop("retry_at", None)
+        logger.info(f"История диалога свёрнута: {len(old)} реплик")
+
+    def _drop_overflow(self, history: dict):
+        """Отбросить старые реплики, которые всё равно не попадают в промпт"""
+        budget = self.token_budget - (count_tokens(history["summary"]) if history["summary"] else 0)
+        keep = 0
+        used = 0
+        for turn in reversed(history["turns"]):
+            if used + turn["tokens"] > budget:
+                break
+            used += turn["tokens"]
+            keep += 1
+        dropped = len(history["turns"]) - keep
+        if dropped:
+            del history["turns"][:dropped]
+            logger.info(f"Из истории диалога без сворачивания отброшено {dropped} реплик")
+
+
+conversation_memory = ConversationMemory(MEMORY_TOKEN_BUDGET, MEMORY_SUMMARY_TOKENS)
@@ -0,0 +1,233 @@
+"""Ежедневная рассылка факта дня подписчикам.
+
+Раз в день в FACT_BROADCAST_TIME генерируется один факт или несколько
+вариантов (одним запросом с параметром n), они сохраняются вместе с
+состоянием рассылки, и подписчики получают их пачками: каждый чат -
+вариант по своему chat_id. Сообщения уходят с фоновым приоритетом
+TelegramRateLimiter, поэтому рассылка идёт со всей скоростью, которую
+оставляют лимиты Bot API, а ответы пользователям обгоняют её в очереди.
+
+После каждой пачки курсор сохраняется, а при остановке бота посреди пачки -
+курсор после непрерывно разосланного её начала; после рестарта рассылка
+продолжается с этого места (если процесс упал, повторно факт могут получить
+не больше batch_size подписчиков). Заблокировавшие бота отписываются
+автоматически.
+"""
+import asyncio
+import datetime
+import html
+import itertools
+import logging
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from config import (FACT_BROADCAST_TIME, FACT_BROADCAST_VARIANTS, FACT_BROADCAST_BATCH,
+                    FACT_BROADCAST_CONCURRENCY)
+from services.llm_gateway import Priority
+from services.openai_client import request_random_facts
+from services.subscriptions import BroadcastState, subscription_store
+from services.telegram_limiter import OutboundPriority, retry_after_seconds
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед новой попыткой, если факт для рассылки не удалось получить, секунды
+GENERATE_RETRY_DELAY = 300
+
+
+def _today() -> str:
+    return datetime.date.today().isoformat()
+
+
+def _seconds_until(at: str) -> float:
+    """Сколько секунд до ближайшего наступления времени at ("HH:MM") по местному времени"""
+    hour, minute = (int(part) for part in at.split(":"))
+    now = datetime.datetime.now()
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += datetime.timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+def _time_passed(at: str) -> bool:
+    hour, minute = (int(part) for part in at.split(":"))
+    now = datetime.datetime.now()
+    return (now.hour, now.minute) >= (hour, minute)
+
+
+def broadcast_text(fact: str) -> str:
+    # Текст модели экранируется: один "List<String>" в факте сломал бы разметку у всех подписчиков
+    return f"🌅 <b>Факт дня</b>\n\n{html.escape(fact)}"
+
+
+UNSUBSCRIBE_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔕 Отписаться от факта дня", callback_data="random_unsubscribe")]
+])
+
+
+class FactBroadcaster:
+    """Планировщик и исполнитель ежедневной рассылки."""
+
+    def __init__(self, store, send_time: str = FACT_BROADCAST_TIME, variants: int = FACT_BROADCAST_VARIANTS,
+                 batch_size: int = FACT_BROADCAST_BATCH, concurrency: int = FACT_BROADCAST_CONCURRENCY):
+        self.store = store
+        self.send_time = send_time
+        self.variants = max(1, variants)
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+
+        self.bot = None
+        self.state = None
+        # Скорость последней рассылки, сообщений в секунду
+        self.rate = 0.0
+        self._task = None
+
+    def start(self, bot):
+        """Запустить ежедневное расписание; пустой FACT_BROADCAST_TIME отключает рассылку"""
+        self.bot = bot
+        if self.send_time and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._schedule_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _schedule_loop(self):
+        while True:
+            day = _today()
+            state = await self.store.load_broadcast(day)
+            if (state is None or not state.done) and _time_passed(self.send_time):
+                # Время рассылки наступило или она прервалась рестартом
+                try:
+                    await self.run(day, state)
+                except Exception as e:
+                    logger.error(f"Рассылка факта дня не удалась: {e}")
+                    await asyncio.sleep(GENERATE_RETRY_DELAY)
+                continue
+            await asyncio.sleep(min(_seconds_until(self.send_time), 3600))
+
+    async def _generate(self):
+        facts = await request_random_facts(n=self.variants, priority=Priority.BACKGROUND)
+        variants = list(dict.fromkeys(fact.strip() for fact in facts if fact.strip()))
+        if not variants:
+            raise ValueError("OpenAI не вернул ни одного факта")
+        return variants
+
+    async def run(self, day: str = None, state: BroadcastState = None) -> BroadcastState:
+        """Разослать факт дня всем подписчикам (или продолжить прерванную рассылку)"""
+        day = day or _today()
+        total = await self.store.count()
+        if state is None or not state.variants:
+            state = state or BroadcastState(day, [])
+            # Факт генерируется, только если есть кому его отправить: решает первая страница
+            # подписчиков, а не count() - подписчик мог появиться между ними
+            if not await self.store.page(state.cursor, 1):
+                state.finished = time.time()
+                await self.store.save_broadcast(state)
+                logger.info(f"Рассылка факта дня за {day}: подписчиков нет")
+                self.state = state
+                return state
+            state.variants = await self._generate()
+            await self.store.save_broadcast(state)
+            logger.info(f"Рассылка факта дня за {day}: {len(state.variants)} вариантов, ~{total} подписчиков")
+        else:
+            logger.info(f"Продолжаю рассылку факта дня за {day} после chat_id {state.cursor}")
+        self.state = state
+
+        started = time.monotonic()
+        sent_before = state.sent
+        semaphore = asyncio.Semaphore(self.concurrency)
+        while True:
+            chat_ids = await self.store.page(state.cursor, self.batch_size)
+            if not chat_ids:
+                break
+
+            # chat_id -> исход отправки
+            outcomes = {}
+            try:
+                await asyncio.gather(*(self._send(chat_id, state, semaphore, outcomes) for chat_id in chat_ids))
+            except asyncio.CancelledError:
+                # Бот останавливается посреди пачки: сохраняем непрерывно разосланное начало пачки
+                done = list(itertools.takewhile(lambda chat_id: chat_id in outcomes, chat_ids))
+                if done:
+                    await self._checkpoint(state, done, outcomes)
+                raise
+            await self._checkpoint(state, chat_ids, outcomes)
+
+            self.rate = (state.sent - sent_before) / max(time.monotonic() - started, 1e-6)
+            logger.info(
+                f"Рассылка факта дня: отправлено {state.sent} из ~{total}, "
+                f"заблокировали бота {state.blocked}, ошибок {state.failed}, {self.rate:.1f} сообщений/с"
+            )
+
+        state.finished = time.time()
+        await self.store.save_broadcast(state)
+        logger.info(
+            f"Рассылка факта дня за {day} завершена: отправлено {state.sent}, заблокировали бота {state.blocked}, "
+            f"ошибок {state.failed}, за {time.monotonic() - started:.0f} с ({self.rate:.1f} сообщений/с)"
+        )
+        return state
+
+    async def _checkpoint(self, state: BroadcastState, chat_ids, outcomes: dict):
+        """Учесть исходы пачки и сохранить курсор после её последнего чата"""
+        blocked = [chat_id for chat_id in chat_ids if outcomes[chat_id] == "blocked"]
+        await self.store.mark_blocked(blocked)
+        state.sent += sum(1 for chat_id in chat_ids if outcomes[chat_id] == "sent")
+        state.blocked += len(blocked)
+        state.failed += sum(1 for chat_id in chat_ids if outcomes[chat_id] == "failed")
+        state.cursor = chat_ids[-1]
+        await self.store.save_broadcast(state)
+
+    async def _send(self, chat_id: int, state: BroadcastState, semaphore: asyncio.Semaphore, outcomes: dict):
+        fact = state.variants[chat_id % len(state.variants)]
+        async with semaphore:
+            outcome = await self._deliver(chat_id, broadcast_text(fact))
+        BROADCAST_MESSAGES.labels(outcome).inc()
+        outcomes[chat_id] = outcome
+
+    async def _deliver(self, chat_id: int, text: str, retry: bool = True) -> str:
+        try:
+            await self.bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                parse_mode='HTML',
+                reply_markup=UNSUBSCRIBE_KEYBOARD,
+                rate_limit_args=OutboundPriority.BACKGROUND
+            )
+            return "sent"
+        except Forbidden:
+            # Бот заблокирован или пользователь удалил аккаунт
+            return "blocked"
+        except BadRequest as e:
+            if "chat not found" in str(e).lower():
+                return "blocked"
+            logger.warning(f"Рассылка: не удалось отправить факт в чат {chat_id}: {e}")
+            return "failed"
+        except RetryAfter as e:
+            # Лимитер уже повторял запрос; ждём ещё раз и пробуем последний раз
+            if not retry:
+                return "failed"
+            await asyncio.sleep(retry_after_seconds(e.retry_after))
+            return await self._deliver(chat_id, text, retry=False)
+        except TelegramError as e:
+            logger.warning(f"Рассылка: ошибка Bot API для чата {chat_id}: {e}")
+            return "failed"
+
+    def active(self) -> int:
+        return int(self.state is not None and not self.state.done)
+
+
+fact_broadcaster = FactBroadcaster(subscription_store)
+
+BROADCAST_MESSAGES = metrics.counter("fact_broadcast_messages_total", "Сообщения рассылки факта дня по исходу",
+                                     ("result",))
+metrics.collect_gauge("fact_broadcast_send_rate", "Скорость текущей или последней рассылки, сообщений в секунду",
+                      lambda: fact_broadcaster.rate)
+metrics.collect_gauge("fact_broadcast_active", "Идёт ли сейчас рассылка факта дня", fact_broadcaster.active)
@@ -0,0 +1,160 @@
+"""Пул заранее сгенерированных случайных фактов.
+
+Фоновая задача держит в памяти запас готовых фактов и пополняет его,
+когда он опускается ниже нижней границы. Похожие факты отбрасываются,
+а уже показанные пользователю факты пропускаются по его SeenSet.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from collections import OrderedDict, deque
+
+from config import (FACT_POOL_SIZE, FACT_POOL_LOW_WATER, FACT_POOL_CONCURRENCY, FACT_POOL_MAX_SERVES,
+                    FACT_POOL_BATCH)
+from services.openai_client import request_random_facts, get_random_fact
+from services.seen_sets import SeenSet
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Факты с долей общих шинглов не ниже порога считаются дубликатами
+DUPLICATE_THRESHOLD = 0.6
+# Сколько последних фактов помним для поиска дубликатов
+RECENT_FACTS_LIMIT = 500
+
+
+def fact_id(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def shingles(text: str, size: int = 3) -> frozenset:
+    """Набор словесных n-грамм нормализованного текста"""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class FactPool:
+    """Ограниченный пул готовых фактов с фоновым пополнением."""
+
+    def __init__(self, fetch, fallback, max_size=FACT_POOL_SIZE, low_water=FACT_POOL_LOW_WATER,
+                 concurrency=FACT_POOL_CONCURRENCY, max_serves=FACT_POOL_MAX_SERVES):
+        # fetch возвращает список фактов и пробрасывает ошибки (для пополнения),
+        # fallback - живой запрос для пользователя
+        self.fetch = fetch
+        self.fallback = fallback
+        self.max_size = max_size
+        self.low_water = min(low_water, max_size)
+        self.concurrency = max(1, concurrency)
+        self.max_serves = max_serves
+
+        # fact_id -> [текст, сколько раз выдан]
+        self._facts = OrderedDict()
+        self._recent = deque(maxlen=RECENT_FACTS_LIMIT)
+        self._refill_needed = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._facts)
+
+    def start(self):
+        """Запустить фоновое пополнение пула"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refill_loop())
+            self._refill_needed.set()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def take(self, seen: SeenSet):
+        """Мгновенно выдать готовый факт, которого нет в seen, или None"""
+        for key, entry in self._facts.items():
+            if key in seen:
+                continue
+            entry[1] += 1
+            if entry[1] >= self.max_serves:
+                del self._facts[key]
+            seen.add(key)
+            self._check_low_water()
+            return entry[0]
+
+        return None
+
+    async def get(self, seen: SeenSet):
+        """Факт из пула, а если для пользователя ничего нет - живой запрос к OpenAI"""
+        fact = self.take(seen)
+        if fact is not None:
+            return fact
+
+        self._refill_needed.set()
+        fact = await self.fallback()
+        seen.add(fact_id(fact))
+        return fact
+
+    def add(self, text: str) -> bool:
+        """Добавить факт в пул; возвращает False для дубликатов и при переполнении"""
+        text = text.strip()
+        if not text or len(self._facts) >= self.max_size:
+            return False
+
+        key = fact_id(text)
+        fact_shingles = shingles(text)
+        if key in self._facts or any(similarity(fact_shingles, other) >= DUPLICATE_THRESHOLD
+                                     for other in self._recent):
+            logger.debug("Отброшен похожий факт")
+            return False
+
+        self._recent.append(fact_shingles)
+        self._facts[key] = [text, 0]
+        return True
+
+    def _check_low_water(self):
+        if len(self._facts) < self.low_water:
+            self._refill_needed.set()
+
+    async def _fetch_one(self):
+        try:
+            return await self.fetch()
+        except Exception as e:
+            logger.error(f"Ошибка при пополнении пула фактов: {e}")
+            return []
+
+    async def _refill_loop(self):
+        while True:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+
+            failures = 0
+            while len(self._facts) < self.max_size:
+                missing = self.max_size - len(self._facts)
+                batch = min(self.concurrency, -(-missing // FACT_POOL_BATCH))
+                results = await asyncio.gather(*(self._fetch_one() for _ in range(batch)))
+                added = sum(1 for facts in results for fact in facts if self.add(fact))
+                if added == 0:
+                    failures += 1
+                    if failures >= 3:
+                        # Апстрим недоступен или возвращает одни дубликаты - ждём следующего сигнала
+                        break
+                    await asyncio.sleep(2 ** failures)
+                else:
+                    failures = 0
+
+            logger.info(f"Пул фактов пополнен: {len(self._facts)}/{self.max_size}")
+
+
+fact_pool = FactPool(lambda: request_random_facts(FACT_POOL_BATCH), get_random_fact)
+metrics.collect_gauge("fact_pool_size", "Готовые факты в пуле", lambda: len(fact_pool))
@@ -0,0 +1,185 @@
+"""Минимальный асинхронный HTTP/1.1 сервер на asyncio.
+
+Нужен для вебхука Telegram и служебных эндпоинтов (/health и т.п.) без
+дополнительных зависимостей. Поддерживает keep-alive и тела запросов с
+Content-Length; chunked-запросы не поддерживаются. Заголовки и тело должны
+прийти за ограниченное время, а тело - уложиться в max_body байт, иначе
+соединение закрывается: медленные или зависшие клиенты не держат его вечно.
+"""
+import asyncio
+import json
+import logging
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+logger = logging.getLogger(__name__)
+
+
+class RequestError(Exception):
+    """Запрос нельзя обработать; клиенту уходит status и соединение закрывается."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: dict, body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = parse_qs(parts.query)
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body or b"null")
+
+
+class Response:
+    def __init__(self, status: int = 200, body=b"", content_type: str = "text/plain; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @classmethod
+    def json(cls, data, status: int = 200, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        return cls(status, body, "application/json", headers)
+
+
+class HttpServer:
+    """Маршрутизатор (метод, путь) -> async handler(request) -> Response."""
+
+    IDLE_TIMEOUT = 75
+    # Сколько ждать заголовков и тела после начала запроса, секунды
+    HEADERS_TIMEOUT = 10
+    BODY_TIMEOUT = 30
+    MAX_HEADERS = 100
+    MAX_BODY = 1024 * 1024
+
+    def __init__(self, max_body: int = MAX_BODY):
+        self.max_body = max_body
+        self._routes = {}
+        self._server = None
+        self._connections = set()
+
+    def route(self, method: str, path: str, handler):
+        self._routes[(method.upper(), path)] = handler
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1] if self._server else None
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info(f"HTTP сервер слушает {host}:{self.port}")
+
+    async def stop(self):
+        if not self._server:
+            return
+        self._server.close()
+        for task in list(self._connections):
+            task.cancel()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except RequestError as e:
+                    logger.warning(f"HTTP: отклонён запрос: {e}")
+                    self._write_response(writer, Response(e.status, HTTPStatus(e.status).phrase.lower()), False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                response = await self._dispatch(request)
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                self._write_response(writer, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.TimeoutError):
+            pass
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка HTTP соединения: {e}")
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        try:
+            line = await asyncio.wait_for(reader.readline(), self.IDLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        if not line:
+            return None
+
+        try:
+            method, target, _ = line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "неверная строка запроса")
+
+        try:
+            headers = await asyncio.wait_for(self._read_headers(reader), self.HEADERS_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise RequestError(HTTPStatus.REQUEST_TIMEOUT, "заголовки не пришли вовремя")
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "неверный Content-Length")
+        if length < 0:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "неверный Content-Length")
+        if length > self.max_body:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"тело {length} байт больше {self.max_body}")
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), self.BODY_TIMEOUT) if length else b""
+        except asyncio.TimeoutError:
+            raise RequestError(HTTPStatus.REQUEST_TIMEOUT, "тело не пришло вовремя")
+        return Request(method.upper(), target, headers, body)
+
+    async def _read_headers(self, reader: asyncio.StreamReader) -> dict:
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                return headers
+            if len(headers) >= self.MAX_HEADERS:
+                raise RequestError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "слишком много заголовков")
+            name, _, value = header.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def _dispatch(self, request: Request) -> Response:
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self._routes):
+                return Response(HTTPStatus.METHOD_NOT_ALLOWED, "method not allowed")
+            return Response(HTTPStatus.NOT_FOUND, "not found")
+        try:
+            return await handler(request)
+        except Exception as e:
+            logger.error(f"Ошибка обработки {request.method} {request.path}: {e}")
+            return Response(HTTPStatus.INTERNAL_SERVER_ERROR, "internal error")
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, response: Response, keep_alive: bool):
+        status = HTTPStatus(response.status)
+        head = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {response.content_type}",
+            f"Content-Length: {len(response.body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        head.extend(f"{name}: {value}" for name, value in response.headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + response.body)
@@ -0,0 +1,230 @@
+"""Единая точка выхода к OpenAI.
+
+Все запросы к chat completions проходят через LLMGateway: он ограничивает
+число одновременных запросов, держит бюджеты запросов и токенов в минуту
+(token bucket) и выдаёт слоты по приоритету - сначала интерактивные
+запросы пользователей, фоновые (предзагрузка) в последнюю очередь.
+
+Внутри одного приоритета очередь справедлива между пользователями
+(start-time fair queuing): каждому запросу назначается виртуальное время
+старта - не раньше окончания предыдущего запроса того же владельца, где
+длительность - оценка токенов. Пользователь, отправивший десяток тяжёлых
+запросов подряд, не задерживает первый запрос соседа.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+
+from openai import RateLimitError
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    DEFAULT = 1
+    BACKGROUND = 2
+
+
+class TokenBucket:
+    """Бюджет на минуту, пополняемый равномерно."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Через сколько секунд в бюджете будет amount"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        """Списать amount; отрицательное значение возвращает бюджет"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+def estimate_tokens(params: dict) -> int:
+    """Грубая оценка токенов запроса: промпт по длине текста плюс max_tokens ответа"""
+    prompt_chars = sum(len(message.get("content") or "") for message in params.get("messages", ()))
+    return prompt_chars // 3 + params.get("max_tokens", 256) * params.get("n", 1)
+
+
+class LLMGateway:
+    """Планировщик запросов к OpenAI с лимитами и приоритетами."""
+
+    def __init__(self, client, max_concurrency: int, requests_per_minute: int, tokens_per_minute: int):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+        self._queue = []
+        self._counter = itertools.count()
+        # Виртуальное время справедливой очереди и окончание последнего запроса каждого владельца
+        self._virtual_time = 0.0
+        self._finish_tags = {}
+        self._timer = None
+        self.in_flight = 0
+        # priority -> [число запросов, суммарное ожидание, максимальное ожидание]
+        self._waits = {priority: [0, 0.0, 0.0] for priority in Priority}
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for entry in self._queue if not entry[4].done())
+
+    def stats(self) -> dict:
+        """Глубина очереди и время ожидания слота по приоритетам"""
+        waits = {}
+        for priority, (count, total, longest) in self._waits.items():
+            waits[priority.name.lower()] = {
+                "requests": count,
+                "avg_wait": total / count if count else 0.0,
+                "max_wait": longest,
+            }
+        return {"queue_depth": self.queue_depth, "in_flight": self.in_flight, "wait": waits}
+
+    def _start_tag(self, owner, cost: int) -> float:
+        """Виртуальное время старта запроса владельца owner (None - запрос без владельца)"""
+        if owner is None:
+            return self._virtual_time
+        start = max(self._virtual_time, self._finish_tags.get(owner, 0.0))
+        self._finish_tags[owner] = start + cost
+        return start
+
+    async def _acquire(self, priority: Priority, cost: int, owner=None):
+        future = asyncio.get_running_loop().create_future()
+        start_tag = self._start_tag(owner, cost)
+        heapq.heappush(self._queue, (int(priority), start_tag, next(self._counter), cost, future))
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но запрос отменили - возвращаем его
+                self._release(cost, cost)
+            elif owner is not None and self._finish_tags.get(owner) == start_tag + cost:
+                # Отменённый в очереди запрос не должен отодвигать следующие запросы владельца
+                self._finish_tags[owner] = start_tag
+            raise
+
+        waited = time.monotonic() - started
+        stat = self._waits[priority]
+        stat[0] += 1
+        stat[1] += waited
+        stat[2] = max(stat[2], waited)
+        if waited > 1:
+            logger.info(f"Запрос к OpenAI ждал в очереди {waited:.2f} с (приоритет {priority.name})")
+
+    def _dispatch(self):
+        while self._queue and self.in_flight < self.max_concurrency:
+            _, start_tag, _, cost, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+
+            delay = max(self.requests.delay(1), self.tokens.delay(cost))
+            if delay > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+
+            heapq.heappop(self._queue)
+            self._advance(start_tag)
+            self.requests.consume(1)
+            self.tokens.consume(cost)
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _advance(self, start_tag: float):
+        self._virtual_time = max(self._virtual_time, start_tag)
+        if len(self._finish_tags) > 1000:
+            # Владельцы, чьи запросы уже в прошлом виртуального времени, ничем не отличаются от новых
+            self._finish_tags = {owner: tag for owner, tag in self._finish_tags.items() if tag > self._virtual_time}
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _release(self, reserved: int, used: int):
+        self.in_flight -= 1
+        # Возвращаем в бюджет разницу между оценкой и фактическим расходом
+        self.tokens.consume(used - reserved)
+        self._dispatch()
+
+    def _on_rate_limit(self):
+        logger.warning("OpenAI вернул 429, приостанавливаю выдачу слотов")
+        self.requests.drain()
+        self.tokens.drain()
+
+    async def create(self, priority: Priority = Priority.DEFAULT, owner=None, **params):
+        """chat.completions.create через очередь шлюза; owner - пользователь для справедливой очереди"""
+        cost = estimate_tokens(params)
+        await self._acquire(priority, cost, owner)
+        used = cost
+        try:
+            response = await self.client.chat.completions.create(**params)
+            if response.usage:
+                used = response.usage.total_tokens
+            return response
+        except RateLimitError:
+            self._on_rate_limit()
+            raise
+        finally:
+            self._release(cost, used)
+
+    async def embed(self, priority: Priority = Priority.DEFAULT, owner=None, **params):
+        """embeddings.create через очередь шлюза"""
+        cost = sum(len(text) for text in params.get("input", ())) // 3 + 1
+        await self._acquire(priority, cost, owner)
+        used = cost
+        try:
+            response = await self.client.embeddings.create(**params)
+            if response.usage:
+                used = response.usage.total_tokens
+            return response
+        except RateLimitError:
+            self._on_rate_limit()
+            raise
+        finally:
+            self._release(cost, used)
+
+    async def stream(self, priority: Priority = Priority.DEFAULT, owner=None, **params):
+        """Потоковый chat.completions.create через очередь шлюза; отдаёт чанки"""
+        cost = estimate_tokens(params)
+        await self._acquire(priority, cost, owner)
+        used = cost
+        try:
+            stream = await self.client.chat.completions.create(
+                stream=True, stream_options={"include_usage": True}, **params
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.usage:
+                        used = chunk.usage.total_tokens
+                    yield chunk
+            finally:
+                await stream.close()
+        except RateLimitError:
+            self._on_rate_limit()
+            raise
+        finally:
+            self._release(cost, used)
@@ -0,0 +1,116 @@
+"""Кэш file_id для картинок меню.
+
+Каждая картинка загружается в Telegram один раз, полученный file_id
+сохраняется на диск по хэшу содержимого файла и дальше отправляется
+без повторной загрузки. Рядом хранится file_unique_id: file_id одной и
+той же картинки в разных сообщениях может отличаться, и узнать, что
+сообщение уже показывает нужную картинку, можно только по нему.
+"""
+import hashlib
+import json
+import logging
+import os
+
+from telegram.error import BadRequest
+
+from config import MEDIA_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Фрагменты ответов Bot API, означающие, что сохранённый file_id больше не годится
+# ("Wrong file identifier/http url specified", "Wrong remote file identifier specified",
+# "File reference expired" и т.п.)
+FILE_ID_ERRORS = ("file identifier", "file reference", "file id", "file_id")
+
+
+class MediaRegistry:
+    """Реестр загруженных картинок: sha256 содержимого -> file_id и file_unique_id."""
+
+    def __init__(self, storage_path: str):
+        self.storage_path = storage_path
+        self._file_ids = self._load()
+        # path -> (mtime_ns, size, digest), чтобы не пересчитывать хэш на каждый запрос
+        self._digests = {}
+
+    def _load(self):
+        try:
+            with open(self.storage_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш картинок {self.storage_path}: {e}")
+            return {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.storage_path) or ".", exist_ok=True)
+            tmp_path = f"{self.storage_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._file_ids, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.storage_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш картинок {self.storage_path}: {e}")
+
+    def digest(self, image_path: str) -> str:
+        """Хэш содержимого файла; пересчитывается только при изменении файла"""
+        stat = os.stat(image_path)
+        cached = self._digests.get(image_path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        with open(image_path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._digests[image_path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def get_file_id(self, image_path: str):
+        """Сохранённый file_id для текущей версии файла или None"""
+        return self._file_ids.get(self.digest(image_path), {}).get("file_id")
+
+    def get_file_unique_id(self, image_path: str):
+        """Постоянный идентификатор текущей версии файла в Telegram или None"""
+        return self._file_ids.get(self.digest(image_path), {}).get("file_unique_id")
+
+    def remember(self, image_path: str, file_id: str, file_unique_id: str = None):
+        self._file_ids[self.digest(image_path)] = {"file_id": file_id, "file_unique_id": file_unique_id}
+        self._save()
+
+    def forget(self, image_path: str):
+        if self._file_ids.pop(self.digest(image_path), None) is not None:
+            self._save()
+
+    async def send_photo(self, send, image_path: str, **kwargs):
+        """Отправить картинку через send (reply_photo, send_photo и т.п.).
+
+        Если для файла уже есть file_id - отправляем по нему, иначе загружаем
+        файл и запоминаем полученный file_id. Если Telegram отклонил сам file_id,
+        он удаляется из кэша и файл загружается заново; остальные BadRequest
+        (разметка подписи, "message is not modified" и т.п.) пробрасываются.
+        """
+        file_id = self.get_file_id(image_path)
+        if file_id:
+            try:
+                return await send(photo=file_id, **kwargs)
+            except BadRequest as e:
+                if not _is_file_id_error(e):
+                    raise
+                logger.warning(f"Telegram отклонил file_id для {image_path}: {e}, загружаю заново")
+                self.forget(image_path)
+
+        with open(image_path, "rb") as photo:
+            message = await send(photo=photo, **kwargs)
+
+        if message and message.photo:
+            largest = message.photo[-1]
+            self.remember(image_path, largest.file_id, largest.file_unique_id)
+            logger.info(f"Картинка {image_path} загружена, file_id сохранён")
+        return message
+
+
+def _is_file_id_error(error: BadRequest) -> bool:
+    message = str(error).lower()
+    return any(fragment in message for fragment in FILE_ID_ERRORS)
+
+
+media_registry = MediaRegistry(MEDIA_CACHE_PATH)
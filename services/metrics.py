@@ -0,0 +1,302 @@
+"""Метрики бота в текстовом формате Prometheus.
+
+Счётчики, gauge и гистограммы живут в памяти процесса: запись значения -
+это поиск в словаре по меткам и пара арифметических операций, поэтому
+инструментирование не заметно на горячем пути. Значения, которые и так
+считают другие компоненты (очередь шлюза, кэш ответов, пул фактов),
+собираются функциями-коллекторами только в момент запроса /metrics.
+
+Инструментированы все обработчики Application, все методы Bot API (через
+InstrumentedRequest) и все вызовы OpenAI в services/openai_client.py.
+"""
+import bisect
+import functools
+import logging
+import time
+
+from telegram.request import HTTPXRequest
+
+from services.http_server import HttpServer, Response
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in list(self._children.items()):
+            yield from child.render(self.name, self.labelnames, values)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        yield f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labelnames, values):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            labels = _format_labels(labelnames + ("le",), values + (_format_value(bound),))
+            yield f"{name}_bucket{labels} {cumulative}"
+        labels = _format_labels(labelnames, values)
+        yield f"{name}_sum{labels} {_format_value(self.sum)}"
+        yield f"{name}_count{labels} {self.count}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+class _Collected(_Metric):
+    """Метрика, значения которой вычисляются функцией при каждом запросе /metrics.
+
+    Функция возвращает число (без меток) или словарь {кортеж меток: число}.
+    """
+
+    def __init__(self, kind: str, name: str, help_text: str, func, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.func = func
+
+    def render(self):
+        try:
+            values = self.func()
+        except Exception as e:
+            logger.warning(f"Не удалось собрать метрику {self.name}: {e}")
+            return
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, label_values)} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, help_text: str, labelnames=()) -> Counter:
+    return registry.register(Counter(name, help_text, labelnames))
+
+
+def gauge(name: str, help_text: str, labelnames=()) -> Gauge:
+    return registry.register(Gauge(name, help_text, labelnames))
+
+
+def histogram(name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, help_text, labelnames, buckets))
+
+
+def collect_gauge(name: str, help_text: str, func, labelnames=()):
+    return registry.register(_Collected("gauge", name, help_text, func, labelnames))
+
+
+def collect_counter(name: str, help_text: str, func, labelnames=()):
+    return registry.register(_Collected("counter", name, help_text, func, labelnames))
+
+
+# Обработчики Telegram-обновлений
+
+HANDLER_SECONDS = histogram("bot_handler_seconds", "Время работы обработчика обновления", ("handler",))
+HANDLER_ERRORS = counter("bot_handler_errors_total", "Исключения, вышедшие из обработчика", ("handler",))
+HANDLERS_IN_PROGRESS = gauge("bot_handlers_in_progress", "Обработчики, выполняющиеся прямо сейчас")
+
+TELEGRAM_SECONDS = histogram("telegram_request_seconds", "Время запроса к Bot API", ("method",))
+TELEGRAM_ERRORS = counter("telegram_request_errors_total", "Запросы к Bot API, завершившиеся ошибкой",
+                          ("method", "status"))
+TELEGRAM_IN_FLIGHT = gauge("telegram_requests_in_flight", "Запросы к Bot API, ожидающие ответа")
+
+
+def _instrument_callback(callback):
+    name = f"{callback.__module__}.{callback.__qualname__}"
+    seconds = HANDLER_SECONDS.labels(name)
+    errors = HANDLER_ERRORS.labels(name)
+    in_progress = HANDLERS_IN_PROGRESS.labels()
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        in_progress.inc()
+        started = time.monotonic()
+        try:
+            return await callback(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.monotonic() - started)
+            in_progress.dec()
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _instrument_handler(handler):
+    # ConversationHandler сам не имеет callback, инструментируем вложенные обработчики
+    nested = []
+    for attr in ("entry_points", "fallbacks"):
+        nested.extend(getattr(handler, attr, ()))
+    for state_handlers in getattr(handler, "states", {}).values():
+        nested.extend(state_handlers)
+    for child in nested:
+        _instrument_handler(child)
+
+    callback = getattr(handler, "callback", None)
+    if callback is not None and not getattr(callback, "instrumented", False):
+        handler.callback = _instrument_callback(callback)
+
+
+def instrument_application(application):
+    """Обернуть замером времени все зарегистрированные обработчики"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler)
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest, замеряющий время каждого метода Bot API."""
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        TELEGRAM_IN_FLIGHT.inc()
+        started = time.monotonic()
+        try:
+            status, payload = await super().do_request(url, method, request_data, **kwargs)
+        except Exception as e:
+            TELEGRAM_ERRORS.labels(api_method, type(e).__name__).inc()
+            raise
+        finally:
+            TELEGRAM_SECONDS.labels(api_method).observe(time.monotonic() - started)
+            TELEGRAM_IN_FLIGHT.dec()
+        if status >= 400:
+            TELEGRAM_ERRORS.labels(api_method, str(status)).inc()
+        return status, payload
+
+
+def build_metrics_server() -> HttpServer:
+    server = HttpServer()
+
+    async def metrics(request):
+        return Response(200, registry.render(), CONTENT_TYPE)
+
+    server.route("GET", "/metrics", metrics)
+    return server
@@ -0,0 +1,183 @@
+"""Выбор модели OpenAI для каждой функции бота.
+
+Для функции задан упорядоченный список моделей: первая - предпочтительная,
+остальные - запасные (быстрее или дешевле). Роутер держит скользящее окно
+задержек и ошибок по каждой паре (функция, модель) и отправляет запрос в
+первую модель списка, которая укладывается в целевой p95 функции и не
+сыплет ошибками. Если предпочтительная модель деградировала, трафик
+переходит на следующую; небольшая доля запросов продолжает пробовать
+деградировавшую модель, и когда её задержки приходят в норму, трафик
+возвращается. Каждое переключение пишется в лог и в метрики.
+"""
+import logging
+import random
+import time
+from collections import deque
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Окно статистики, секунды, и сколько замеров в нём нужно для выводов
+WINDOW_SECONDS = 300
+MIN_SAMPLES = 10
+MAX_SAMPLES = 500
+# Доля ошибок, при которой модель считается деградировавшей
+MAX_ERROR_RATE = 0.2
+# Доля запросов, которые пробуют деградировавшую предпочтительную модель
+PROBE_SHARE = 0.05
+
+
+def parse_routes(spec: str) -> dict:
+    """"fact=gpt-4o-mini;chatgpt=gpt-3.5-turbo,gpt-4o-mini" -> {функция: [модели]}"""
+    routes = {}
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        feature, _, models = item.partition("=")
+        routes[feature.strip()] = [model.strip() for model in models.split(",") if model.strip()]
+    return routes
+
+
+def parse_slos(spec: str) -> dict:
+    """"chatgpt=8;fact=5" -> {функция: целевой p95 в секундах}"""
+    slos = {}
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        feature, _, seconds = item.partition("=")
+        slos[feature.strip()] = float(seconds)
+    return slos
+
+
+class ModelStats:
+    """Задержки и исходы вызовов одной модели для одной функции за последние WINDOW_SECONDS."""
+
+    def __init__(self, window: float = WINDOW_SECONDS):
+        self.window = window
+        # (время замера, задержка, успех)
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, seconds: float, ok: bool):
+        self.samples.append((time.monotonic(), seconds, ok))
+
+    def _trim(self):
+        horizon = time.monotonic() - self.window
+        while self.samples and self.samples[0][0] < horizon:
+            self.samples.popleft()
+
+    def count(self) -> int:
+        self._trim()
+        return len(self.samples)
+
+    def p95(self):
+        self._trim()
+        latencies = sorted(seconds for _, seconds, ok in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def error_rate(self) -> float:
+        self._trim()
+        if not self.samples:
+            return 0.0
+        return sum(1 for *_, ok in self.samples if not ok) / len(self.samples)
+
+
+class ModelRouter:
+    """Маршрутизация запросов функции по списку моделей с учётом p95 и ошибок."""
+
+    def __init__(self, routes: dict, slos: dict, default_models, window: float = WINDOW_SECONDS):
+        self.routes = routes
+        self.slos = slos
+        self.default_models = list(default_models)
+        self.window = window
+        self._stats = {}
+        # функция -> модель, выбранная последней (для логирования переключений)
+        self._current = {}
+
+    def models(self, feature: str):
+        return self.routes.get(feature) or self.default_models
+
+    def stats(self, feature: str, model: str) -> ModelStats:
+        stats = self._stats.get((feature, model))
+        if stats is None:
+            stats = self._stats[(feature, model)] = ModelStats(self.window)
+        return stats
+
+    def healthy(self, feature: str, model: str) -> bool:
+        stats = self.stats(feature, model)
+        if stats.count() < MIN_SAMPLES:
+            # Данных мало - модель считается здоровой
+            return True
+        if stats.error_rate() > MAX_ERROR_RATE:
+            return False
+        slo = self.slos.get(feature)
+        p95 = stats.p95()
+        return slo is None or p95 is None or p95 <= slo
+
+    def choose(self, feature: str) -> str:
+        """Модель для очередного запроса функции"""
+        models = self.models(feature)
+        model = next((candidate for candidate in models if self.healthy(feature, candidate)), None)
+        if model is None:
+            # Деградировали все - берём ту, что сейчас быстрее
+            model = min(models, key=lambda candidate: self._score(feature, candidate))
+        if model != models[0] and random.random() < PROBE_SHARE:
+            # Проба предпочтительной модели, чтобы заметить её восстановление
+            ROUTE_PROBES.labels(feature, models[0]).inc()
+            return models[0]
+        self._switch(feature, model)
+        return model
+
+    def fallback(self, feature: str, failed_model: str):
+        """Следующая модель после той, на которой запрос не удался; None, если запасных нет"""
+        models = self.models(feature)
+        rest = [model for model in models if model != failed_model]
+        if not rest:
+            return None
+        model = next((candidate for candidate in rest if self.healthy(feature, candidate)), rest[0])
+        ROUTE_FALLBACKS.labels(feature, failed_model, model).inc()
+        logger.warning(f"Запрос {feature} к {failed_model} не удался, повторяю на {model}")
+        return model
+
+    def record(self, feature: str, model: str, seconds: float, ok: bool):
+        self.stats(feature, model).add(seconds, ok)
+        ROUTE_REQUESTS.labels(feature, model, "ok" if ok else "error").inc()
+
+    def _score(self, feature: str, model: str) -> float:
+        stats = self.stats(feature, model)
+        p95 = stats.p95()
+        return (p95 if p95 is not None else 0.0) * (1 + 10 * stats.error_rate())
+
+    def _switch(self, feature: str, model: str):
+        previous = self._current.get(feature)
+        self._current[feature] = model
+        if previous is None or previous == model:
+            return
+        ROUTE_SWITCHES.labels(feature, previous, model).inc()
+        stats = self.stats(feature, previous)
+        p95 = stats.p95()
+        logger.warning(
+            f"Маршрут {feature}: {previous} -> {model} "
+            f"(p95 {previous}: {'-' if p95 is None else f'{p95:.2f} с'}, "
+            f"цель: {self.slos.get(feature, '-')} с, ошибок: {stats.error_rate():.0%})"
+        )
+
+    def snapshot(self, field: str) -> dict:
+        """Значения для метрик: {(функция, модель): p95 или доля ошибок}"""
+        values = {}
+        for (feature, model), stats in list(self._stats.items()):
+            value = stats.p95() if field == "p95" else stats.error_rate()
+            if value is not None:
+                values[(feature, model)] = value
+        return values
+
+    def current(self) -> dict:
+        return {(feature, model): 1 for feature, model in self._current.items()}
+
+
+ROUTE_REQUESTS = metrics.counter("llm_route_requests_total", "Вызовы OpenAI по функциям и моделям",
+                                 ("feature", "model", "outcome"))
+ROUTE_SWITCHES = metrics.counter("llm_route_switches_total", "Переключения модели для функции",
+                                 ("feature", "from_model", "to_model"))
+ROUTE_FALLBACKS = metrics.counter("llm_route_fallbacks_total", "Повторы запроса на запасной модели после ошибки",
+                                  ("feature", "from_model", "to_model"))
+ROUTE_PROBES = metrics.counter("llm_route_probes_total", "Пробные запросы к деградировавшей модели",
+                               ("feature", "model"))
@@ -1,92 +1,514 @@
 import logging
+import time
 from openai import AsyncOpenAI
-from config import CHATGPT_TOKEN
+from config import (CHATGPT_TOKEN, OPENAI_BASE_URL, LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE,
+                    LLM_TOKENS_PER_MINUTE, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_DB, LLM_MAX_ATTEMPTS,
+                    LLM_HEDGE_REQUESTS, LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET, LLM_MODEL, LLM_FALLBACK_MODELS,
+                    LLM_MODEL_ROUTES, LLM_LATENCY_SLO, SEMANTIC_CACHE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_EMBEDDING_MODEL,
+                    SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_DIM, SEMANTIC_CACHE_PATH)
+from services.llm_gateway import LLMGateway, Priority
+from services.model_router import ModelRouter, parse_routes, parse_slos
+from services.resilience import ResilientCaller, RetryPolicy, CircuitBreaker, classify_error
+from services.response_cache import ResponseCache, CachePolicy, NO_CACHE, cache_key
+from services.single_flight import SingleFlight, request_key
+from services.token_budget import token_budgets, current_user, BudgetExceeded
+from services import metrics
 
 logger = logging.getLogger(__name__)
-client = AsyncOpenAI(api_key=CHATGPT_TOKEN)
 
 
-async def get_random_fact():
-    """Получить случайный факт от ChatGPT"""
+class IncompleteStreamError(Exception):
+    """Поток ответа закончился без финального фрагмента (finish_reason)."""
+
+
+# Повторы делает ResilientCaller, встроенные повторы клиента отключены
+client = AsyncOpenAI(api_key=CHATGPT_TOKEN, base_url=OPENAI_BASE_URL, max_retries=0)
+gateway = LLMGateway(
+    client,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=LLM_TOKENS_PER_MINUTE
+)
+resilient = ResilientCaller(
+    RetryPolicy(max_attempts=LLM_MAX_ATTEMPTS),
+    CircuitBreaker(failure_threshold=LLM_BREAKER_THRESHOLD, reset_timeout=LLM_BREAKER_RESET),
+    hedge=LLM_HEDGE_REQUESTS
+)
+# У эмбеддингов свой предохранитель: сбой модели эмбеддингов не должен закрывать доступ к чату
+embedding_resilient = ResilientCaller(
+    RetryPolicy(max_attempts=LLM_MAX_ATTEMPTS),
+    CircuitBreaker(failure_threshold=LLM_BREAKER_THRESHOLD, reset_timeout=LLM_BREAKER_RESET)
+)
+single_flight = SingleFlight()
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_DB)
+router = ModelRouter(
+    parse_routes(LLM_MODEL_ROUTES),
+    parse_slos(LLM_LATENCY_SLO),
+    default_models=[LLM_MODEL, *(model for model in LLM_FALLBACK_MODELS if model != LLM_MODEL)]
+)
+
+# Функции бота; используются для таймаутов, статистики задержек и метрик
+FEATURE_FACT = "fact"
+FEATURE_CHATGPT = "chatgpt"
+FEATURE_PERSONALITY = "personality"
+FEATURE_QUIZ = "quiz"
+FEATURE_SUMMARY = "summary"
+FEATURE_EMBEDDING = "embedding"
+
+# Общий бюджет времени на запрос с учётом повторов, секунды
+# (для потоковых ответов - время до первого фрагмента)
+FEATURE_TIMEOUTS = {
+    FEATURE_FACT: 20,
+    FEATURE_CHATGPT: 45,
+    FEATURE_PERSONALITY: 40,
+    FEATURE_QUIZ: 30,
+    FEATURE_SUMMARY: 60,
+    FEATURE_EMBEDDING: 10,
+}
+
+# Меньше скольких токенов ответа урезать max_tokens под остаток бюджета пользователя нельзя.
+# Свободный текст можно укоротить; функции, которых здесь нет (JSON квиза, факт,
+# краткое содержание диалога), при нехватке бюджета не выполняются вовсе
+FEATURE_MIN_TOKENS = {
+    FEATURE_CHATGPT: 300,
+    FEATURE_PERSONALITY: 300,
+}
+
+# Политики кэша: факты должны быть случайными, ответы на вопросы и разборы квиза - повторяемы
+FACT_CACHE_POLICY = NO_CACHE
+CHATGPT_CACHE_POLICY = CachePolicy(ttl=24 * 3600, use_disk=True)
+PERSONALITY_CACHE_POLICY = CachePolicy(ttl=7 * 24 * 3600, use_disk=True)
+
+
+
+async def request_embeddings(texts):
+    """Эмбеддинги текстов моделью SEMANTIC_CACHE_EMBEDDING_MODEL; ошибки пробрасываются"""
+    response = await embedding_resilient.call(
+        FEATURE_EMBEDDING,
+        lambda: gateway.embed(
+            priority=Priority.INTERACTIVE,
+            model=SEMANTIC_CACHE_EMBEDDING_MODEL,
+            input=texts,
+            dimensions=SEMANTIC_CACHE_DIM
+        ),
+        FEATURE_TIMEOUTS[FEATURE_EMBEDDING]
+    )
+    if response.usage:
+        LLM_TOKENS.labels(FEATURE_EMBEDDING, "prompt").inc(response.usage.prompt_tokens)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+semantic_cache = None
+if SEMANTIC_CACHE:
+    try:
+        from services.semantic_cache import OpenAIEmbedder, SemanticCache
+    except ImportError as e:
+        logger.warning(f"Семантический кэш отключён: {e}")
+    else:
+        semantic_cache = SemanticCache(
+            OpenAIEmbedder(request_embeddings, SEMANTIC_CACHE_EMBEDDING_MODEL, SEMANTIC_CACHE_DIM),
+            max_entries=SEMANTIC_CACHE_SIZE,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            ttl=CHATGPT_CACHE_POLICY.ttl,
+            path=SEMANTIC_CACHE_PATH
+        )
+
+LLM_SECONDS = metrics.histogram(
+    "openai_request_seconds", "Время вызова OpenAI с учётом очереди шлюза и повторов", ("feature", "kind", "outcome")
+)
+LLM_FIRST_CHUNK_SECONDS = metrics.histogram(
+    "openai_first_chunk_seconds", "Время до первого фрагмента потокового ответа", ("feature",)
+)
+LLM_TOKENS = metrics.counter("openai_tokens_total", "Токены по данным usage", ("feature", "type"))
+LLM_IN_FLIGHT = metrics.gauge("openai_requests_in_flight", "Вызовы OpenAI, ожидающие ответа", ("feature",))
+CACHE_LOOKUPS = metrics.counter("response_cache_lookups_total", "Обращения к кэшу ответов", ("feature", "result"))
+
+metrics.collect_gauge("llm_gateway_queue_depth", "Запросы в очереди шлюза", lambda: gateway.queue_depth)
+metrics.collect_gauge("llm_gateway_in_flight", "Запросы, занявшие слот шлюза", lambda: gateway.in_flight)
+metrics.collect_counter("llm_coalesced_total", "Запросы, склеенные с уже выполняющимися",
+                        lambda: single_flight.coalesced)
+metrics.collect_gauge("llm_model_p95_seconds", "p95 задержки модели по функциям за окно роутера",
+                      lambda: router.snapshot("p95"), ("feature", "model"))
+metrics.collect_gauge("llm_model_error_rate", "Доля ошибок модели по функциям за окно роутера",
+                      lambda: router.snapshot("error_rate"), ("feature", "model"))
+metrics.collect_gauge("llm_route_current", "Модель, на которую сейчас идёт трафик функции",
+                      router.current, ("feature", "model"))
+metrics.collect_counter("llm_hedges_total", "Дублирующие запросы", lambda: {
+    ("fired",): resilient.hedges_fired,
+    ("won",): resilient.hedges_won,
+}, ("result",))
+
+
+def _cache_tier_stats(field: str):
+    stats = response_cache.stats()
+    return {(tier,): tier_stats[field] for tier, tier_stats in stats.items()}
+
+
+metrics.collect_counter("response_cache_hits_total", "Попадания в кэш ответов по уровням",
+                        lambda: _cache_tier_stats("hits"), ("tier",))
+if semantic_cache is not None:
+    metrics.collect_counter("semantic_cache_lookups_total", "Поиски в семантическом кэше", lambda: {
+        ("hit",): semantic_cache.hits,
+        ("miss",): semantic_cache.misses,
+    }, ("result",))
+    metrics.collect_gauge("semantic_cache_entries", "Вопросы в семантическом кэше", lambda: semantic_cache.size)
+metrics.collect_counter("response_cache_misses_total", "Промахи кэша ответов по уровням",
+                        lambda: _cache_tier_stats("misses"), ("tier",))
+
+FACT_ERROR_MESSAGE = "🤔 К сожалению, не удалось получить факт в данный момент. Попробуйте позже!"
+
+FACT_MESSAGES = [
+    {
+        "role": "system",
+        "content": "Ты помощник, который рассказывает интересные и познавательные факты. Отвечай на русском языке."
+    },
+    {
+        "role": "user",
+        "content": "Расскажи интересный случайный факт из любой области знаний. Факт должен быть познавательным, удивительным и не слишком длинным (максимум 3-4 предложения)."
+    }
+]
+
+CHATGPT_SYSTEM_PROMPT = "Ты полезный помощник. Отвечай на русском языке, будь дружелюбным и информативным. Если не знаешь ответ, честно об этом скажи."
+
+
+def chatgpt_messages(user_message: str, history=()):
+    return [
+        {
+            "role": "system",
+            "content": CHATGPT_SYSTEM_PROMPT
+        },
+        *history,
+        {
+            "role": "user",
+            "content": user_message
+        }
+    ]
+
+
+def personality_messages(user_message: str, personality_prompt: str, history=()):
+    return [
+        {
+            "role": "system",
+            "content": personality_prompt
+        },
+        *history,
+        {
+            "role": "user",
+            "content": user_message
+        }
+    ]
+
+
+def _record_usage(feature: str, usage):
+    if usage is not None:
+        LLM_TOKENS.labels(feature, "prompt").inc(usage.prompt_tokens)
+        LLM_TOKENS.labels(feature, "completion").inc(usage.completion_tokens)
+        # Склеенный запрос списывается с того, кто его начал
+        token_budgets.charge(current_user.get(), feature, usage.total_tokens)
+
+
+async def _call_model(feature: str, priority: Priority, params: dict):
+    """Вызов OpenAI через шлюз и повторы с записью метрик и статистики роутера"""
+    in_flight = LLM_IN_FLIGHT.labels(feature)
+    in_flight.inc()
+    started = time.monotonic()
+    outcome = "error"
     try:
-        response = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Ты помощник, который рассказывает интересные и познавательные факты. Отвечай на русском языке."
-                },
-                {
-                    "role": "user",
-                    "content": "Расскажи интересный случайный факт из любой области знаний. Факт должен быть познавательным, удивительным и не слишком длинным (максимум 3-4 предложения)."
-                }
-            ],
-            max_tokens=200,
-            temperature=0.8
+        response = await resilient.call(
+            feature,
+            lambda: gateway.create(priority=priority, owner=current_user.get(), **params),
+            FEATURE_TIMEOUTS[feature]
         )
+        outcome = "ok"
+    except Exception as e:
+        # Ошибки запроса (например, 400) ничего не говорят о здоровье модели
+        if classify_error(e) is not None:
+            router.record(feature, params["model"], time.monotonic() - started, ok=False)
+        raise
+    finally:
+        LLM_SECONDS.labels(feature, "complete", outcome).observe(time.monotonic() - started)
+        in_flight.dec()
+    router.record(feature, params["model"], time.monotonic() - started, ok=True)
+    _record_usage(feature, response.usage)
+    return response
+
+
+async def _timed_call(feature: str, priority: Priority, params: dict):
+    """Вызов модели, выбранной роутером; после временной ошибки - одна попытка на запасной"""
+    try:
+        return await _call_model(feature, priority, params)
+    except Exception as e:
+        if classify_error(e) is None:
+            raise
+        model = router.fallback(feature, params["model"])
+        if model is None:
+            raise
+        return await _call_model(feature, priority, {**params, "model": model})
+
+
+async def complete(messages, max_tokens: int, temperature: float, feature: str,
+                   priority: Priority = Priority.DEFAULT, coalesce: bool = True,
+                   cache_policy: CachePolicy = NO_CACHE, response_format: dict = None):
+    """Запрос к ChatGPT через шлюз; возвращает текст ответа, ошибки пробрасываются.
+
+    Одновременные запросы с одинаковыми параметрами склеиваются в один;
+    coalesce=False отключает это там, где каждому нужен свой ответ.
+    Ответы кэшируются согласно cache_policy. Пользователь, исчерпавший
+    бюджет токенов, получает BudgetExceeded; ответ из кэша бюджет не тратит.
+    """
+    params = dict(model=router.choose(feature), messages=messages, max_tokens=max_tokens, temperature=temperature)
+    if response_format:
+        params["response_format"] = response_format
 
-        fact = response.choices[0].message.content.strip()
+    key = cache_key(**params) if cache_policy.enabled else None
+    if key:
+        cached = await response_cache.get(key, cache_policy)
+        CACHE_LOOKUPS.labels(feature, "miss" if cached is None else "hit").inc()
+        if cached is not None:
+            return cached
+
+    params["max_tokens"] = token_budgets.check(current_user.get(), feature, max_tokens, FEATURE_MIN_TOKENS.get(feature))
+
+    async def request():
+        response = await _timed_call(feature, priority, params)
+        return response.choices[0].message.content.strip()
+
+    if coalesce:
+        answer = await single_flight.do(request_key(**params), request)
+    else:
+        answer = await request()
+
+    if key:
+        await response_cache.set(key, answer, cache_policy)
+    return answer
+
+
+async def complete_choices(messages, n: int, max_tokens: int, temperature: float, feature: str,
+                           priority: Priority = Priority.DEFAULT):
+    """Получить n независимых вариантов ответа одним запросом"""
+    max_tokens = token_budgets.check(current_user.get(), feature, max_tokens, FEATURE_MIN_TOKENS.get(feature))
+    params = dict(model=router.choose(feature), messages=messages, max_tokens=max_tokens, temperature=temperature,
+                  n=n)
+    response = await _timed_call(feature, priority, params)
+    return [choice.message.content.strip() for choice in response.choices if choice.message.content]
+
+
+async def request_random_fact(priority: Priority = Priority.BACKGROUND):
+    """Запросить случайный факт у ChatGPT; ошибки пробрасываются вызывающему"""
+    return await complete(FACT_MESSAGES, max_tokens=200, temperature=0.8, feature=FEATURE_FACT,
+                          priority=priority, cache_policy=FACT_CACHE_POLICY)
+
+
+async def request_random_facts(n: int, priority: Priority = Priority.BACKGROUND):
+    """Запросить n разных фактов одним вызовом (для пополнения пула)"""
+    return await complete_choices(FACT_MESSAGES, n=n, max_tokens=200, temperature=0.8, feature=FEATURE_FACT,
+                                  priority=priority)
+
+
+async def get_random_fact():
+    """Получить случайный факт от ChatGPT"""
+    try:
+        fact = await request_random_fact(priority=Priority.INTERACTIVE)
         logger.info("Факт успешно получен от OpenAI")
         return fact
 
+    except BudgetExceeded as e:
+        return e.user_message
     except Exception as e:
         logger.error(f"Ошибка при получении факта от OpenAI: {e}")
-        return "🤔 К сожалению, не удалось получить факт в данный момент. Попробуйте позже!"
+        return FACT_ERROR_MESSAGE
 
 
-async def get_chatgpt_response(user_message: str):
-    """Получить ответ от ChatGPT на произвольное сообщение пользователя"""
+async def get_chatgpt_response(user_message: str, history=()):
+    """Получить ответ от ChatGPT на произвольное сообщение пользователя.
+
+    history - предыдущие сообщения диалога (см. ConversationMemory.context_messages).
+    """
+    # Похожий вопрос уже задавали; с историей диалога смысл вопроса зависит от контекста
+    vector = await _semantic_vector(user_message) if semantic_cache is not None and not history else None
+    if vector is not None:
+        cached = semantic_cache.lookup(vector)
+        if cached is not None:
+            CACHE_LOOKUPS.labels(FEATURE_CHATGPT, "semantic_hit").inc()
+            return cached
+
     try:
-        response = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Ты полезный помощник. Отвечай на русском языке, будь дружелюбным и информативным. Если не знаешь ответ, честно об этом скажи."
-                },
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            ],
+        answer = await complete(
+            chatgpt_messages(user_message, history),
             max_tokens=1000,
-            temperature=0.7
+            temperature=0.7,
+            feature=FEATURE_CHATGPT,
+            priority=Priority.INTERACTIVE,
+            cache_policy=CHATGPT_CACHE_POLICY
         )
-
-        answer = response.choices[0].message.content.strip()
         logger.info("Ответ успешно получен от OpenAI")
+        if vector is not None:
+            semantic_cache.store(user_message, vector, answer)
         return answer
 
+    except BudgetExceeded as e:
+        return e.user_message
     except Exception as e:
         logger.error(f"Ошибка при получении ответа от OpenAI: {e}")
         return "😔 Извините, произошла ошибка при обращении к ChatGPT. Попробуйте позже!"
 
 
-# Добавляем новую функцию в конец файла
+async def get_personality_response(user_message: str, personality_prompt: str,
+                                   priority: Priority = Priority.INTERACTIVE, unique: bool = False,
+                                   feature: str = FEATURE_PERSONALITY, history=()):
+    """Получить ответ от ChatGPT в роли выбранной личности.
 
-async def get_personality_response(user_message: str, personality_prompt: str):
-    """Получить ответ от ChatGPT в роли выбранной личности"""
+    unique=True - каждому вызову нужен свой ответ (например, вопрос квиза):
+    такие запросы не склеиваются и не берутся из кэша.
+    """
     try:
-        response = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": personality_prompt
-                },
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            ],
+        answer = await complete(
+            personality_messages(user_message, personality_prompt, history),
             max_tokens=800,
-            temperature=0.8
+            temperature=0.8,
+            feature=feature,
+            priority=priority,
+            coalesce=not unique,
+            cache_policy=NO_CACHE if unique else PERSONALITY_CACHE_POLICY
         )
-
-        answer = response.choices[0].message.content.strip()
         logger.info("Ответ от личности успешно получен от OpenAI")
         return answer
 
+    except BudgetExceeded as e:
+        return e.user_message
     except Exception as e:
         logger.error(f"Ошибка при получении ответа от личности: {e}")
         return "😔 Извините, произошла ошибка при обращении к личности. Попробуйте позже!"
+
+
+async def stream_completion(messages, max_tokens: int, temperature: float, feature: str,
+                            priority: Priority = Priority.INTERACTIVE, coalesce: bool = True,
+                            cache_policy: CachePolicy = NO_CACHE):
+    """Потоковый запрос к ChatGPT: отдаёт текст по мере генерации"""
+    params = dict(model=router.choose(feature), messages=messages, max_tokens=max_tokens, temperature=temperature)
+
+    key = cache_key(**params) if cache_policy.enabled else None
+    if key:
+        cached = await response_cache.get(key, cache_policy)
+        CACHE_LOOKUPS.labels(feature, "miss" if cached is None else "hit").inc()
+        if cached is not None:
+            yield cached
+            return
+
+    params["max_tokens"] = token_budgets.check(current_user.get(), feature, max_tokens, FEATURE_MIN_TOKENS.get(feature))
+
+    async def upstream(params):
+        in_flight = LLM_IN_FLIGHT.labels(feature)
+        in_flight.inc()
+        started = time.monotonic()
+        first_chunk = True
+        finished = False
+        outcome = "error"
+        try:
+            async for chunk in gateway.stream(priority=priority, owner=current_user.get(), **params):
+                _record_usage(feature, chunk.usage)
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finished = True
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_chunk:
+                        # Для потоковых ответов пользователь ждёт именно первого фрагмента
+                        LLM_FIRST_CHUNK_SECONDS.labels(feature).observe(time.monotonic() - started)
+                        router.record(feature, params["model"], time.monotonic() - started, ok=True)
+                        first_chunk = False
+                    yield chunk.choices[0].delta.content
+            if not finished:
+                raise IncompleteStreamError("Поток ответа OpenAI оборвался до финального фрагмента")
+            outcome = "ok"
+        except Exception as e:
+            if first_chunk and classify_error(e) is not None:
+                router.record(feature, params["model"], time.monotonic() - started, ok=False)
+            raise
+        finally:
+            LLM_SECONDS.labels(feature, "stream", outcome).observe(time.monotonic() - started)
+            in_flight.dec()
+
+    async def request():
+        started = False
+        try:
+            async for text in resilient.stream(feature, lambda: upstream(params), FEATURE_TIMEOUTS[feature]):
+                started = True
+                yield text
+            return
+        except Exception as e:
+            # Оборванный на середине ответ не повторяем: часть уже показана пользователю
+            if started or classify_error(e) is None:
+                raise
+            model = router.fallback(feature, params["model"])
+            if model is None:
+                raise
+        fallback_params = {**params, "model": model}
+        async for text in resilient.stream(feature, lambda: upstream(fallback_params), FEATURE_TIMEOUTS[feature]):
+            yield text
+
+    # Сюда доходит только поток, дошедший до финального фрагмента: обрыв, отмена
+    # и присоединение к отменённому запросу заканчиваются исключением, и обрывок не кэшируется
+    parts = []
+    chunks = single_flight.stream(request_key(stream=True, **params), request) if coalesce else request()
+    async for text in chunks:
+        parts.append(text)
+        yield text
+
+    if key and parts:
+        await response_cache.set(key, "".join(parts).strip(), cache_policy)
+
+
+def stream_chatgpt_response(user_message: str, history=()):
+    """Потоковая версия get_chatgpt_response"""
+    chunks = stream_completion(
+        chatgpt_messages(user_message, history),
+        max_tokens=1000,
+        temperature=0.7,
+        feature=FEATURE_CHATGPT,
+        cache_policy=CHATGPT_CACHE_POLICY
+    )
+    if semantic_cache is None or history:
+        return chunks
+    return _semantic_stream(user_message, chunks)
+
+
+async def _semantic_vector(user_message: str):
+    """Вектор вопроса для семантического кэша; None, если эмбеддинг получить не удалось"""
+    try:
+        return await semantic_cache.embed(user_message)
+    except Exception as e:
+        logger.warning(f"Семантический кэш пропущен, эмбеддинг не получен: {e}")
+        return None
+
+
+async def _semantic_stream(user_message: str, chunks):
+    """Поток с ответом из семантического кэша, если похожий вопрос уже задавали"""
+    vector = await _semantic_vector(user_message)
+    if vector is None:
+        async for text in chunks:
+            yield text
+        return
+
+    cached = semantic_cache.lookup(vector)
+    if cached is not None:
+        CACHE_LOOKUPS.labels(FEATURE_CHATGPT, "semantic_hit").inc()
+        await chunks.aclose()
+        yield cached
+        return
+
+    parts = []
+    async for text in chunks:
+        parts.append(text)
+        yield text
+    if parts:
+        semantic_cache.store(user_message, vector, "".join(parts).strip())
+
+
+def stream_personality_response(user_message: str, personality_prompt: str, history=()):
+    """Потоковая версия get_personality_response"""
+    return stream_completion(
+        personality_messages(user_message, personality_prompt, history),
+        max_tokens=800,
+        temperature=0.8,
+        feature=FEATURE_PERSONALITY,
+        cache_policy=PERSONALITY_CACHE_POLICY
+    )
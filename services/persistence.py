@@ -0,0 +1,167 @@
+"""Хранение user_data, chat_data и состояний диалогов в SQLite.
+
+Application передаёт изменения в persistence пачками раз в update_interval
+секунд. SqlitePersistence не пишет их на диск сразу, а копит в памяти и
+сбрасывает одной транзакцией по таймеру или при накоплении flush_size
+изменений, поэтому обработка обновлений никогда не ждёт диска.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = "user_data"
+CHAT_DATA = "chat_data"
+CONVERSATIONS = "conversations"
+
+
+class SqlitePersistence(BasePersistence):
+    """Persistence для Application с отложенной пакетной записью в SQLite."""
+
+    def __init__(self, path: str, update_interval: float = 5, flush_interval: float = 2,
+                 flush_size: int = 200):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {USER_DATA} (id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {CHAT_DATA} (id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {CONVERSATIONS} "
+            "(name TEXT NOT NULL, key TEXT NOT NULL, state TEXT NOT NULL, PRIMARY KEY (name, key))"
+        )
+        self._db.commit()
+
+        # (таблица, ключ) -> JSON для записи или None для удаления
+        self._pending = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_timer = None
+        self._flush_task = None
+
+    # Чтение при старте
+
+    def _load_data(self, table: str) -> dict:
+        rows = self._db.execute(f"SELECT id, data FROM {table}").fetchall()
+        return {row_id: json.loads(data) for row_id, data in rows}
+
+    async def get_user_data(self) -> dict:
+        return await asyncio.to_thread(self._load_data, USER_DATA)
+
+    async def get_chat_data(self) -> dict:
+        return await asyncio.to_thread(self._load_data, CHAT_DATA)
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        def load():
+            rows = self._db.execute(f"SELECT key, state FROM {CONVERSATIONS} WHERE name = ?", (name,)).fetchall()
+            return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+        conversations = await asyncio.to_thread(load)
+        if conversations:
+            logger.info(f"Восстановлено состояний диалога {name}: {len(conversations)}")
+        return conversations
+
+    # Изменения копятся в памяти
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self._stage(USER_DATA, user_id, json.dumps(data, ensure_ascii=False))
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        self._stage(CHAT_DATA, chat_id, json.dumps(data, ensure_ascii=False))
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name: str, key, new_state):
+        state = None if new_state is None else json.dumps(new_state)
+        self._stage(CONVERSATIONS, (name, json.dumps(list(key))), state)
+
+    async def drop_user_data(self, user_id: int):
+        self._stage(USER_DATA, user_id, None)
+
+    async def drop_chat_data(self, chat_id: int):
+        self._stage(CHAT_DATA, chat_id, None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Записать всё накопленное; вызывается Application при остановке"""
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        await self._flush()
+        await asyncio.to_thread(self._db.close)
+
+    # Пакетная запись
+
+    def _stage(self, table: str, key, value):
+        self._pending[(table, key)] = value
+        if len(self._pending) >= self.flush_size:
+            self._start_flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self):
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                batch, self._pending = self._pending, {}
+                try:
+                    await asyncio.to_thread(self._write_batch, batch)
+                except sqlite3.Error as e:
+                    logger.error(f"Ошибка записи состояния бота в {self.path}: {e}")
+                    # Возвращаем неудавшиеся изменения, не затирая более свежие
+                    for key, value in batch.items():
+                        self._pending.setdefault(key, value)
+                    return
+                logger.debug(f"Состояние бота сохранено: {len(batch)} изменений")
+
+    def _write_batch(self, batch: dict):
+        with self._db:
+            for (table, key), value in batch.items():
+                if table == CONVERSATIONS:
+                    name, conversation_key = key
+                    if value is None:
+                        self._db.execute(f"DELETE FROM {CONVERSATIONS} WHERE name = ? AND key = ?",
+                                         (name, conversation_key))
+                    else:
+                        self._db.execute(f"INSERT OR REPLACE INTO {CONVERSATIONS} VALUES (?, ?, ?)",
+                                         (name, conversation_key, value))
+                elif value is None:
+                    self._db.execute(f"DELETE FROM {table} WHERE id = ?", (key,))
+                else:
+                    self._db.execute(f"INSERT OR REPLACE INTO {table} VALUES (?, ?)", (key, value))
@@ -0,0 +1,119 @@
+"""Один ответ пользователю вместо цепочки служебных сообщений.
+
+ProgressMessage держит индикатор "печатает", пока ответ готовится, и
+показывает заглушку только если ожидание затянулось дольше
+PROGRESS_PLACEHOLDER_DELAY. Готовый ответ вместе с клавиатурой выводится
+одной правкой той же заглушки (или того же сообщения с кнопкой), так что
+быстрый ответ стоит один вызов Bot API, а медленный - два.
+"""
+import asyncio
+import logging
+import time
+
+from telegram import Message
+from telegram.constants import ChatAction
+from telegram.error import BadRequest, TelegramError
+
+from config import PROGRESS_PLACEHOLDER_DELAY
+
+logger = logging.getLogger(__name__)
+
+# Индикатор набора в Telegram гаснет через 5 секунд
+TYPING_INTERVAL = 4.5
+
+
+class ProgressMessage:
+    """Ответ, который готовится: индикатор набора, заглушка и финальная правка.
+
+    reply_to - сообщение пользователя, на которое отвечаем новым сообщением;
+    edit - сообщение бота (например, с нажатой кнопкой), которое правим на месте.
+    """
+
+    def __init__(self, reply_to: Message = None, edit: Message = None, placeholder: str = None,
+                 placeholder_delay: float = PROGRESS_PLACEHOLDER_DELAY):
+        if (reply_to is None) == (edit is None):
+            raise ValueError("нужно указать ровно одно из reply_to и edit")
+        self.reply_to = reply_to
+        self.message = edit
+        self.placeholder = placeholder
+        self.placeholder_delay = placeholder_delay
+        self._shown = False
+        self._task = None
+        self._placeholder_task = None
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._keep_alive())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._stop()
+
+    async def show(self, text: str, reply_markup=None, parse_mode: str = 'HTML') -> Message:
+        """Вывести текст в сообщение ответа; первая видимая правка гасит индикатор"""
+        await self._stop()
+        self._shown = True
+        await self._publish(text, reply_markup, parse_mode)
+        return self.message
+
+    finish = show
+
+    async def _stop(self):
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if self._placeholder_task:
+            # Дожидаемся заглушки, чтобы править её, а не отправить второе сообщение
+            try:
+                await self._placeholder_task
+            except TelegramError:
+                pass
+            self._placeholder_task = None
+
+    async def _keep_alive(self):
+        chat_id = (self.reply_to or self.message).chat_id
+        bot = (self.reply_to or self.message).get_bot()
+        started = time.monotonic()
+        next_typing = started
+        while True:
+            now = time.monotonic()
+            if now >= next_typing:
+                try:
+                    await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+                except TelegramError as e:
+                    logger.debug(f"Не удалось отправить индикатор набора: {e}")
+                next_typing = now + TYPING_INTERVAL
+
+            if self.placeholder and not self._shown and now - started >= self.placeholder_delay:
+                self._shown = True
+                # Отдельная задача: отмена индикатора не должна оборвать отправку заглушки
+                self._placeholder_task = asyncio.create_task(self._publish(self.placeholder, None, 'HTML'))
+                try:
+                    await asyncio.shield(self._placeholder_task)
+                except TelegramError as e:
+                    logger.debug(f"Не удалось показать заглушку: {e}")
+
+            wake = next_typing
+            if self.placeholder and not self._shown:
+                wake = min(wake, started + self.placeholder_delay)
+            await asyncio.sleep(max(0.0, wake - time.monotonic()))
+
+    async def _publish(self, text: str, reply_markup, parse_mode: str):
+        if self.message is None:
+            self.message = await self.reply_to.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+            return
+        try:
+            if self.message.photo:
+                edited = await self.message.edit_caption(caption=text, parse_mode=parse_mode,
+                                                         reply_markup=reply_markup)
+            else:
+                edited = await self.message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+            return
+        if isinstance(edited, Message):
+            self.message = edited
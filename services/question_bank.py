@@ -0,0 +1,126 @@
+"""Банк заранее сгенерированных вопросов квиза.
+
+Вопросы хранятся в SQLite с индексами по теме, сложности и хэшу
+содержимого, а при старте бота загружаются в память, так что выдача
+вопроса не требует ни диска, ни запроса к ChatGPT. Пополняется банк
+скриптом generate_questions.py и вопросами, сгенерированными вживую.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+
+from config import QUESTION_BANK_DB
+from data.quiz_topics import DEFAULT_DIFFICULTY
+from services.quiz_questions import QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionBank:
+    """Вопросы по темам: SQLite на диске и индекс в памяти."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        # id -> QuizQuestion
+        self._questions = {}
+        # тема -> список id
+        self._by_topic = {}
+        # хэш содержимого -> id вопроса
+        self._hashes = {}
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                "id INTEGER PRIMARY KEY, topic TEXT NOT NULL, difficulty TEXT NOT NULL, "
+                "hash TEXT NOT NULL UNIQUE, data TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS questions_topic ON questions (topic, difficulty)")
+            self._db.commit()
+        return self._db
+
+    def load(self):
+        """Загрузить все вопросы в память"""
+        rows = self._connect().execute("SELECT id, topic, hash, data FROM questions").fetchall()
+        self._questions.clear()
+        self._by_topic.clear()
+        self._hashes.clear()
+        for question_id, topic, content_hash, data in rows:
+            self._index(question_id, topic, content_hash, QuizQuestion.from_dict(json.loads(data)))
+        logger.info(f"Банк вопросов загружен: {len(self._questions)} вопросов")
+
+    def _index(self, question_id: int, topic: str, content_hash: str, question: QuizQuestion):
+        self._questions[question_id] = question
+        self._by_topic.setdefault(topic, []).append(question_id)
+        self._hashes[content_hash] = question_id
+
+    def count(self, topic: str = None) -> int:
+        if topic is None:
+            return len(self._questions)
+        return len(self._by_topic.get(topic, ()))
+
+    def get(self, question_id: int):
+        return self._questions.get(question_id)
+
+    def pick(self, topic: str, exclude=()):
+        """Случайный вопрос темы, id которого нет в exclude; (id, вопрос) или None"""
+        ids = self._by_topic.get(topic)
+        if not ids:
+            return None
+
+        # Сначала несколько случайных попыток, затем полный перебор
+        for _ in range(8):
+            question_id = random.choice(ids)
+            if question_id not in exclude:
+                return question_id, self._questions[question_id]
+        candidates = [question_id for question_id in ids if question_id not in exclude]
+        if not candidates:
+            return None
+        question_id = random.choice(candidates)
+        return question_id, self._questions[question_id]
+
+    def contains(self, question: QuizQuestion) -> bool:
+        return question.content_hash() in self._hashes
+
+    def find(self, question: QuizQuestion):
+        """id такого же вопроса в банке или None"""
+        return self._hashes.get(question.content_hash())
+
+    def _insert(self, topic: str, difficulty: str, content_hash: str, question: QuizQuestion):
+        cursor = self._connect().execute(
+            "INSERT OR IGNORE INTO questions (topic, difficulty, hash, data, created) VALUES (?, ?, ?, ?, ?)",
+            (topic, difficulty, content_hash, json.dumps(question.to_dict(), ensure_ascii=False), time.time())
+        )
+        self._db.commit()
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def add(self, topic: str, question: QuizQuestion, difficulty: str = DEFAULT_DIFFICULTY):
+        """Сохранить вопрос; возвращает его id или None, если такой вопрос уже есть"""
+        content_hash = question.content_hash()
+        if content_hash in self._hashes:
+            return None
+        question_id = self._insert(topic, difficulty, content_hash, question)
+        if question_id is not None:
+            self._index(question_id, topic, content_hash, question)
+        return question_id
+
+    async def add_async(self, topic: str, question: QuizQuestion, difficulty: str = DEFAULT_DIFFICULTY):
+        """add() с записью на диск в отдельном потоке"""
+        content_hash = question.content_hash()
+        if content_hash in self._hashes:
+            return None
+        question_id = await asyncio.to_thread(self._insert, topic, difficulty, content_hash, question)
+        if question_id is not None:
+            self._index(question_id, topic, content_hash, question)
+        return question_id
+
+
+question_bank = QuestionBank(QUESTION_BANK_DB)
@@ -0,0 +1,132 @@
+"""Упреждающая подготовка следующего вопроса квиза.
+
+Пока пользователь читает результат ответа, для него заранее
+резервируется непоказанный вопрос из банка, а если банк по теме исчерпан -
+в фоне генерируется новый. Кнопка "Ещё вопрос" забирает готовый вопрос
+без ожидания. Если пользователь сменил тему или закончил квиз, резерв
+возвращается в общий банк, а незавершённая генерация отменяется.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from config import QUIZ_PREFETCH_TTL
+from services.llm_gateway import Priority
+from services.question_bank import question_bank
+from services.quiz_questions import generate_quiz_question
+from services.seen_sets import SeenSet
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_USERS = 10_000
+
+
+class Prefetch:
+    """Вопрос, подготовленный для одного пользователя по одной теме."""
+
+    def __init__(self, topic_key: str, future: asyncio.Future):
+        self.topic_key = topic_key
+        # Результат - (id в банке или None, QuizQuestion)
+        self.future = future
+        self.future.add_done_callback(self._log_error)
+        self.created = time.monotonic()
+
+    @staticmethod
+    def _log_error(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Не удалось заранее подготовить вопрос квиза: {future.exception()}")
+
+    @property
+    def ready(self) -> bool:
+        return self.future.done()
+
+    async def result(self):
+        """(id, вопрос) или None, если подготовить вопрос не удалось"""
+        try:
+            return await self.future
+        except Exception:
+            # Ошибка уже записана в лог в _log_error
+            return None
+
+    def cancel(self):
+        if not self.future.done():
+            self.future.cancel()
+
+
+class QuizPrefetcher:
+    """Не более одного подготовленного вопроса на пользователя."""
+
+    def __init__(self, bank, ttl: float = 600, max_users: int = MAX_USERS):
+        self.bank = bank
+        self.ttl = ttl
+        self.max_users = max_users
+        # user_id -> Prefetch
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def start(self, user_id: int, topic_key: str, topic_data: dict, seen: SeenSet):
+        """Начать подготовку следующего вопроса; предыдущий резерв освобождается"""
+        self.release(user_id)
+
+        loop = asyncio.get_running_loop()
+        picked = self.bank.pick(topic_key, exclude=seen)
+        if picked:
+            future = loop.create_future()
+            future.set_result(picked)
+        else:
+            future = loop.create_task(self._generate(topic_key, topic_data))
+
+        self._entries[user_id] = Prefetch(topic_key, future)
+        while len(self._entries) > self.max_users:
+            _, oldest = self._entries.popitem(last=False)
+            self._discard(oldest)
+
+    def pop(self, user_id: int, topic_key: str):
+        """Забрать подготовленный вопрос по теме; Prefetch или None"""
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.topic_key != topic_key or time.monotonic() - entry.created > self.ttl:
+            self._discard(entry)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def release(self, user_id: int):
+        """Пользователь сменил тему или закончил квиз"""
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._discard(entry)
+
+    def _discard(self, entry: Prefetch):
+        # Зарезервированный вопрос из банка просто остаётся в общем банке
+        entry.cancel()
+        self.discarded += 1
+
+    async def _generate(self, topic_key: str, topic_data: dict):
+        question = await generate_quiz_question(topic_data, priority=Priority.DEFAULT)
+        question_id = await self.bank.add_async(topic_key, question)
+        return question_id, question
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "discarded": self.discarded,
+        }
+
+
+quiz_prefetcher = QuizPrefetcher(question_bank, ttl=QUIZ_PREFETCH_TTL)
+metrics.collect_gauge("quiz_prefetch_pending", "Заранее подготовленные вопросы квиза",
+                      lambda: quiz_prefetcher.stats()["pending"])
+metrics.collect_counter("quiz_prefetch_lookups_total", "Обращения к подготовленным вопросам", lambda: {
+    ("hit",): quiz_prefetcher.hits,
+    ("miss",): quiz_prefetcher.misses,
+}, ("result",))
@@ -0,0 +1,156 @@
+"""Вопросы квиза в структурированном виде.
+
+Модель возвращает вопрос вместе с вариантами, правильной буквой и
+пояснением к каждому варианту, поэтому ответ пользователя проверяется и
+объясняется локально, без второго запроса к ChatGPT.
+"""
+import hashlib
+import html
+import json
+import logging
+import re
+
+from data.quiz_topics import QUIZ_FORMAT_PROMPT, QUIZ_DIFFICULTIES, DEFAULT_DIFFICULTY
+from services.llm_gateway import Priority
+from services.openai_client import complete, FEATURE_QUIZ
+
+logger = logging.getLogger(__name__)
+
+LETTERS = ("A", "B", "C", "D")
+# Варианты показываются латиницей; в русской раскладке вместо A, B, C набирают
+# одинаковые на вид кириллические буквы. Остальные кириллические буквы не принимаются
+CYRILLIC_LETTERS = {"А": "A", "В": "B", "С": "C"}
+GENERATION_ATTEMPTS = 3
+
+
+class QuizFormatError(ValueError):
+    """Ответ модели не удалось разобрать как вопрос квиза."""
+
+
+class QuizQuestion:
+    """Вопрос с четырьмя вариантами, правильной буквой и пояснениями."""
+
+    def __init__(self, question: str, options: dict, correct: str, explanations: dict):
+        self.question = question
+        self.options = options
+        self.correct = correct
+        self.explanations = explanations
+
+    @classmethod
+    def from_dict(cls, data) -> "QuizQuestion":
+        """Проверить и создать вопрос из словаря; при ошибке - QuizFormatError"""
+        if not isinstance(data, dict):
+            raise QuizFormatError("ожидался JSON-объект")
+
+        question = data.get("question")
+        options = data.get("options")
+        correct = str(data.get("correct", "")).strip().upper()[:1]
+        explanations = data.get("explanations")
+
+        if not isinstance(question, str) or not question.strip():
+            raise QuizFormatError("нет текста вопроса")
+        if not isinstance(options, dict) or not isinstance(explanations, dict):
+            raise QuizFormatError("нет вариантов ответа или пояснений")
+
+        options = {str(k).strip().upper(): v for k, v in options.items()}
+        explanations = {str(k).strip().upper(): v for k, v in explanations.items()}
+        for letter in LETTERS:
+            if not isinstance(options.get(letter), str) or not options[letter].strip():
+                raise QuizFormatError(f"нет варианта {letter}")
+            if not isinstance(explanations.get(letter), str) or not explanations[letter].strip():
+                raise QuizFormatError(f"нет пояснения к варианту {letter}")
+        if correct not in LETTERS:
+            raise QuizFormatError(f"неверная буква правильного ответа: {data.get('correct')!r}")
+
+        return cls(
+            question.strip(),
+            {letter: options[letter].strip() for letter in LETTERS},
+            correct,
+            {letter: explanations[letter].strip() for letter in LETTERS}
+        )
+
+    @classmethod
+    def parse(cls, text: str) -> "QuizQuestion":
+        """Разобрать JSON-ответ модели"""
+        text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise QuizFormatError(f"невалидный JSON: {e}") from e
+        return cls.from_dict(data)
+
+    def to_dict(self) -> dict:
+        return {
+            "question": self.question,
+            "options": self.options,
+            "correct": self.correct,
+            "explanations": self.explanations,
+        }
+
+    def content_hash(self) -> str:
+        """Хэш содержимого для поиска дубликатов: вопрос и варианты без учёта регистра и пробелов"""
+        parts = [self.question] + [self.options[letter] for letter in LETTERS]
+        normalized = "\n".join(re.sub(r"\s+", " ", part).strip().casefold() for part in parts)
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def format_text(self) -> str:
+        """Текст вопроса с вариантами для сообщения с parse_mode='HTML'"""
+        lines = [html.escape(self.question), ""]
+        lines.extend(f"{letter}) {html.escape(self.options[letter])}" for letter in LETTERS)
+        return "\n".join(lines)
+
+    def explain(self, letter: str) -> str:
+        """Пояснение к выбранному варианту (и к правильному, если выбран другой)"""
+        text = html.escape(self.explanations[letter])
+        if letter != self.correct:
+            text += f"\n\n<b>{self.correct})</b> {html.escape(self.explanations[self.correct])}"
+        return text
+
+
+def parse_answer(text: str):
+    """Буква ответа пользователя или None, если это не A-D"""
+    text = text.strip().upper()
+    if not text:
+        return None
+    letter = CYRILLIC_LETTERS.get(text[0], text[0])
+    if letter in LETTERS and (len(text) == 1 or not text[1].isalnum()):
+        return letter
+    return None
+
+
+async def generate_quiz_question(topic_data: dict, difficulty: str = DEFAULT_DIFFICULTY,
+                                 priority: Priority = Priority.INTERACTIVE) -> QuizQuestion:
+    """Сгенерировать вопрос по теме; невалидный ответ модели генерируется заново"""
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                f"{topic_data['prompt']}\n"
+                f"Сложность вопроса: {QUIZ_DIFFICULTIES[difficulty]}.\n\n"
+                f"{QUIZ_FORMAT_PROMPT}"
+            )
+        },
+        {
+            "role": "user",
+            "content": "Создай вопрос для квиза"
+        }
+    ]
+
+    error = None
+    for attempt in range(GENERATION_ATTEMPTS):
+        text = await complete(
+            messages,
+            max_tokens=700,
+            temperature=0.9,
+            feature=FEATURE_QUIZ,
+            priority=priority,
+            coalesce=False,
+            response_format={"type": "json_object"}
+        )
+        try:
+            return QuizQuestion.parse(text)
+        except QuizFormatError as e:
+            error = e
+            logger.warning(f"Модель вернула вопрос в неверном формате (попытка {attempt + 1}): {e}")
+
+    raise QuizFormatError(f"не удалось получить валидный вопрос: {error}")
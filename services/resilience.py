@@ -0,0 +1,275 @@
+"""Повторы, предохранитель и хеджирование запросов к OpenAI.
+
+- RetryPolicy различает 429, ошибки 5xx и таймауты, учитывает Retry-After
+  и делает паузы с экспоненциальным ростом и случайным разбросом.
+- CircuitBreaker после серии сбоев сразу отклоняет запросы, пока апстрим
+  не восстановится.
+- ResilientCaller при включённом хеджировании запускает второй запрос,
+  если первый не ответил за p95 обычной задержки, и берёт первый ответ.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT = "rate_limit"
+SERVER_ERROR = "server_error"
+TIMEOUT = "timeout"
+
+
+class CircuitOpenError(Exception):
+    """Апстрим считается недоступным, запрос отклонён без обращения к нему."""
+
+
+def classify_error(error: BaseException):
+    """Тип временной ошибки или None, если повторять запрос бессмысленно"""
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMIT
+    if isinstance(error, (openai.APITimeoutError, asyncio.TimeoutError)):
+        return TIMEOUT
+    if isinstance(error, openai.InternalServerError):
+        return SERVER_ERROR
+    if isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+        return SERVER_ERROR
+    if isinstance(error, openai.APIConnectionError):
+        return TIMEOUT
+    return None
+
+
+def retry_after(error: BaseException):
+    """Пауза из заголовков Retry-After / retry-after-ms, если апстрим её указал"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class RetryPolicy:
+    """Сколько раз и с какими паузами повторять запрос."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 10.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, kind: str, error: BaseException) -> float:
+        suggested = retry_after(error)
+        if suggested is not None:
+            return suggested
+        base = self.base_delay * (2 if kind == RATE_LIMIT else 1)
+        return random.uniform(0, min(self.max_delay, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Размыкается после failure_threshold сбоев подряд на reset_timeout секунд."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            # Пропускаем один пробный запрос
+            self._trial_running = True
+            return True
+        return False
+
+    def cancel_trial(self):
+        """Пробный запрос отменён, не дойдя до ответа: пробным может стать следующий"""
+        self._trial_running = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Предохранитель OpenAI разомкнут: слишком много ошибок подряд")
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Скользящее окно задержек для оценки p95."""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class ResilientCaller:
+    """Выполняет запросы к апстриму с повторами, предохранителем и хеджированием."""
+
+    HEDGE_MIN_SAMPLES = 20
+    HEDGE_MIN_DELAY = 0.5
+
+    def __init__(self, retry: RetryPolicy, breaker: CircuitBreaker, hedge: bool = False):
+        self.retry = retry
+        self.breaker = breaker
+        self.hedge = hedge
+        self.latency = {}
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def _tracker(self, feature: str) -> LatencyTracker:
+        tracker = self.latency.get(feature)
+        if tracker is None:
+            tracker = self.latency[feature] = LatencyTracker()
+        return tracker
+
+    async def call(self, feature: str, func, timeout: float):
+        """Вызвать func() с повторами в пределах общего бюджета timeout секунд"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        attempt = 0
+        while True:
+            trial = self.breaker.state == "half_open"
+            if not self.breaker.allow():
+                raise CircuitOpenError("OpenAI временно недоступен")
+            remaining = deadline - loop.time()
+            try:
+                result = await asyncio.wait_for(self._attempt(feature, func), remaining)
+            except asyncio.CancelledError:
+                # Отмена ничего не говорит о здоровье апстрима, но пробный слот нужно освободить
+                if trial:
+                    self.breaker.cancel_trial()
+                raise
+            except Exception as e:
+                kind = classify_error(e)
+                if kind is None:
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                delay = self.retry.delay(attempt, kind, e)
+                attempt += 1
+                if attempt >= self.retry.max_attempts or loop.time() + delay >= deadline:
+                    raise
+                logger.warning(f"Запрос к OpenAI ({feature}) не удался ({kind}), повтор через {delay:.2f} с")
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    async def stream(self, feature: str, factory, timeout: float):
+        """Потоковый вариант call: повторяем, пока не пришёл первый чанк.
+
+        timeout ограничивает время до первого чанка; после него поток
+        отдаётся как есть, без повторов.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        attempt = 0
+        while True:
+            trial = self.breaker.state == "half_open"
+            if not self.breaker.allow():
+                raise CircuitOpenError("OpenAI временно недоступен")
+            chunks = factory()
+            started = time.monotonic()
+            try:
+                first = await asyncio.wait_for(chunks.__anext__(), deadline - loop.time())
+            except StopAsyncIteration:
+                self.breaker.record_success()
+                return
+            except asyncio.CancelledError:
+                if trial:
+                    self.breaker.cancel_trial()
+                await chunks.aclose()
+                raise
+            except Exception as e:
+                await chunks.aclose()
+                kind = classify_error(e)
+                if kind is None:
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                delay = self.retry.delay(attempt, kind, e)
+                attempt += 1
+                if attempt >= self.retry.max_attempts or loop.time() + delay >= deadline:
+                    raise
+                logger.warning(f"Потоковый запрос к OpenAI ({feature}) не удался ({kind}), повтор через {delay:.2f} с")
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._tracker(f"{feature}:first_chunk").add(time.monotonic() - started)
+            try:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+            return
+
+    async def _attempt(self, feature: str, func):
+        tracker = self._tracker(feature)
+        started = time.monotonic()
+        hedge_delay = tracker.percentile(0.95) if len(tracker.samples) >= self.HEDGE_MIN_SAMPLES else None
+        if not self.hedge or hedge_delay is None:
+            result = await func()
+            tracker.add(time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(func())
+        done, _ = await asyncio.wait({primary}, timeout=max(hedge_delay, self.HEDGE_MIN_DELAY))
+        if done:
+            tracker.add(time.monotonic() - started)
+            return primary.result()
+
+        self.hedges_fired += 1
+        logger.info(f"Запрос к OpenAI ({feature}) дольше p95 ({hedge_delay:.2f} с), отправляю дублирующий")
+        hedge = asyncio.ensure_future(func())
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                        tracker.add(time.monotonic() - started)
+                        return task.result()
+            # Обе попытки упали - пробрасываем ошибку основной
+            return primary.result()
+        finally:
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
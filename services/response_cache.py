@@ -0,0 +1,176 @@
+"""Кэш ответов ChatGPT по точному совпадению нормализованного промпта.
+
+Первый уровень - LRU в памяти с TTL, второй (необязательный) - SQLite
+на диске, переживающий перезапуск бота. Для каждой функции запроса
+задаётся своя политика кэширования (CachePolicy).
+"""
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from services.single_flight import request_key
+
+logger = logging.getLogger(__name__)
+
+
+class CachePolicy:
+    """Как кэшировать ответы конкретной функции."""
+
+    def __init__(self, ttl: float = 0, use_disk: bool = False):
+        self.ttl = ttl
+        self.use_disk = use_disk
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+
+NO_CACHE = CachePolicy()
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip().casefold()
+
+
+def cache_key(messages, **params) -> str:
+    """Ключ кэша: сообщения без различий в регистре и пробелах плюс параметры запроса"""
+    normalized = [{"role": m["role"], "content": normalize_text(m.get("content"))} for m in messages]
+    return request_key(messages=normalized, **params)
+
+
+class MemoryCache:
+    """LRU в памяти с TTL на каждую запись."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, value = entry
+        if expires < time.time():
+            del self._entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str, expires: float):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class SqliteCache:
+    """Дисковый уровень кэша; запросы выполняются в отдельном потоке."""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and row[1] < time.time():
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                self.evictions += 1
+                row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def _set(self, key: str, value: str, expires: float):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, value, expires))
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self.evictions += self._db.execute("DELETE FROM responses WHERE expires < ?", (time.time(),)).rowcount
+            self._db.commit()
+
+    async def get(self, key: str):
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str, expires: float):
+        await asyncio.to_thread(self._set, key, value, expires)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class ResponseCache:
+    """Двухуровневый кэш ответов."""
+
+    def __init__(self, max_entries: int, db_path: str = None):
+        self.memory = MemoryCache(max_entries)
+        self.disk = None
+        if db_path:
+            try:
+                self.disk = SqliteCache(db_path)
+            except sqlite3.Error as e:
+                logger.warning(f"Дисковый кэш ответов недоступен ({db_path}): {e}")
+
+    async def get(self, key: str, policy: CachePolicy):
+        if not policy.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is not None or not (policy.use_disk and self.disk):
+            return value
+
+        try:
+            value = await self.disk.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка чтения дискового кэша: {e}")
+            return None
+        if value is not None:
+            self.memory.set(key, value, time.time() + policy.ttl)
+        return value
+
+    async def set(self, key: str, value: str, policy: CachePolicy):
+        if not policy.enabled:
+            return
+        expires = time.time() + policy.ttl
+        self.memory.set(key, value, expires)
+        if policy.use_disk and self.disk:
+            try:
+                await self.disk.set(key, value, expires)
+            except sqlite3.Error as e:
+                logger.warning(f"Ошибка записи в дисковый кэш: {e}")
+
+    def stats(self) -> dict:
+        stats = {"memory": self.memory.stats()}
+        if self.disk:
+            stats["disk"] = self.disk.stats()
+        return stats
@@ -0,0 +1,72 @@
+"""Экраны бота: переход между меню правкой того же сообщения.
+
+show_screen выводит экран (текст, клавиатура и необязательная картинка)
+ответом на команду или правкой сообщения, под которым нажата кнопка.
+Экран с картинкой поверх другой картинки меняется одним editMessageMedia
+по сохранённому file_id, а если картинка та же (совпадает file_unique_id) -
+только подписью.
+Bot API не умеет превращать текстовое сообщение в сообщение с картинкой,
+поэтому такой переход правит текст на месте: сообщения не копятся, и
+на переход уходит один вызов без загрузки файла.
+"""
+import logging
+import os
+
+from telegram import InputMediaPhoto, Message, Update
+from telegram.error import BadRequest
+
+from services.media_cache import media_registry
+
+logger = logging.getLogger(__name__)
+
+# Лимит подписи к картинке в Telegram
+CAPTION_LIMIT = 1024
+
+
+async def show_screen(update: Update, text: str, reply_markup=None, image_path: str = None,
+                      parse_mode: str = 'HTML') -> Message:
+    """Показать экран: новым сообщением на команду или на месте сообщения с кнопкой"""
+    if image_path and not os.path.exists(image_path):
+        logger.warning(f"Картинка экрана не найдена: {image_path}")
+        image_path = None
+
+    query = update.callback_query
+    if query is None:
+        if image_path and len(text) <= CAPTION_LIMIT:
+            return await media_registry.send_photo(
+                update.message.reply_photo,
+                image_path,
+                caption=text,
+                parse_mode=parse_mode,
+                reply_markup=reply_markup
+            )
+        return await update.message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+
+    message = query.message
+    try:
+        if not message.photo:
+            return await message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+        if len(text) > CAPTION_LIMIT:
+            # Длинный текст не помещается в подпись - продолжаем новым сообщением
+            return await message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+        if image_path is None or _shows_image(message, image_path):
+            return await message.edit_caption(caption=text, parse_mode=parse_mode, reply_markup=reply_markup)
+
+        async def edit_media(photo, **kwargs):
+            return await message.edit_media(
+                InputMediaPhoto(photo, caption=text, parse_mode=parse_mode),
+                reply_markup=reply_markup
+            )
+
+        return await media_registry.send_photo(edit_media, image_path)
+    except BadRequest as e:
+        # Повторное нажатие той же кнопки - экран уже показан
+        if "not modified" not in str(e).lower():
+            raise
+        return message
+
+
+def _shows_image(message: Message, image_path: str) -> bool:
+    # file_id картинки зависит от сообщения, сравнивать можно только file_unique_id
+    file_unique_id = media_registry.get_file_unique_id(image_path)
+    return file_unique_id is not None and message.photo[-1].file_unique_id == file_unique_id
@@ -0,0 +1,77 @@
+"""Компактный учёт того, что пользователь уже видел.
+
+SeenSet - два поколения фильтра Блума фиксированного размера: когда
+текущее поколение заполняется, оно становится предыдущим, а самое старое
+забывается. Размер не зависит от числа сыгранных раундов, проверка
+"видел ли" - несколько битовых операций без просмотра истории.
+Возможны редкие ложные срабатывания: непоказанный элемент может быть
+принят за показанный, что для выбора вопросов и фактов безопасно.
+"""
+import base64
+import hashlib
+import math
+
+# Сколько элементов помнит одно поколение и допустимая доля ложных срабатываний
+CAPACITY = 128
+ERROR_RATE = 0.01
+
+BITS = math.ceil(-CAPACITY * math.log(ERROR_RATE) / math.log(2) ** 2)
+BYTES = (BITS + 7) // 8
+HASHES = max(1, round(BITS / CAPACITY * math.log(2)))
+
+
+def _positions(item):
+    digest = hashlib.blake2b(str(item).encode("utf-8"), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % BITS for i in range(HASHES)]
+
+
+def _has(bits: bytearray, positions) -> bool:
+    return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+
+class SeenSet:
+    """Множество показанных элементов на фильтрах Блума."""
+
+    def __init__(self, current: bytearray = None, previous: bytearray = None, count: int = 0):
+        self.current = current or bytearray(BYTES)
+        self.previous = previous or bytearray(BYTES)
+        self.count = count
+
+    def __contains__(self, item) -> bool:
+        positions = _positions(item)
+        return _has(self.current, positions) or _has(self.previous, positions)
+
+    def add(self, item):
+        if item in self:
+            return
+        if self.count >= CAPACITY:
+            self.previous = self.current
+            self.current = bytearray(BYTES)
+            self.count = 0
+        for p in _positions(item):
+            self.current[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def dumps(self) -> str:
+        raw = self.count.to_bytes(2, "little") + bytes(self.current) + bytes(self.previous)
+        return base64.b64encode(raw).decode("ascii")
+
+    @classmethod
+    def loads(cls, data: str) -> "SeenSet":
+        raw = base64.b64decode(data)
+        if len(raw) != 2 + 2 * BYTES:
+            # Параметры фильтра поменялись - начинаем заново
+            return cls()
+        return cls(bytearray(raw[2:2 + BYTES]), bytearray(raw[2 + BYTES:]), int.from_bytes(raw[:2], "little"))
+
+
+def load_seen(user_data: dict, scope: str) -> SeenSet:
+    """SeenSet пользователя для области (тема квиза, факты) из context.user_data"""
+    data = user_data.get('seen_sets', {}).get(scope)
+    return SeenSet.loads(data) if data else SeenSet()
+
+
+def save_seen(user_data: dict, scope: str, seen: SeenSet):
+    user_data.setdefault('seen_sets', {})[scope] = seen.dumps()
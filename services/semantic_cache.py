@@ -0,0 +1,239 @@
+"""Кэш ответов ChatGPT по смыслу вопроса.
+
+Вопросы, сформулированные по-разному ("объясни квантовую физику простыми
+словами", "объясни простыми словами, что такое квантовая физика"), точный
+кэш считает разными. Здесь каждый вопрос превращается в нормированный
+вектор, все векторы лежат подряд в одной матрице NumPy, и поиск - это одно
+умножение матрицы на вектор запроса: косинусная близость ко всем вопросам
+сразу. Ответ берётся из кэша, если близость не ниже порога.
+
+Эмбеддинги считает OpenAIEmbedder - модель эмбеддингов OpenAI через шлюз.
+HashingEmbedder на хэшированных символьных n-граммах работает без сети, но
+сравнивает только написание: "люблю кошек" и "люблю собак" для него почти
+одно и то же. Он годится лишь для тестов и бенчмарков, и SemanticCache
+отказывается работать с ним без явного allow_lexical=True.
+
+Вектор вопроса считается один раз (embed), а lookup и store принимают
+готовый вектор - на промах кэша уходит один запрос эмбеддинга, а не два.
+
+На диске кэш - vectors.npy (матрица векторов, открывается через mmap, так
+что старт не зависит от размера кэша) и meta.json с вопросами, ответами и
+сроками жизни.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from services.response_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.json"
+PUNCTUATION = ".,!?;:()«»\"'-"
+
+
+class HashingEmbedder:
+    """Локальные эмбеддинги: символьные n-граммы слов, хэшированные в dim корзин со знаком."""
+
+    # Близость написания, а не смысла
+    semantic = False
+
+    def __init__(self, dim: int = 256, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+        self.name = f"hashing-{ngram}"
+
+    def _features(self, text: str):
+        for word in normalize_text(text).split():
+            word = f"<{word.strip(PUNCTUATION)}>"
+            if len(word) <= self.ngram:
+                yield word
+                continue
+            for start in range(len(word) - self.ngram + 1):
+                yield word[start:start + self.ngram]
+
+    async def embed(self, texts) -> np.ndarray:
+        return self.embed_sync(texts)
+
+    def embed_sync(self, texts) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vectors[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+        return _normalize(vectors)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class OpenAIEmbedder:
+    """Эмбеддинги модели OpenAI; request(texts) возвращает список векторов длины dim."""
+
+    semantic = True
+
+    def __init__(self, request, model: str, dim: int):
+        self.request = request
+        self.name = model
+        self.dim = dim
+
+    async def embed(self, texts) -> np.ndarray:
+        vectors = np.asarray(await self.request(list(texts)), dtype=np.float32)
+        if vectors.shape != (len(texts), self.dim):
+            raise ValueError(f"Модель {self.name} вернула эмбеддинги размера {vectors.shape}, ожидался {self.dim}")
+        return _normalize(vectors)
+
+
+class SemanticCache:
+    """Вопросы и ответы с поиском ближайшего вопроса по косинусной близости."""
+
+    def __init__(self, embedder, max_entries: int = 5000, threshold: float = 0.9, ttl: float = 24 * 3600,
+                 path: str = None, allow_lexical: bool = False):
+        if not embedder.semantic and not allow_lexical:
+            raise ValueError(f"Эмбеддер {embedder.name} сравнивает написание, а не смысл, и не годится для кэша")
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.path = path
+
+        self._vectors = np.zeros((0, embedder.dim), dtype=np.float32)
+        self._expires = np.zeros(0, dtype=np.float64)
+        self._last_used = np.zeros(0, dtype=np.float64)
+        self._questions = []
+        self._answers = []
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self.load()
+
+    async def embed(self, question: str) -> np.ndarray:
+        """Вектор вопроса для lookup и store"""
+        return (await self.embedder.embed([question]))[0]
+
+    def lookup(self, vector: np.ndarray):
+        """Ответ на самый близкий сохранённый вопрос или None"""
+        if self.size == 0:
+            self.misses += 1
+            return None
+        scores = self._vectors[:self.size] @ vector
+        scores[self._expires[:self.size] < time.time()] = -1.0
+        index = int(np.argmax(scores))
+        if scores[index] < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._last_used[index] = time.monotonic()
+        logger.debug(f"Семантический кэш: близость {scores[index]:.3f} к вопросу {self._questions[index]!r}")
+        return self._answers[index]
+
+    def store(self, question: str, vector: np.ndarray, answer: str):
+        index = None
+        if self.size:
+            scores = self._vectors[:self.size] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                # Почти такой же вопрос уже есть - обновляем его ответ
+                index = best
+        if index is None:
+            index = self._free_row()
+
+        self._vectors[index] = vector
+        self._expires[index] = time.time() + self.ttl
+        self._last_used[index] = time.monotonic()
+        self._questions[index] = question
+        self._answers[index] = answer
+
+    def _free_row(self) -> int:
+        now = time.time()
+        if self.size:
+            expired = np.flatnonzero(self._expires[:self.size] < now)
+            if len(expired):
+                return int(expired[0])
+        if self.size < self.max_entries:
+            if self.size == len(self._vectors):
+                self._grow(min(self.max_entries, max(64, 2 * self.size)))
+            self.size += 1
+            self._questions.append(None)
+            self._answers.append(None)
+            return self.size - 1
+        # Кэш заполнен - вытесняем запись, к которой дольше всех не обращались
+        self.evictions += 1
+        return int(np.argmin(self._last_used[:self.size]))
+
+    def _grow(self, capacity: int):
+        # Новая непрерывная матрица; прежняя (возможно, отображённая с диска) копируется в неё
+        vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        vectors[:self.size] = self._vectors[:self.size]
+        expires = np.zeros(capacity, dtype=np.float64)
+        expires[:self.size] = self._expires[:self.size]
+        last_used = np.zeros(capacity, dtype=np.float64)
+        last_used[:self.size] = self._last_used[:self.size]
+        self._vectors, self._expires, self._last_used = vectors, expires, last_used
+
+    def save(self):
+        """Записать кэш в каталог path: матрицу векторов и метаданные"""
+        if not self.path:
+            return
+        now = time.time()
+        alive = [index for index in range(self.size) if self._expires[index] >= now]
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            vectors_path = os.path.join(self.path, VECTORS_FILE)
+            with open(f"{vectors_path}.tmp", "wb") as f:
+                np.save(f, np.ascontiguousarray(self._vectors[alive]))
+            meta = {
+                "dim": self.embedder.dim,
+                "embedder": self.embedder.name,
+                "questions": [self._questions[index] for index in alive],
+                "answers": [self._answers[index] for index in alive],
+                "expires": [float(self._expires[index]) for index in alive],
+            }
+            meta_path = os.path.join(self.path, META_FILE)
+            with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(f"{vectors_path}.tmp", vectors_path)
+            os.replace(f"{meta_path}.tmp", meta_path)
+            logger.info(f"Семантический кэш сохранён: {len(alive)} вопросов")
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить семантический кэш в {self.path}: {e}")
+
+    def load(self):
+        try:
+            with open(os.path.join(self.path, META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+            # mmap_mode="c": страницы читаются с диска по мере обращения, записи остаются в памяти
+            vectors = np.load(os.path.join(self.path, VECTORS_FILE), mmap_mode="c")
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать семантический кэш {self.path}: {e}")
+            return
+
+        if meta.get("embedder") != self.embedder.name or meta.get("dim") != self.embedder.dim \
+                or vectors.shape != (len(meta["questions"]), self.embedder.dim):
+            logger.warning(f"Семантический кэш {self.path} построен другим эмбеддером, начинаю с пустого")
+            return
+
+        count = min(len(meta["questions"]), self.max_entries)
+        self._vectors = vectors[:count]
+        self._expires = np.array(meta["expires"][:count], dtype=np.float64)
+        self._last_used = np.zeros(count, dtype=np.float64)
+        self._questions = meta["questions"][:count]
+        self._answers = meta["answers"][:count]
+        self.size = count
+        logger.info(f"Семантический кэш загружен: {count} вопросов")
+
+    def stats(self) -> dict:
+        return {"size": self.size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
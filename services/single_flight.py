@@ -0,0 +1,136 @@
+"""Склейка одинаковых одновременных запросов к OpenAI.
+
+Пока запрос с ключом (модель, сообщения, параметры) выполняется, все
+остальные вызовы с тем же ключом ждут его результат, а не идут в OpenAI
+сами. Потоковые ответы раздаются всем подписчикам по мере генерации.
+
+Если ответ больше никому не нужен, запрос отменяется и сразу убирается из
+реестра: следующий вызов с тем же ключом начнёт новый запрос, а не получит
+обрезанный результат отменённого.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(**params) -> str:
+    """Ключ запроса по модели, сообщениям и параметрам генерации"""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StreamCancelled(Exception):
+    """Потоковый запрос отменён до последнего фрагмента - ответ неполный."""
+
+
+class _Flight:
+    """Выполняющийся запрос и число вызовов, которые его ждут."""
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """Потоковый ответ, который читают несколько подписчиков."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def run(self, chunks):
+        try:
+            async for chunk in chunks:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            # Подписчик, успевший присоединиться, не должен принять обрывок за весь ответ
+            self.error = StreamCancelled("Потоковый запрос к OpenAI отменён")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """Реестр выполняющихся запросов по ключу."""
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, func):
+        """Выполнить func() или дождаться уже идущего вызова с тем же ключом"""
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._calls[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(self._calls, key, flight))
+        else:
+            self.coalesced += 1
+            logger.debug("Запрос к OpenAI присоединён к уже выполняющемуся")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Результат больше никому не нужен
+                self._forget(self._calls, key, flight)
+                flight.task.cancel()
+
+    async def stream(self, key: str, factory):
+        """Потоковый вариант do: factory() возвращает асинхронный итератор чанков"""
+        broadcast = self._streams.get(key)
+        if broadcast is None or broadcast.error is not None:
+            # Упавший поток ещё может быть в реестре до своего done-колбэка
+            broadcast = _Broadcast()
+            broadcast.task = asyncio.ensure_future(broadcast.run(factory()))
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._forget(self._streams, key, broadcast))
+        else:
+            self.coalesced += 1
+            logger.debug("Потоковый запрос к OpenAI присоединён к уже выполняющемуся")
+
+        broadcast.subscribers += 1
+        try:
+            async for chunk in broadcast.subscribe():
+                yield chunk
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.task.done():
+                self._forget(self._streams, key, broadcast)
+                broadcast.task.cancel()
+
+    @staticmethod
+    def _forget(registry: dict, key: str, value):
+        if registry.get(key) is value:
+            del registry[key]
@@ -0,0 +1,190 @@
+"""Постепенный вывод потокового ответа ChatGPT в одно сообщение Telegram.
+
+Первый фрагмент ответа отправляется сразу, дальше сообщение правится на
+месте не чаще одного раза в STREAM_EDIT_INTERVAL секунд. Перед каждой
+правкой HTML приводится к валидному виду, а при превышении лимита
+Telegram ответ продолжается в новом сообщении. Пока первый фрагмент не
+пришёл, ProgressMessage держит индикатор набора и, если ожидание
+затянулось, заглушку, которую затем правит первый фрагмент.
+"""
+import asyncio
+import html
+import logging
+import re
+import time
+
+from telegram.error import BadRequest, TelegramError
+
+from config import STREAM_EDIT_INTERVAL
+from services.progress import ProgressMessage
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 4096
+# Запас под закрывающие теги и экранирование
+SOFT_LIMIT = MESSAGE_LIMIT - 96
+
+ALLOWED_TAGS = {
+    "b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "span",
+    "tg-spoiler", "a", "code", "pre", "blockquote", "tg-emoji",
+}
+TOKEN_RE = re.compile(r"<[^<>]*>?|&[^\s&;<>]*;?|>|[^<&>]+")
+TAG_RE = re.compile(r"<(/?)([a-zA-Z][\w-]*)(\s[^<>]*)?>")
+PARTIAL_TAG_RE = re.compile(r"</?([a-zA-Z][\w-]*(\s[^<>]*)?)?")
+ENTITY_RE = re.compile(r"&(#\d+|#x[0-9a-fA-F]+|[a-zA-Z]+);")
+
+
+def close_html(text: str, final: bool = False) -> str:
+    """Привести текст к HTML, который примет Telegram.
+
+    Разрешённые теги сохраняются и закрываются в конце, всё остальное
+    экранируется. Незаконченный тег или сущность в конце текста
+    (ответ ещё генерируется) отбрасывается, если final=False.
+    """
+    out = []
+    stack = []
+    tokens = TOKEN_RE.findall(text)
+    last = len(tokens) - 1
+
+    for index, token in enumerate(tokens):
+        if token.startswith("<"):
+            match = TAG_RE.fullmatch(token)
+            if match and match.group(2).lower() in ALLOWED_TAGS:
+                name = match.group(2).lower()
+                if not match.group(1):
+                    stack.append(name)
+                    out.append(token)
+                elif name in stack:
+                    while stack:
+                        opened = stack.pop()
+                        out.append(f"</{opened}>")
+                        if opened == name:
+                            break
+                continue
+            if index == last and not final and PARTIAL_TAG_RE.fullmatch(token):
+                break
+            out.append(html.escape(token, quote=False))
+        elif token.startswith("&"):
+            if ENTITY_RE.fullmatch(token):
+                out.append(token)
+                continue
+            if index == last and not final and not token.endswith(";"):
+                break
+            out.append(html.escape(token, quote=False))
+        elif token == ">":
+            out.append("&gt;")
+        else:
+            out.append(token)
+
+    out.extend(f"</{name}>" for name in reversed(stack))
+    return "".join(out)
+
+
+class StreamRenderer:
+    """Выводит поток фрагментов текста ответом на сообщение пользователя."""
+
+    def __init__(self, message, header: str = "", reply_markup=None, interval: float = STREAM_EDIT_INTERVAL,
+                 placeholder: str = None):
+        self.message = message
+        self.progress = ProgressMessage(reply_to=message, placeholder=placeholder)
+        self.reply_markup = reply_markup
+        self.interval = interval
+        self.messages = []
+        # Поток оборвался ошибкой после начала вывода
+        self.interrupted = False
+
+        self._prefix = header
+        self._text = ""
+        self._current = None
+        self._sent = None
+        self._last_edit = 0.0
+
+    async def render(self, chunks) -> str:
+        """Вывести поток и вернуть полный текст ответа"""
+        parts = []
+        async with self.progress:
+            try:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    self._text += chunk
+                    if len(self._prefix) + len(self._text) > SOFT_LIMIT:
+                        await self._overflow()
+                    if self._current is None or time.monotonic() - self._last_edit >= self.interval:
+                        await self._flush()
+            except asyncio.CancelledError:
+                # Пользователь написал новое сообщение или закончил диалог
+                if self._current is None and not self.messages:
+                    await self._drop_placeholder()
+                else:
+                    self._text += "\n\n⏹ Ответ остановлен."
+                    await self._flush(final=True)
+                raise
+            except Exception as e:
+                if self._current is None and not self.messages:
+                    await self._drop_placeholder()
+                    raise
+                logger.error(f"Потоковый ответ прерван: {e}")
+                self.interrupted = True
+                self._text += "\n\n⚠️ Ответ прерван из-за ошибки."
+
+            if not self._text.strip() and self._current is None and not self.messages:
+                self._text = "🤔 Пустой ответ."
+            await self._flush(final=True)
+        return "".join(parts)
+
+    async def _drop_placeholder(self):
+        """Убрать заглушку, если ответ так и не начался: об ошибке сообщит обработчик"""
+        await self.progress.__aexit__(None, None, None)
+        if self.progress.message is None:
+            return
+        try:
+            await self.progress.message.delete()
+        except TelegramError as e:
+            logger.debug(f"Не удалось удалить заглушку: {e}")
+
+    async def _flush(self, final: bool = False):
+        text = close_html(self._prefix + self._text, final=final)
+        while len(text) > MESSAGE_LIMIT:
+            await self._overflow()
+            text = close_html(self._prefix + self._text, final=final)
+
+        if not text.strip():
+            return
+
+        reply_markup = self.reply_markup if final else None
+        await self._publish(text, reply_markup, force=final)
+
+    async def _publish(self, text: str, reply_markup=None, force: bool = False):
+        if self._current is None and not self.messages:
+            # Первое сообщение ответа заменяет заглушку прогресса
+            self._current = await self.progress.show(text, reply_markup)
+            self.messages.append(self._current)
+        elif self._current is None:
+            self._current = await self.message.reply_text(text, parse_mode='HTML', reply_markup=reply_markup)
+            self.messages.append(self._current)
+        elif text != self._sent or force:
+            try:
+                await self._current.edit_text(text, parse_mode='HTML', reply_markup=reply_markup)
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+        self._sent = text
+        self._last_edit = time.monotonic()
+
+    async def _overflow(self):
+        """Закончить текущее сообщение и перенести остаток текста в новое"""
+        budget = SOFT_LIMIT - len(self._prefix)
+        while True:
+            cut = max(self._text.rfind("\n", 0, budget), self._text.rfind(" ", 0, budget))
+            if cut <= 0:
+                cut = budget
+            head = close_html(self._prefix + self._text[:cut], final=True)
+            if len(head) <= MESSAGE_LIMIT:
+                break
+            budget = int(budget * 0.9)
+
+        await self._publish(head, force=True)
+        self._text = self._text[cut:].lstrip()
+        self._prefix = ""
+        self._current = None
+        self._sent = None
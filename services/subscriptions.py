@@ -0,0 +1,149 @@
+"""Подписчики на факт дня и состояние рассылок.
+
+Подписки хранятся в SQLite. Рассылка читает подписчиков пачками по
+возрастанию chat_id (WHERE chat_id > курсор), поэтому её прогресс - одно
+число: после каждой пачки курсор и счётчики сохраняются в таблице
+broadcasts, и после рестарта рассылка продолжается с того же места.
+Пользователи, заблокировавшие бота, помечаются неактивными и в следующие
+рассылки не попадают.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from config import SUBSCRIPTIONS_DB
+
+logger = logging.getLogger(__name__)
+
+# Курсор до первого подписчика: у групп и супергрупп chat_id отрицательные,
+# поэтому рассылка начинается с наименьшего 64-битного числа, а не с нуля
+FIRST_CURSOR = -2 ** 63
+
+
+class BroadcastState:
+    """Рассылка одного дня: варианты факта, курсор и счётчики."""
+
+    def __init__(self, day: str, variants, cursor: int = FIRST_CURSOR, sent: int = 0, blocked: int = 0, failed: int = 0,
+                 started: float = None, finished: float = None):
+        self.day = day
+        self.variants = list(variants)
+        self.cursor = cursor
+        self.sent = sent
+        self.blocked = blocked
+        self.failed = failed
+        self.started = started or time.time()
+        self.finished = finished
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+
+class SubscriptionStore:
+    """Подписчики и рассылки в SQLite; все запросы к диску - в отдельном потоке."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS subscribers ("
+                "chat_id INTEGER PRIMARY KEY, active INTEGER NOT NULL, subscribed REAL NOT NULL, "
+                "blocked REAL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS broadcasts ("
+                "day TEXT PRIMARY KEY, variants TEXT NOT NULL, cursor INTEGER NOT NULL, sent INTEGER NOT NULL, "
+                "blocked INTEGER NOT NULL, failed INTEGER NOT NULL, started REAL NOT NULL, finished REAL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            db = self._connect()
+            rows = db.execute(sql, params).fetchall()
+            db.commit()
+            return rows
+
+    # Подписки
+
+    async def subscribe(self, chat_id: int):
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO subscribers (chat_id, active, subscribed) VALUES (?, 1, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET active = 1, blocked = NULL",
+            (chat_id, time.time())
+        )
+
+    async def unsubscribe(self, chat_id: int):
+        await asyncio.to_thread(self._execute, "UPDATE subscribers SET active = 0 WHERE chat_id = ?", (chat_id,))
+
+    async def is_subscribed(self, chat_id: int) -> bool:
+        rows = await asyncio.to_thread(
+            self._execute, "SELECT 1 FROM subscribers WHERE chat_id = ? AND active = 1", (chat_id,)
+        )
+        return bool(rows)
+
+    async def mark_blocked(self, chat_ids):
+        """Пользователи заблокировали бота или удалили чат - больше им не пишем"""
+        if not chat_ids:
+            return
+
+        def update():
+            with self._lock:
+                db = self._connect()
+                now = time.time()
+                db.executemany("UPDATE subscribers SET active = 0, blocked = ? WHERE chat_id = ?",
+                               [(now, chat_id) for chat_id in chat_ids])
+                db.commit()
+
+        await asyncio.to_thread(update)
+
+    async def page(self, after: int, limit: int):
+        """Следующие limit активных подписчиков с chat_id больше after"""
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT chat_id FROM subscribers WHERE active = 1 AND chat_id > ? ORDER BY chat_id LIMIT ?",
+            (after, limit)
+        )
+        return [chat_id for (chat_id,) in rows]
+
+    async def count(self) -> int:
+        rows = await asyncio.to_thread(self._execute, "SELECT COUNT(*) FROM subscribers WHERE active = 1")
+        return rows[0][0]
+
+    # Рассылки
+
+    async def load_broadcast(self, day: str):
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT variants, cursor, sent, blocked, failed, started, finished FROM broadcasts WHERE day = ?",
+            (day,)
+        )
+        if not rows:
+            return None
+        variants, cursor, sent, blocked, failed, started, finished = rows[0]
+        return BroadcastState(day, json.loads(variants), cursor, sent, blocked, failed, started, finished)
+
+    async def save_broadcast(self, state: BroadcastState):
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO broadcasts (day, variants, cursor, sent, blocked, failed, started, finished) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (state.day, json.dumps(state.variants, ensure_ascii=False), state.cursor, state.sent, state.blocked,
+             state.failed, state.started, state.finished)
+        )
+
+
+subscription_store = SubscriptionStore(SUBSCRIPTIONS_DB)
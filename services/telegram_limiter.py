@@ -0,0 +1,279 @@
+"""Планировщик исходящих запросов к Bot API.
+
+Telegram ограничивает бота примерно 30 сообщениями в секунду на всех и
+около одного сообщения в секунду в одном чате (в группах - 20 в минуту);
+при превышении он отвечает 429 с retry_after. Вместо того чтобы ловить
+RetryAfter в обработчиках, все вызовы Bot API проходят через
+TelegramRateLimiter: запрос ждёт, пока в общем бюджете и в бюджете его чата
+появится место, и уходит первым среди ожидающих по приоритету - ответы
+пользователю раньше индикаторов "печатает", рассылки последними. На
+RetryAfter чат (или весь бот, если запрос не относится к чату)
+приостанавливается на указанное время, и запрос повторяется сам.
+
+Индикатор "печатает" - косметика: если в чате такой уже ждёт очереди, новый
+не ставится, а устаревший в очереди просто не отправляется.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from datetime import timedelta
+from enum import IntEnum
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+CHAT_ACTION_ENDPOINT = "sendChatAction"
+# Сколько пустых бюджетов чатов держать, прежде чем чистить
+MAX_IDLE_CHATS = 10_000
+
+
+class OutboundPriority(IntEnum):
+    REPLY = 0
+    CHAT_ACTION = 1
+    BACKGROUND = 2
+
+
+class RateBucket:
+    """Бюджет запросов: rate в секунду, не больше burst подряд; может быть приостановлен."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд можно отправить следующий запрос"""
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+
+def retry_after_seconds(retry_after) -> float:
+    """RetryAfter.retry_after в секундах (int или timedelta в зависимости от версии PTB)"""
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+
+class TelegramRateLimiter(BaseRateLimiter):
+    """Общий и початовый лимиты Bot API с приоритетами и повтором после RetryAfter."""
+
+    def __init__(self, global_per_second: float = 30, chat_per_second: float = 1, chat_burst: int = 3,
+                 group_per_minute: float = 20, max_retries: int = 3, chat_action_max_wait: float = 5):
+        self.chat_per_second = chat_per_second
+        self.chat_burst = chat_burst
+        self.group_per_minute = group_per_minute
+        self.max_retries = max_retries
+        self.chat_action_max_wait = chat_action_max_wait
+
+        self._global = RateBucket(global_per_second, global_per_second)
+        self._chats = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self._timer = None
+        self._timer_at = math.inf
+        # Чаты, в которых индикатор "печатает" уже ждёт очереди
+        self._pending_actions = set()
+        # priority -> [число запросов, суммарное ожидание, максимальное ожидание]
+        self._waits = {priority: [0, 0.0, 0.0] for priority in OutboundPriority}
+        self.retries = 0
+        self.dropped_actions = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for entry in self._queue if not entry[3].done())
+
+    def stats(self) -> dict:
+        """Глубина очереди и время ожидания по приоритетам"""
+        waits = {}
+        for priority, (count, total, longest) in self._waits.items():
+            waits[priority.name.lower()] = {
+                "requests": count,
+                "avg_wait": total / count if count else 0.0,
+                "max_wait": longest,
+            }
+        return {"queue_depth": self.queue_depth, "retries": self.retries, "dropped_actions": self.dropped_actions,
+                "wait": waits}
+
+    def _chat_bucket(self, chat_id) -> RateBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > MAX_IDLE_CHATS:
+                now = time.monotonic()
+                self._chats = {key: value for key, value in self._chats.items() if not value.idle(now)}
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = RateBucket(self.group_per_minute / 60, self.chat_burst)
+            else:
+                bucket = RateBucket(self.chat_per_second, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _priority(self, endpoint: str, rate_limit_args) -> OutboundPriority:
+        if rate_limit_args is not None:
+            return OutboundPriority(rate_limit_args)
+        if endpoint == CHAT_ACTION_ENDPOINT:
+            return OutboundPriority.CHAT_ACTION
+        return OutboundPriority.REPLY
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        priority = self._priority(endpoint, rate_limit_args)
+        is_action = endpoint == CHAT_ACTION_ENDPOINT
+
+        if is_action:
+            if chat_id in self._pending_actions:
+                self.dropped_actions += 1
+                return True
+            self._pending_actions.add(chat_id)
+            try:
+                if not await self._acquire(priority, next(self._counter), chat_id, self.chat_action_max_wait):
+                    # Индикатор устарел, пока ждал очереди
+                    self.dropped_actions += 1
+                    return True
+            finally:
+                self._pending_actions.discard(chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self._on_retry_after(chat_id, endpoint, retry_after_seconds(e.retry_after))
+                self.dropped_actions += 1
+                return True
+
+        # Повтор сохраняет место в очереди: ответы в чате не переставляются
+        seq = next(self._counter)
+        attempt = 0
+        while True:
+            await self._acquire(priority, seq, chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self._on_retry_after(chat_id, endpoint, retry_after_seconds(e.retry_after))
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+
+    def _on_retry_after(self, chat_id, endpoint: str, seconds: float):
+        RETRY_AFTER.labels(endpoint).inc()
+        if chat_id is None:
+            logger.warning(f"Bot API: {endpoint} упёрся в общий лимит, пауза {seconds:.0f} с")
+            self._global.pause(seconds)
+        else:
+            logger.warning(f"Bot API: {endpoint} в чате {chat_id} упёрся в лимит, пауза {seconds:.0f} с")
+            self._chat_bucket(chat_id).pause(seconds)
+
+    async def _acquire(self, priority: OutboundPriority, seq: int, chat_id, max_wait: float = None) -> bool:
+        """Дождаться очереди; False, если за max_wait секунд она не подошла"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (int(priority), seq, chat_id, future))
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            # Не wait_for: если слот выдан в той же итерации, что и отмена, wait_for
+            # в Python 3.11 возвращает результат и теряет отмену вызывающей задачи
+            done, _ = await asyncio.wait((future,), timeout=max_wait)
+        except asyncio.CancelledError:
+            # Место в бюджете уже списано, если слот выдан; иначе запрос просто выбывает из очереди
+            future.cancel()
+            raise
+        if not done:
+            future.cancel()
+            return False
+
+        waited = time.monotonic() - started
+        QUEUE_SECONDS.labels(priority.name.lower()).observe(waited)
+        stat = self._waits[priority]
+        stat[0] += 1
+        stat[1] += waited
+        stat[2] = max(stat[2], waited)
+        if waited > 1:
+            logger.info(f"Запрос к Bot API ждал в очереди {waited:.2f} с (приоритет {priority.name})")
+        return True
+
+    def _dispatch(self):
+        now = time.monotonic()
+        blocked = []
+        wake = math.inf
+        while self._queue:
+            entry = self._queue[0]
+            future = entry[3]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+
+            delay = self._global.delay(now)
+            if delay > 0:
+                wake = min(wake, delay)
+                break
+
+            chat = self._chat_bucket(entry[2]) if entry[2] is not None else None
+            delay = chat.delay(now) if chat is not None else 0.0
+            heapq.heappop(self._queue)
+            if delay > 0:
+                # Чат упёрся в свой лимит - пропускаем его запросы, не задерживая остальные чаты
+                blocked.append(entry)
+                wake = min(wake, delay)
+                continue
+
+            self._global.consume(now)
+            if chat is not None:
+                chat.consume(now)
+            future.set_result(None)
+
+        for entry in blocked:
+            heapq.heappush(self._queue, entry)
+        if wake < math.inf:
+            self._schedule(now + wake)
+
+    def _schedule(self, when: float):
+        if self._timer is not None:
+            if self._timer_at <= when:
+                return
+            self._timer.cancel()
+        self._timer_at = when
+        self._timer = asyncio.get_running_loop().call_later(max(0.0, when - time.monotonic()), self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._timer_at = math.inf
+        self._dispatch()
+
+
+QUEUE_SECONDS = metrics.histogram("telegram_queue_seconds", "Ожидание запроса к Bot API в очереди лимитов",
+                                  ("priority",))
+RETRY_AFTER = metrics.counter("telegram_retry_after_total", "Ответы Bot API 429 с retry_after", ("endpoint",))
@@ -0,0 +1,304 @@
+"""Учёт токенов OpenAI по пользователям и функциям.
+
+Каждый ответ OpenAI приносит usage; его total_tokens списывается с
+пользователя, от имени которого сделан запрос (current_user выставляется
+для каждого обновления в bind_user), и записывается по функции бота.
+Пользователю отведены дневной бюджет, скользящий бюджет за последние
+TOKEN_BUDGET_WINDOW секунд и, при желании, отдельные дневные бюджеты по
+функциям. Счётчики живут в памяти и сохраняются на диск раз в
+TOKEN_BUDGET_SAVE_INTERVAL секунд, так что рестарт не обнуляет лимиты.
+
+Запрос пользователя, исчерпавшего бюджет, не уходит в OpenAI: вызывающий
+получает BudgetExceeded с текстом для пользователя. Так же отклоняется
+запрос, если остатка бюджета меньше минимума его функции: урезанный
+max_tokens дал бы оборванный ответ (например, недописанный JSON квиза).
+Пользователи, чьи сутки и окно закончились, удаляются из памяти при
+сохранении.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from config import (TOKEN_BUDGET_DAILY, TOKEN_BUDGET_WINDOW, TOKEN_BUDGET_WINDOW_LIMIT, TOKEN_BUDGET_FEATURES,
+                    TOKEN_BUDGET_PATH, TOKEN_BUDGET_SAVE_INTERVAL)
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Пользователь, от имени которого выполняется текущий код (None - фоновые задачи бота)
+current_user = contextvars.ContextVar("current_user", default=None)
+
+# Скользящее окно считается по корзинам такой длины, секунды
+BUCKET_SECONDS = 60
+
+
+async def bind_user(update, context):
+    """Первый обработчик каждого обновления: запросы к OpenAI дальше идут от имени его автора"""
+    user = getattr(update, "effective_user", None)
+    current_user.set(user.id if user else None)
+
+
+def _format_wait(seconds: float) -> str:
+    minutes = max(1, int(seconds // 60))
+    if minutes < 60:
+        return f"{minutes} мин"
+    return f"{minutes // 60} ч {minutes % 60} мин"
+
+
+class BudgetExceeded(Exception):
+    """Пользователь исчерпал бюджет токенов."""
+
+    def __init__(self, user_id: int, scope: str, retry_in: float):
+        super().__init__(f"Пользователь {user_id} исчерпал бюджет токенов ({scope})")
+        self.user_id = user_id
+        self.scope = scope
+        self.retry_in = retry_in
+
+    @property
+    def user_message(self) -> str:
+        period = "на сегодня" if self.scope != "window" else "на ближайшее время"
+        return (
+            f"⏳ Лимит запросов к ChatGPT {period} исчерпан.\n"
+            f"Лимит обновится через {_format_wait(self.retry_in)}. "
+            "Остальные функции бота (банк вопросов квиза, готовые факты) доступны и сейчас."
+        )
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d")
+
+
+def _seconds_to_midnight() -> float:
+    now = time.localtime()
+    return 24 * 3600 - (now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec)
+
+
+class _Usage:
+    """Расход одного пользователя: за сегодня (всего и по функциям) и по минутным корзинам."""
+
+    __slots__ = ("day", "tokens", "features", "buckets")
+
+    def __init__(self, day: str):
+        self.day = day
+        self.tokens = 0
+        self.features = {}
+        # (номер корзины, токены) за последние window секунд
+        self.buckets = deque()
+
+
+class TokenBudgets:
+    """Бюджеты токенов пользователей."""
+
+    def __init__(self, daily_limit: int, window_seconds: float, window_limit: int, feature_limits: dict = None,
+                 path: str = None, save_interval: float = 60):
+        self.daily_limit = daily_limit
+        self.window_seconds = window_seconds
+        self.window_limit = window_limit
+        self.feature_limits = feature_limits or {}
+        self.path = path
+        self.save_interval = save_interval
+
+        self._users = {}
+        # Расход по функциям за всё время работы процесса (для метрик), включая фоновые запросы
+        self.feature_tokens = {}
+        self.rejected = 0
+        self._dirty = False
+        self._task = None
+        self._load()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.daily_limit or self.window_limit or self.feature_limits)
+
+    def _usage(self, user_id: int) -> _Usage:
+        usage = self._users.get(user_id)
+        today = _today()
+        if usage is None or usage.day != today:
+            # Новые сутки - дневной расход начинается заново, окно сохраняется
+            fresh = _Usage(today)
+            if usage is not None:
+                fresh.buckets = usage.buckets
+            usage = self._users[user_id] = fresh
+        self._trim(usage)
+        return usage
+
+    def _trim(self, usage: _Usage):
+        oldest = int((time.time() - self.window_seconds) // BUCKET_SECONDS)
+        while usage.buckets and usage.buckets[0][0] <= oldest:
+            usage.buckets.popleft()
+
+    def charge(self, user_id, feature: str, tokens: int):
+        """Списать фактический расход по usage"""
+        self.feature_tokens[feature] = self.feature_tokens.get(feature, 0) + tokens
+        if user_id is None or not tokens:
+            return
+        usage = self._usage(user_id)
+        usage.tokens += tokens
+        usage.features[feature] = usage.features.get(feature, 0) + tokens
+        bucket = int(time.time() // BUCKET_SECONDS)
+        if usage.buckets and usage.buckets[-1][0] == bucket:
+            usage.buckets[-1][1] += tokens
+        else:
+            usage.buckets.append([bucket, tokens])
+        self._dirty = True
+
+    def remaining(self, user_id, feature: str):
+        """Сколько токенов пользователь ещё может потратить и какой лимит ближе всего: (токены, лимит, ждать)"""
+        usage = self._usage(user_id)
+        limits = []
+        if self.daily_limit:
+            limits.append((self.daily_limit - usage.tokens, "daily", _seconds_to_midnight()))
+        feature_limit = self.feature_limits.get(feature)
+        if feature_limit:
+            limits.append((feature_limit - usage.features.get(feature, 0), feature, _seconds_to_midnight()))
+        if self.window_limit:
+            spent = sum(tokens for _, tokens in usage.buckets)
+            # Окно освободится, когда из него выйдет самая старая корзина
+            wait = (usage.buckets[0][0] + 1) * BUCKET_SECONDS + self.window_seconds - time.time() \
+                if usage.buckets else 0.0
+            limits.append((self.window_limit - spent, "window", max(wait, 0.0)))
+        if not limits:
+            return None
+        return min(limits, key=lambda limit: limit[0])
+
+    def check(self, user_id, feature: str, max_tokens: int, min_tokens: int = None) -> int:
+        """Проверить бюджет перед запросом.
+
+        Возвращает max_tokens, урезанный до остатка бюджета, но не меньше
+        min_tokens (по умолчанию - сам max_tokens, то есть без урезания);
+        если остатка не хватает, бросает BudgetExceeded.
+        """
+        if user_id is None or not self.enabled:
+            return max_tokens
+        limit = self.remaining(user_id, feature)
+        if limit is None:
+            return max_tokens
+        left, scope, wait = limit
+        needed = max(1, min(max_tokens, max_tokens if min_tokens is None else min_tokens))
+        if left < needed:
+            self.rejected += 1
+            logger.info(f"Пользователю {user_id} не хватает бюджета токенов ({scope}: осталось {max(left, 0)}, "
+                        f"нужно {needed}), запрос {feature} отклонён")
+            raise BudgetExceeded(user_id, scope, wait)
+        return min(max_tokens, left)
+
+    def prune(self) -> int:
+        """Забыть пользователей, у которых закончились и сутки, и скользящее окно"""
+        today = _today()
+        stale = []
+        for user_id, usage in self._users.items():
+            self._trim(usage)
+            if usage.day != today and not usage.buckets:
+                stale.append(user_id)
+        for user_id in stale:
+            del self._users[user_id]
+        if stale:
+            self._dirty = True
+        return len(stale)
+
+    def over_budget_users(self) -> int:
+        count = 0
+        for user_id in list(self._users):
+            limit = self.remaining(user_id, "")
+            if limit is not None and limit[0] <= 0:
+                count += 1
+        return count
+
+    # Сохранение на диск
+
+    def start(self):
+        # Цикл нужен и без файла: он же чистит устаревших пользователей
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._save_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.save()
+
+    async def _save_loop(self):
+        while True:
+            await asyncio.sleep(self.save_interval)
+            await self.save()
+
+    async def save(self):
+        self.prune()
+        if not self.path or not self._dirty:
+            return
+        self._dirty = False
+        snapshot = {
+            str(user_id): {
+                "day": usage.day,
+                "tokens": usage.tokens,
+                "features": dict(usage.features),
+                "buckets": [list(bucket) for bucket in usage.buckets],
+            }
+            for user_id, usage in self._users.items()
+        }
+        await asyncio.to_thread(self._write, snapshot)
+
+    def _write(self, snapshot: dict):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить бюджеты токенов в {self.path}: {e}")
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать бюджеты токенов {self.path}: {e}")
+            return
+        for user_id, data in snapshot.items():
+            usage = _Usage(data["day"])
+            usage.tokens = data["tokens"]
+            usage.features = data["features"]
+            usage.buckets = deque(data["buckets"])
+            self._users[int(user_id)] = usage
+        self.prune()
+        logger.info(f"Загружены бюджеты токенов {len(self._users)} пользователей")
+
+
+def parse_limits(spec: str) -> dict:
+    """"chatgpt=30000;personality=20000" -> {функция: дневной бюджет}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        feature, _, tokens = item.partition("=")
+        limits[feature.strip()] = int(tokens)
+    return limits
+
+
+token_budgets = TokenBudgets(
+    daily_limit=TOKEN_BUDGET_DAILY,
+    window_seconds=TOKEN_BUDGET_WINDOW,
+    window_limit=TOKEN_BUDGET_WINDOW_LIMIT,
+    feature_limits=parse_limits(TOKEN_BUDGET_FEATURES),
+    path=TOKEN_BUDGET_PATH,
+    save_interval=TOKEN_BUDGET_SAVE_INTERVAL
+)
+
+metrics.collect_counter("llm_feature_tokens_total", "Токены OpenAI по функциям бота (по usage)",
+                        lambda: {(feature,): tokens for feature, tokens in token_budgets.feature_tokens.items()},
+                        ("feature",))
+metrics.collect_counter("llm_budget_rejections_total", "Запросы, отклонённые из-за исчерпанного бюджета",
+                        lambda: token_budgets.rejected)
+metrics.collect_gauge("llm_users_over_budget", "Пользователи с исчерпанным бюджетом токенов",
+                      token_budgets.over_budget_users)
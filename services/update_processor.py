@@ -0,0 +1,78 @@
+"""Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+Обновления разных чатов обрабатываются одновременно, не больше
+CONCURRENT_UPDATES сразу, поэтому долгий ответ OpenAI одному пользователю
+не задерживает остальных. Обновления одного чата выполняются строго по
+очереди: пока обрабатывается одно, следующие ждут в почтовом ящике чата и
+выполняются тем же обработчиком в том же слоте. Благодаря этому переходы
+состояний ConversationHandler (ключ - чат и пользователь) остаются такими
+же, как при последовательной обработке, а один чат, засыпавший бота
+сообщениями, занимает не больше одного слота.
+"""
+import logging
+from collections import deque
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def ordering_key(update):
+    """Ключ, внутри которого обновления обрабатываются по порядку; None - порядок не важен"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Ограниченная параллельность между чатами, последовательность внутри чата."""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # ключ чата -> очередь корутин, ждущих окончания текущего обновления
+        self._mailboxes = {}
+        self.queued = 0
+
+    async def do_process_update(self, update, coroutine):
+        key = ordering_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        mailbox = self._mailboxes.get(key)
+        if mailbox is not None:
+            # Чат уже обрабатывается - обновление выполнит тот же обработчик после текущего
+            mailbox.append(coroutine)
+            self.queued += 1
+            return
+
+        mailbox = self._mailboxes[key] = deque([coroutine])
+        try:
+            while mailbox:
+                try:
+                    await mailbox.popleft()
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке обновления чата {key}: {e}")
+        finally:
+            del self._mailboxes[key]
+            # При отмене оставшиеся обновления уже не выполнятся
+            for pending in mailbox:
+                pending.close()
+
+    def pending(self) -> int:
+        """Обновления, ждущие своей очереди внутри чатов"""
+        return sum(len(mailbox) for mailbox in self._mailboxes.values())
+
+    def busy_chats(self) -> int:
+        return len(self._mailboxes)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
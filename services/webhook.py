@@ -0,0 +1,102 @@
+"""Запуск бота в режиме вебхука.
+
+Telegram присылает обновления POST-запросами на WEBHOOK_PATH; запрос
+проверяется по секретному токену и кладётся в очередь обновлений того же
+Application, что используется в режиме polling. GET /health отвечает о
+состоянии бота для балансировщика.
+"""
+import asyncio
+import hmac
+import logging
+import signal
+from http import HTTPStatus
+
+from telegram import Update
+from telegram.ext import Application
+
+from config import (WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+                    WEBHOOK_MAX_CONNECTIONS)
+from services.http_server import HttpServer, Response
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+# Сколько ждать места в заполненной очереди, прежде чем попросить Telegram повторить позже
+QUEUE_PUT_TIMEOUT = 5
+
+
+def build_webhook_server(application: Application) -> HttpServer:
+    server = HttpServer()
+    path = "/" + WEBHOOK_PATH.strip("/")
+
+    async def handle_update(request):
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, WEBHOOK_SECRET):
+            logger.warning("Вебхук: запрос с неверным секретным токеном")
+            return Response(HTTPStatus.FORBIDDEN, "forbidden")
+
+        # Ответ 5xx Telegram повторяет, поэтому всё, что не похоже на обновление, - 400
+        try:
+            data = request.json()
+            if not isinstance(data, dict):
+                raise ValueError(f"ожидался JSON-объект, получен {type(data).__name__}")
+            update = Update.de_json(data, application.bot)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Вебхук: тело запроса не является обновлением: {e}")
+            return Response(HTTPStatus.BAD_REQUEST, "bad request")
+
+        try:
+            await asyncio.wait_for(application.update_queue.put(update), QUEUE_PUT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Вебхук: очередь обновлений переполнена")
+            return Response(HTTPStatus.SERVICE_UNAVAILABLE, "busy")
+        return Response(HTTPStatus.OK, "ok")
+
+    async def health(request):
+        status = HTTPStatus.OK if application.running else HTTPStatus.SERVICE_UNAVAILABLE
+        return Response.json({
+            "status": "ok" if application.running else "starting",
+            "update_queue": application.update_queue.qsize(),
+        }, status=status)
+
+    server.route("POST", path, handle_update)
+    server.route("GET", "/health", health)
+    return server
+
+
+async def run_webhook(application: Application):
+    """Аналог application.run_polling() для режима вебхука"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    server = build_webhook_server(application)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+
+        await server.start(WEBHOOK_LISTEN, WEBHOOK_PORT)
+        await application.start()
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + "/" + WEBHOOK_PATH.strip("/"),
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info("Вебхук установлен, бот принимает обновления")
+
+        await stop.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# config.py требует токены; тестам хватает заглушек, к сетям они не обращаются
+os.environ.setdefault("TG_BOT_TOKEN", "123:test")
+os.environ.setdefault("CHATGPT_TOKEN", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,60 @@
+import asyncio
+
+from services import conversation_memory as memory_module
+from services.conversation_memory import ConversationMemory
+from services.token_budget import BudgetExceeded
+
+
+def test_failed_summary_bounds_the_history_and_backs_off(monkeypatch):
+    calls = []
+
+    async def over_budget(*args, **kwargs):
+        calls.append(1)
+        raise BudgetExceeded(1, "daily", 60)
+
+    monkeypatch.setattr(memory_module, "complete", over_budget)
+    memory = ConversationMemory(token_budget=100, summary_tokens=20)
+
+    async def scenario():
+        user_data = {}
+        for _ in range(20):
+            memory.add_turn(user_data, "chat", 1, "вопрос " * 10, "ответ " * 10)
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+        return memory.history(user_data, "chat")
+
+    history = asyncio.run(scenario())
+    # Одна неудачная попытка, дальше пауза до retry_at
+    assert len(calls) == 1
+    assert history["retry_at"] > 0
+    # История не выходит за бюджет промпта, пока сворачивание на паузе
+    assert sum(turn["tokens"] for turn in history["turns"]) <= memory.token_budget
+    assert len(history["turns"]) < 10
+
+
+def test_summary_is_retried_after_the_delay(monkeypatch):
+    calls = []
+
+    async def summarize(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise BudgetExceeded(1, "window", 60)
+        return "краткое содержание"
+
+    monkeypatch.setattr(memory_module, "complete", summarize)
+    memory = ConversationMemory(token_budget=100, summary_tokens=20)
+
+    async def scenario():
+        user_data = {}
+        memory.add_turn(user_data, "chat", 1, "вопрос " * 20, "ответ " * 20)
+        await asyncio.sleep(0.01)
+        history = memory.history(user_data, "chat")
+        history["retry_at"] = 0
+        memory.add_turn(user_data, "chat", 1, "вопрос " * 20, "ответ " * 20)
+        await asyncio.sleep(0.01)
+        return history
+
+    history = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert history["summary"] == "краткое содержание"
+    assert "retry_at" not in history
@@ -0,0 +1,85 @@
+import asyncio
+
+from services.fact_broadcast import FactBroadcaster, broadcast_text
+from services.subscriptions import BroadcastState, SubscriptionStore
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def make_broadcaster(tmp_path, facts):
+    broadcaster = FactBroadcaster(SubscriptionStore(str(tmp_path / "subscriptions.db")), send_time="")
+    broadcaster.bot = FakeBot()
+    generated = []
+
+    async def generate():
+        generated.append(1)
+        return list(facts)
+
+    broadcaster._generate = generate
+    return broadcaster, generated
+
+
+def test_day_without_subscribers_is_finished_without_generating(tmp_path):
+    async def scenario():
+        broadcaster, generated = make_broadcaster(tmp_path, ["факт"])
+        state = await broadcaster.run("2026-01-01")
+        assert state.done
+        assert state.variants == []
+        assert not generated
+        assert (await broadcaster.store.load_broadcast("2026-01-01")).done
+
+    asyncio.run(scenario())
+
+
+def test_subscriber_added_after_count_still_gets_the_fact(tmp_path):
+    async def scenario():
+        broadcaster, generated = make_broadcaster(tmp_path, ["первый", "второй"])
+        store = broadcaster.store
+
+        async def count_then_subscribe():
+            # Подписчик появляется между count() и первой страницей
+            await store.subscribe(42)
+            return 0
+
+        store.count = count_then_subscribe
+        state = await broadcaster.run("2026-01-01")
+        assert state.done
+        assert state.sent == 1
+        assert generated == [1]
+        assert broadcaster.bot.sent == [(42, "🌅 <b>Факт дня</b>\n\nпервый")]
+
+    asyncio.run(scenario())
+
+
+def test_unfinished_state_without_variants_is_regenerated_on_resume(tmp_path):
+    async def scenario():
+        broadcaster, generated = make_broadcaster(tmp_path, ["факт"])
+        await broadcaster.store.subscribe(7)
+        state = await broadcaster.run("2026-01-01", BroadcastState("2026-01-01", []))
+        assert state.sent == 1
+        assert generated == [1]
+
+    asyncio.run(scenario())
+
+
+def test_group_subscribers_with_negative_chat_ids_get_the_fact(tmp_path):
+    async def scenario():
+        broadcaster, generated = make_broadcaster(tmp_path, ["факт"])
+        await broadcaster.store.subscribe(-1001234567890)
+        await broadcaster.store.subscribe(-42)
+        state = await broadcaster.run("2026-01-01")
+        assert state.sent == 2
+        assert generated == [1]
+        assert [chat_id for chat_id, _ in broadcaster.bot.sent] == [-1001234567890, -42]
+
+    asyncio.run(scenario())
+
+
+def test_broadcast_text_escapes_model_output():
+    assert broadcast_text("List<String> & Map") == "🌅 <b>Факт дня</b>\n\nList&lt;String&gt; &amp; Map"
@@ -0,0 +1,67 @@
+import asyncio
+
+from services.http_server import HttpServer, Response
+
+
+class QuickServer(HttpServer):
+    HEADERS_TIMEOUT = 0.1
+    BODY_TIMEOUT = 0.1
+
+
+async def start_server(max_body=16):
+    server = QuickServer(max_body=max_body)
+
+    async def echo(request):
+        return Response(200, request.body)
+
+    server.route("POST", "/echo", echo)
+    await server.start("127.0.0.1", 0)
+    return server
+
+
+async def exchange(server, data: bytes, wait: float = 1.0) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    writer.write(data)
+    await writer.drain()
+    try:
+        return await asyncio.wait_for(reader.read(), wait)
+    finally:
+        writer.close()
+
+
+def test_small_body_is_served():
+    async def scenario():
+        server = await start_server()
+        try:
+            response = await exchange(server, b"POST /echo HTTP/1.1\r\nContent-Length: 2\r\nConnection: close\r\n\r\nhi")
+        finally:
+            await server.stop()
+        assert response.startswith(b"HTTP/1.1 200") and response.endswith(b"hi")
+
+    asyncio.run(scenario())
+
+
+def test_oversized_body_is_rejected():
+    async def scenario():
+        server = await start_server()
+        try:
+            response = await exchange(server, b"POST /echo HTTP/1.1\r\nContent-Length: 1000\r\n\r\n")
+        finally:
+            await server.stop()
+        assert response.startswith(b"HTTP/1.1 413")
+
+    asyncio.run(scenario())
+
+
+def test_stalled_headers_and_body_time_out():
+    async def scenario():
+        server = await start_server()
+        try:
+            headers = await exchange(server, b"POST /echo HTTP/1.1\r\nContent-")
+            body = await exchange(server, b"POST /echo HTTP/1.1\r\nContent-Length: 10\r\n\r\nabc")
+        finally:
+            await server.stop()
+        assert headers.startswith(b"HTTP/1.1 408")
+        assert body.startswith(b"HTTP/1.1 408")
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest
+
+from services import screens
+from services.media_cache import MediaRegistry
+
+
+def photo_message(file_id, file_unique_id):
+    return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id, file_unique_id=file_unique_id)])
+
+
+def make_image(tmp_path):
+    image = tmp_path / "menu.jpg"
+    image.write_bytes(b"image")
+    return str(image)
+
+
+def test_upload_remembers_file_unique_id(tmp_path):
+    registry = MediaRegistry(str(tmp_path / "media.json"))
+    image = make_image(tmp_path)
+
+    async def send(photo, **kwargs):
+        return photo_message("file-1", "unique-1")
+
+    asyncio.run(registry.send_photo(send, image))
+    assert registry.get_file_id(image) == "file-1"
+    assert registry.get_file_unique_id(image) == "unique-1"
+    assert MediaRegistry(registry.storage_path).get_file_unique_id(image) == "unique-1"
+
+
+def test_same_image_is_recognised_by_file_unique_id(tmp_path, monkeypatch):
+    registry = MediaRegistry(str(tmp_path / "media.json"))
+    image = make_image(tmp_path)
+    registry.remember(image, "file-1", "unique-1")
+    monkeypatch.setattr(screens, "media_registry", registry)
+
+    # В другом сообщении у той же картинки другой file_id
+    assert screens._shows_image(photo_message("file-2", "unique-1"), image)
+    assert not screens._shows_image(photo_message("file-1", "unique-2"), image)
+
+
+def test_rejected_file_id_is_forgotten_and_the_file_uploaded(tmp_path):
+    registry = MediaRegistry(str(tmp_path / "media.json"))
+    image = make_image(tmp_path)
+    registry.remember(image, "stale", "unique-1")
+    sent = []
+
+    async def send(photo, **kwargs):
+        sent.append(photo)
+        if photo == "stale":
+            raise BadRequest("Wrong file identifier/http url specified")
+        return photo_message("file-2", "unique-1")
+
+    asyncio.run(registry.send_photo(send, image))
+    assert sent[0] == "stale" and sent[1] != "stale"
+    assert registry.get_file_id(image) == "file-2"
+
+
+@pytest.mark.parametrize("error", [
+    "Can't parse entities: unsupported start tag",
+    "Message is not modified",
+    "Message to edit not found",
+])
+def test_other_bad_requests_keep_the_cached_file_id(tmp_path, error):
+    registry = MediaRegistry(str(tmp_path / "media.json"))
+    image = make_image(tmp_path)
+    registry.remember(image, "file-1", "unique-1")
+    sent = []
+
+    async def send(photo, **kwargs):
+        sent.append(photo)
+        raise BadRequest(error)
+
+    with pytest.raises(BadRequest):
+        asyncio.run(registry.send_photo(send, image))
+    assert sent == ["file-1"]
+    assert registry.get_file_id(image) == "file-1"
@@ -0,0 +1,33 @@
+import asyncio
+from types import SimpleNamespace
+
+from handlers import quiz
+from services.question_bank import QuestionBank
+from services.quiz_questions import QuizQuestion
+from services.seen_sets import load_seen
+
+
+def make_question(text="Что выведет System.out.println(1 + 2)?"):
+    options = {"A": "3", "B": "12", "C": "1 + 2", "D": "Ошибка компиляции"}
+    explanations = {letter: f"Пояснение {letter}" for letter in options}
+    return QuizQuestion(text, options, "A", explanations)
+
+
+def test_generated_duplicate_is_marked_as_seen(tmp_path, monkeypatch):
+    bank = QuestionBank(str(tmp_path / "bank.sqlite3"))
+    bank.load()
+    existing = bank.add("java", make_question())
+
+    async def generate(topic_data):
+        # Модель повторила вопрос, который уже лежит в банке
+        return make_question()
+
+    monkeypatch.setattr(quiz, "question_bank", bank)
+    monkeypatch.setattr(quiz, "generate_quiz_question", generate)
+    context = SimpleNamespace(user_data={})
+
+    question = asyncio.run(quiz.generate_new_question("java", {}, context))
+    assert question.content_hash() == make_question().content_hash()
+    assert bank.find(question) == existing
+    assert existing in load_seen(context.user_data, "quiz:java")
+    assert quiz.pick_banked_question("java", context) is None
@@ -0,0 +1,20 @@
+import pytest
+
+from services.quiz_questions import parse_answer
+
+
+@pytest.mark.parametrize("text, letter", [
+    ("A", "A"), ("B", "B"), ("C", "C"), ("D", "D"),
+    ("a", "A"), ("b", "B"), ("c", "C"), ("d", "D"),
+    # Кириллические буквы, похожие на латинские варианты
+    ("А", "A"), ("В", "B"), ("С", "C"),
+    ("а", "A"), ("в", "B"), ("с", "C"),
+    (" b ", "B"), ("В)", "B"), ("с.", "C"),
+])
+def test_parse_answer_accepts_latin_letters_and_cyrillic_lookalikes(text, letter):
+    assert parse_answer(text) == letter
+
+
+@pytest.mark.parametrize("text", ["", "E", "Б", "Г", "Д", "AB", "Вася", "1"])
+def test_parse_answer_rejects_other_input(text):
+    assert parse_answer(text) is None
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from services.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller, RetryPolicy
+
+
+def make_caller(reset_timeout=0.05):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=reset_timeout)
+    return ResilientCaller(RetryPolicy(max_attempts=1), breaker), breaker
+
+
+async def fail():
+    raise asyncio.TimeoutError()
+
+
+async def ok():
+    return "ok"
+
+
+async def trip(caller, breaker):
+    with pytest.raises(asyncio.TimeoutError):
+        await caller.call("test", fail, timeout=1)
+    assert breaker.state == "open"
+    await asyncio.sleep(breaker.reset_timeout * 1.5)
+    assert breaker.state == "half_open"
+
+
+def test_cancelled_half_open_trial_frees_the_trial_slot():
+    async def scenario():
+        caller, breaker = make_caller()
+        await trip(caller, breaker)
+
+        trial = asyncio.ensure_future(caller.call("test", lambda: asyncio.sleep(10), timeout=30))
+        await asyncio.sleep(0.01)
+        with pytest.raises(CircuitOpenError):
+            await caller.call("test", ok, timeout=1)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        assert await caller.call("test", ok, timeout=1) == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_half_open_stream_trial_frees_the_trial_slot():
+    async def slow_chunks():
+        await asyncio.sleep(10)
+        yield "never"
+
+    async def chunks():
+        yield "a"
+        yield "b"
+
+    async def consume(stream):
+        return [chunk async for chunk in stream]
+
+    async def scenario():
+        caller, breaker = make_caller()
+        await trip(caller, breaker)
+
+        trial = asyncio.ensure_future(consume(caller.stream("test", slow_chunks, timeout=30)))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        assert await consume(caller.stream("test", chunks, timeout=1)) == ["a", "b"]
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_call_in_closed_state_keeps_breaker_closed():
+    async def scenario():
+        caller, breaker = make_caller()
+        call = asyncio.ensure_future(caller.call("test", lambda: asyncio.sleep(10), timeout=30))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        assert breaker.state == "closed"
+        assert breaker.failures == 0
+
+    asyncio.run(scenario())
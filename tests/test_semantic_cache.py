@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from services.semantic_cache import HashingEmbedder, OpenAIEmbedder, SemanticCache  # noqa: E402
+
+
+def test_lexical_embedder_is_refused_by_default():
+    with pytest.raises(ValueError):
+        SemanticCache(HashingEmbedder(64))
+
+
+def test_lookup_and_store_use_precomputed_vectors():
+    async def scenario():
+        cache = SemanticCache(HashingEmbedder(64), threshold=0.99, allow_lexical=True)
+        vector = await cache.embed("Почему небо голубое?")
+        assert cache.lookup(vector) is None
+        cache.store("Почему небо голубое?", vector, "Из-за рассеяния Рэлея")
+        assert cache.lookup(await cache.embed("почему небо голубое")) == "Из-за рассеяния Рэлея"
+
+    asyncio.run(scenario())
+
+
+def test_openai_embedder_normalizes_and_checks_dimension():
+    calls = []
+
+    async def request(texts):
+        calls.append(texts)
+        return [[3.0, 4.0] for _ in texts]
+
+    async def scenario():
+        embedder = OpenAIEmbedder(request, "test-model", dim=2)
+        vectors = await embedder.embed(["a", "b"])
+        assert np.allclose(vectors, [[0.6, 0.8], [0.6, 0.8]])
+        with pytest.raises(ValueError):
+            await OpenAIEmbedder(request, "test-model", dim=3).embed(["a"])
+
+    asyncio.run(scenario())
+    assert calls[0] == ["a", "b"]
+
+
+def test_embedding_failures_do_not_open_the_chat_breaker(monkeypatch):
+    from services import openai_client
+
+    async def broken_embed(**params):
+        raise asyncio.TimeoutError()
+
+    async def scenario():
+        monkeypatch.setattr(openai_client.gateway, "embed", broken_embed)
+        for _ in range(openai_client.embedding_resilient.breaker.failure_threshold):
+            with pytest.raises(Exception):
+                await openai_client.request_embeddings(["вопрос"])
+        assert openai_client.embedding_resilient.breaker.state == "open"
+        assert openai_client.resilient.breaker.state == "closed"
+
+    asyncio.run(scenario())
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import openai_client
+from services.response_cache import CachePolicy
+from services.single_flight import SingleFlight, StreamCancelled
+
+
+async def slow_chunks(*chunks, delay=0.02):
+    for chunk in chunks:
+        await asyncio.sleep(delay)
+        yield chunk
+
+
+def test_late_subscriber_after_cancel_starts_a_fresh_stream():
+    async def scenario():
+        flight = SingleFlight()
+        started = []
+
+        def factory():
+            started.append(1)
+            return slow_chunks("a", "b", "c")
+
+        first = flight.stream("key", factory)
+        assert await first.__anext__() == "a"
+        await first.aclose()
+
+        # Отменённый запрос уже убран из реестра
+        assert [chunk async for chunk in flight.stream("key", factory)] == ["a", "b", "c"]
+        assert len(started) == 2
+
+    asyncio.run(scenario())
+
+
+def test_subscriber_of_cancelled_stream_gets_an_error_not_a_truncated_answer():
+    async def scenario():
+        flight = SingleFlight()
+        stream = flight.stream("key", lambda: slow_chunks("a", "b", "c"))
+        assert await stream.__anext__() == "a"
+
+        broadcast = flight._streams["key"]
+        broadcast.task.cancel()
+        with pytest.raises(StreamCancelled):
+            async for _ in stream:
+                pass
+
+    asyncio.run(scenario())
+
+
+def test_stream_without_final_chunk_is_not_cached(monkeypatch):
+    def chunk(text=None, finish_reason=None):
+        delta = SimpleNamespace(content=text)
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+    async def truncated(**params):
+        yield chunk("Начало ")
+        yield chunk("ответа")
+
+    async def complete(**params):
+        yield chunk("Полный ")
+        yield chunk("ответ")
+        yield chunk(finish_reason="stop")
+
+    async def consume(stream):
+        return [text async for text in stream]
+
+    async def scenario():
+        policy = CachePolicy(ttl=60)
+        messages = [{"role": "user", "content": "single flight test"}]
+
+        monkeypatch.setattr(openai_client.gateway, "stream", truncated)
+        with pytest.raises(openai_client.IncompleteStreamError):
+            await consume(openai_client.stream_completion(messages, 100, 0, openai_client.FEATURE_CHATGPT,
+                                                          cache_policy=policy))
+
+        monkeypatch.setattr(openai_client.gateway, "stream", complete)
+        answer = await consume(openai_client.stream_completion(messages, 100, 0, openai_client.FEATURE_CHATGPT,
+                                                               cache_policy=policy))
+        assert answer == ["Полный ", "ответ"]
+        # Повторный запрос отвечает из кэша целым ответом
+        assert await consume(openai_client.stream_completion(messages, 100, 0, openai_client.FEATURE_CHATGPT,
+                                                             cache_policy=policy)) == ["Полный ответ"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+import pytest
+
+from services.telegram_limiter import OutboundPriority, TelegramRateLimiter
+
+
+@pytest.mark.parametrize("max_wait", [None, 5])
+def test_cancel_is_not_lost_when_the_slot_is_granted_at_the_same_time(max_wait):
+    async def scenario():
+        limiter = TelegramRateLimiter(chat_per_second=1, chat_burst=1)
+        limiter._chat_bucket(1).consume(time.monotonic())
+        # Бюджет чата исчерпан - запрос ждёт в очереди
+        waiter = asyncio.ensure_future(limiter._acquire(OutboundPriority.CHAT_ACTION, 0, 1, max_wait))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        # Слот выдан в той же итерации цикла, в которой задачу отменили
+        limiter._queue[0][3].set_result(None)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await limiter.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_chat_action_gives_up_after_max_wait():
+    async def scenario():
+        limiter = TelegramRateLimiter(chat_per_second=0.1, chat_burst=1)
+        limiter._chat_bucket(1).consume(time.monotonic())
+        assert not await limiter._acquire(OutboundPriority.CHAT_ACTION, 0, 1, 0.05)
+        await limiter.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from services import token_budget
+from services.token_budget import BudgetExceeded, TokenBudgets
+
+
+def make_budgets(**limits):
+    return TokenBudgets(daily_limit=limits.get("daily", 1000), window_seconds=limits.get("window", 3600),
+                        window_limit=limits.get("window_limit", 0))
+
+
+def test_check_rejects_instead_of_truncating_below_the_minimum():
+    budgets = make_budgets()
+    budgets.charge(1, "quiz", 500)
+
+    # Квизу нужен весь max_tokens: обрезанный JSON бесполезен
+    with pytest.raises(BudgetExceeded):
+        budgets.check(1, "quiz", 700)
+    assert budgets.rejected == 1
+
+    # Свободный текст можно укоротить до остатка, но не ниже минимума
+    assert budgets.check(1, "chatgpt", 1000, min_tokens=300) == 500
+    with pytest.raises(BudgetExceeded):
+        budgets.check(1, "chatgpt", 1000, min_tokens=600)
+    assert budgets.check(1, "chatgpt", 200) == 200
+
+
+def test_prune_drops_users_whose_day_and_window_expired():
+    budgets = make_budgets(window=120, window_limit=1000)
+    budgets.charge(1, "chatgpt", 10)
+    budgets.charge(2, "chatgpt", 10)
+
+    # Пользователь 1 писал вчера, и его окно уже закончилось
+    budgets._users[1].day = "2000-01-01"
+    budgets._users[1].buckets[0][0] -= 10
+    # У пользователя 2 сутки сменились, но окно ещё идёт
+    budgets._users[2].day = "2000-01-01"
+
+    assert budgets.prune() == 1
+    assert list(budgets._users) == [2]
+
+
+def test_prune_keeps_users_who_spent_today_after_their_window(monkeypatch):
+    budgets = make_budgets(window=60)
+    budgets.charge(1, "chatgpt", 10)
+    later = time.time() + 2 * 60
+    monkeypatch.setattr(token_budget.time, "time", lambda: later)
+    assert budgets.prune() == 0
+    assert list(budgets._users) == [1]
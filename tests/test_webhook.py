@@ -0,0 +1,36 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from config import WEBHOOK_PATH, WEBHOOK_SECRET
+from services.http_server import Request
+from services.webhook import SECRET_HEADER, build_webhook_server
+
+
+def post(server, body: bytes):
+    path = "/" + WEBHOOK_PATH.strip("/")
+    request = Request("POST", path, {SECRET_HEADER: WEBHOOK_SECRET}, body)
+    return server._dispatch(request)
+
+
+@pytest.mark.parametrize("body", [b"null", b"", b"[]", b"[1, 2]", b"42", b'"update"', b"{}", b"{not json"])
+def test_body_that_is_not_an_update_is_rejected_with_400(body):
+    async def scenario():
+        application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+        response = await post(build_webhook_server(application), body)
+        assert response.status == 400
+        assert application.update_queue.empty()
+
+    asyncio.run(scenario())
+
+
+def test_update_is_queued():
+    async def scenario():
+        application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+        response = await post(build_webhook_server(application), json.dumps({"update_id": 7}).encode())
+        assert response.status == 200
+        assert (await application.update_queue.get()).update_id == 7
+
+    asyncio.run(scenario())